@@ -0,0 +1,145 @@
+"""
+Load test of the sync DRF read endpoints against their async counterparts, served
+by uvicorn through blood_bank/asgi.py. Each of ``--clients`` concurrent keep-alive
+connections issues requests for ``--duration`` seconds; requests/sec and latency
+percentiles are reported per endpoint.
+
+Requires uvicorn (pip install uvicorn):
+
+    python -m benchmarks.asgi_load --clients 500 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from .common import setup_django
+
+ENDPOINTS = [
+    ('inventory', 'admin', '/api/inventory/', '/api/async/inventory/'),
+    ('user requests', 'user', '/api/requests/', '/api/async/requests/'),
+    ('admin requests', 'admin', '/api/admin/requests/', '/api/async/admin/requests/'),
+]
+
+
+def populate(requests):
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from blood_management.models import BloodInventory, BloodRequest
+    admin = User.objects.create_superuser(username='bench_admin', password='benchpass')
+    user = User.objects.create_user(username='bench_user', password='benchpass')
+    BloodInventory.objects.bulk_create(
+        BloodInventory(blood_type=blood_type, units_available=100) for blood_type in ('A+', 'O+', 'O-')
+    )
+    BloodRequest.objects.bulk_create(
+        BloodRequest(user=user, blood_type='O+', units_requested=1) for _ in range(requests)
+    )
+    return {
+        'admin': str(RefreshToken.for_user(admin).access_token),
+        'user': str(RefreshToken.for_user(user).access_token),
+    }
+
+
+def serve(db_path, port):
+    # Runs in a child process so the server gets its own interpreter and event loop
+    from django.conf import settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blood_bank.settings')
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    settings.DEBUG = False
+    import uvicorn
+    uvicorn.run('blood_bank.asgi:application', host='127.0.0.1', port=port, log_level='warning')
+
+
+async def _client(port, path, token, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n'
+    ).encode()
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            if b' 200 ' not in status_line:
+                errors.append(status_line)
+            latencies.append(time.perf_counter() - start)
+    except (ConnectionError, asyncio.IncompleteReadError) as exc:
+        errors.append(repr(exc))
+    finally:
+        writer.close()
+
+
+async def run_load(port, path, token, clients, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        _client(port, path, token, deadline, latencies, errors) for _ in range(clients)
+    ])
+    latencies.sort()
+    if not latencies:
+        return {'requests_per_sec': 0, 'errors': len(errors)}
+    return {
+        'requests_per_sec': round(len(latencies) / duration, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        'errors': len(errors),
+    }
+
+
+async def _wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError('uvicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--requests', type=int, default=1000, help='BloodRequest rows to create')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serve', metavar='DB_PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    db_path = setup_django()
+    tokens = populate(args.requests)
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.asgi_load', '--serve', db_path,
+                               '--port', str(args.port)])
+    results = []
+    try:
+        asyncio.run(_wait_for_port(args.port))
+        for name, role, sync_path, async_path in ENDPOINTS:
+            for mode, path in (('sync', sync_path), ('async', async_path)):
+                stats = asyncio.run(run_load(args.port, path, tokens[role], args.clients, args.duration))
+                results.append({'endpoint': name, 'mode': mode, **stats})
+    finally:
+        server.terminate()
+        server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Per-request authentication cost of the stock JWTAuthentication (one auth_user
+query per request) against CachedJWTAuthentication (cached principal).
+
+    python -m benchmarks.auth_cache --repeat 2000
+"""
+import argparse
+import json
+from .common import measure, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=10000, help='Rows in auth_user')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from blood_management.authentication import CachedJWTAuthentication
+
+    User.objects.bulk_create(User(username=f'bench_{i}') for i in range(args.users))
+    user = User.objects.order_by('?').first()
+    django_request = APIRequestFactory().get(
+        '/api/requests/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}'
+    )
+
+    results = {}
+    for auth_class in (JWTAuthentication, CachedJWTAuthentication):
+        def authenticate():
+            return auth_class().authenticate(Request(django_request))
+
+        stats = measure(authenticate, args.repeat)
+        with CaptureQueriesContext(connection) as ctx:
+            authenticate()
+        stats['queries_per_request'] = len(ctx.captured_queries)
+        results[auth_class.__name__] = stats
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
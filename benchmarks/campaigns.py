@@ -0,0 +1,156 @@
+"""
+Donor recall campaigns at ``--recipients`` eligible donors, sent through the file
+and console mail backends: the batched campaign (keyset-paged selection, one mail
+connection per ``--batch-size`` messages) against one ``send_mail`` per donor,
+which opens a connection for every message. The per-donor baseline runs on the
+first ``--baseline`` donors and is reported per message as well. The local backends
+open connections for free, so ``--handshake-ms`` adds the connection setup an SMTP
+server would cost (TCP, TLS and login) to every opened connection.
+
+    python -m benchmarks.campaigns --recipients 100000 --handshake-ms 20
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from django.core.mail.backends import console, filebased
+from .common import setup_django
+
+BLOOD_TYPE = 'O-'
+
+
+class HandshakeMixin:
+    # Sleeps EMAIL_HANDSHAKE_SECONDS whenever a connection is opened, not when an open one is reused
+    def open(self):
+        from django.conf import settings
+        if not getattr(self, '_connected', False):
+            time.sleep(getattr(settings, 'EMAIL_HANDSHAKE_SECONDS', 0))
+            self._connected = True
+        return super().open()
+
+    def close(self):
+        self._connected = False
+        return super().close()
+
+
+class FileBackend(HandshakeMixin, filebased.EmailBackend):
+    pass
+
+
+class ConsoleBackend(HandshakeMixin, console.EmailBackend):
+    pass
+
+
+def populate(recipients, seed):
+    # Every recipient is an eligible O- donor with an email; as many again are skipped
+    # for their blood type, a recent donation or a phone number as contact
+    from django.db import connection, transaction
+    from .datagen import BATCH_SIZE
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(recipients):
+        rows.append((f'Donor {i}', BLOOD_TYPE, f'donor{i}@example.com',
+                     (today - timedelta(days=rng.randrange(60, 3650))).isoformat()))
+        rows.append((f'Skipped {i}', rng.choice([BLOOD_TYPE, 'A+']), rng.choice([f'skip{i}@example.com', f'555-{i:07d}']),
+                     (today - timedelta(days=rng.randrange(30))).isoformat()))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(
+                'INSERT INTO blood_management_donor (name, blood_type, contact_info, last_donation_date) '
+                'VALUES (%s, %s, %s, %s)', rows[offset:offset + BATCH_SIZE])
+
+
+def new_campaign():
+    from blood_management.campaigns import count_recipients
+    from blood_management.matching import eligibility_cutoff
+    from blood_management.models import Campaign
+    campaign = Campaign.objects.create(blood_type=BLOOD_TYPE, subject='{blood_type} donors needed',
+                                       message='Dear {name},\n\nOur {blood_type} stock is low. Please book a donation.',
+                                       eligible_before=eligibility_cutoff())
+    campaign.total = count_recipients(campaign)
+    campaign.save(update_fields=['total'])
+    return campaign
+
+
+def run_batched(batch_size):
+    from blood_management.campaigns import run_campaign
+    campaign = new_campaign()
+    start = time.perf_counter()
+    campaign = run_campaign(campaign.pk, batch_size=batch_size, rate=None)
+    elapsed = time.perf_counter() - start
+    assert campaign.status == 'Completed' and campaign.sent == campaign.total, campaign
+    return campaign.sent, elapsed
+
+
+def run_per_donor(limit):
+    from django.conf import settings
+    from django.core.mail import send_mail
+    from blood_management.campaigns import recipients
+    campaign = new_campaign()
+    start = time.perf_counter()
+    donors = list(recipients(campaign).only('name', 'contact_info')[:limit])
+    for donor in donors:
+        send_mail(campaign.subject.format(name=donor.name, blood_type=BLOOD_TYPE),
+                  campaign.message.format(name=donor.name, blood_type=BLOOD_TYPE),
+                  settings.DEFAULT_FROM_EMAIL, [donor.contact_info])
+    return len(donors), time.perf_counter() - start
+
+
+def summary(sent, elapsed, connections):
+    return {
+        'messages': sent,
+        'connections': connections,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(sent / elapsed) if elapsed else None,
+        'us_per_message': round(elapsed / sent * 1e6, 1) if sent else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--baseline', type=int, default=2000, help='Donors mailed one send_mail at a time')
+    parser.add_argument('--handshake-ms', type=float, default=0, help='Simulated cost of opening a connection')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    populate(args.recipients, args.seed)
+
+    from django.test import override_settings
+    batches = -(-args.recipients // args.batch_size)
+    results = {'recipients': args.recipients, 'batch_size': args.batch_size, 'handshake_ms': args.handshake_ms}
+    with tempfile.TemporaryDirectory(prefix='blood_bank_mail_') as mail_dir, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        backends = {
+            'file': {'EMAIL_BACKEND': 'benchmarks.campaigns.FileBackend', 'EMAIL_FILE_PATH': mail_dir},
+            'console': {'EMAIL_BACKEND': 'benchmarks.campaigns.ConsoleBackend'},
+        }
+        for name, backend in backends.items():
+            with override_settings(EMAIL_HANDSHAKE_SECONDS=args.handshake_ms / 1000, **backend):
+                sent, elapsed = run_batched(args.batch_size)
+                results[f'{name}_campaign'] = summary(sent, elapsed, batches)
+                sent, elapsed = run_per_donor(args.baseline)
+                results[f'{name}_send_mail_per_donor'] = summary(sent, elapsed, sent)
+                results[f'{name}_speedup'] = round(
+                    results[f'{name}_send_mail_per_donor']['us_per_message']
+                    / results[f'{name}_campaign']['us_per_message'], 2)
+
+        # Memory stays bounded by one batch however many donors are mailed
+        with override_settings(**backends['console']):
+            tracemalloc.start()
+            run_batched(args.batch_size)
+            results['campaign_peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            tracemalloc.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Each benchmark runs against a throwaway SQLite file so it never touches db.sqlite3:
+
+    python -m benchmarks.pagination --rows 100010
+"""
+import atexit
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+
+def setup_django(db_path=None, copy_from=None, throttle=False):
+    """
+    Configure Django against a fresh SQLite database, or a throwaway copy of the
+    ``copy_from`` database, and apply all migrations. Returns the database path.
+    Requests are not throttled unless ``throttle`` is set, here and in servers
+    started from this process.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blood_bank.settings')
+    os.environ['BLOOD_BANK_THROTTLE'] = 'on' if throttle else 'off'
+    from django.conf import settings
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='blood_bank_bench_', suffix='.sqlite3')
+        os.close(fd)
+        atexit.register(_remove_database, db_path)
+        if copy_from:
+            shutil.copyfile(copy_from, db_path)
+    settings.DATABASES['default']['NAME'] = db_path
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    setup_test_environment(debug=False)  # Allows the test client host and keeps query logging off
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def _remove_database(db_path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def measure(func, repeat=20, warmup=2):
+    """
+    Call ``func`` repeatedly and return latency statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def auth_client(user):
+    """
+    An APIClient authenticated with a fresh JWT for ``user``.
+    """
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import RefreshToken
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return client
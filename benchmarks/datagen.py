@@ -0,0 +1,146 @@
+"""
+Synthetic data for the benchmark suite: donors, users, blood requests with a
+realistic status mix spread over ``--days`` of history, tracked blood bags and
+inventory for every blood type at each of ``--sites`` sites. Rows are written with batched raw INSERTs, then the
+donor search index and the inventory history are rebuilt, so millions of rows load
+in minutes. Generate once and reuse the file with ``benchmarks.suite --db``:
+
+    python -m benchmarks.datagen --donors 1000000 --requests 1000000 --output bench.sqlite3
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from .common import setup_django
+
+FIRST_NAMES = ['Jane', 'John', 'Amina', 'Carlos', 'Mei', 'Olga', 'Ravi', 'Sara', 'Tom', 'Yusuf']
+LAST_NAMES = ['Doe', 'Smith', 'Garcia', 'Chen', 'Ivanova', 'Patel', 'Okafor', 'Nakamura', 'Brown', 'Khan']
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+# Population frequencies, so common types dominate donors and demand alike
+TYPE_WEIGHTS = [30, 6, 9, 2, 3, 1, 38, 7]
+STATUSES, STATUS_WEIGHTS = ['Fulfilled', 'Pending', 'Denied'], [80, 12, 8]
+URGENCIES, URGENCY_WEIGHTS = ['Emergency', 'Urgent', 'Routine'], [3, 12, 85]
+BATCH_SIZE = 50000
+# Stock that is not backed by bags, so fulfillment benchmarks never run dry
+UNTRACKED_UNITS = 10 ** 7
+# Latitude and longitude ranges generated sites are scattered over (roughly western Europe)
+SITE_REGION = ((40.0, 52.0), (-5.0, 15.0))
+
+ADMIN = ('bench_admin', 'benchpass')
+USER = ('bench_user', 'benchpass')
+
+
+def _batches(total, make_row):
+    for offset in range(0, total, BATCH_SIZE):
+        yield [make_row(i) for i in range(offset, min(total, offset + BATCH_SIZE))]
+
+
+def make_sites(count, rng):
+    """
+    The default site plus ``count - 1`` sites at random points of ``SITE_REGION``.
+    Returns the ids of all of them, the default site first.
+    """
+    from blood_management.models import Site, default_site_id
+    (lat_min, lat_max), (lon_min, lon_max) = SITE_REGION
+    Site.objects.bulk_create(
+        Site(name=f'Site {n}', latitude=rng.uniform(lat_min, lat_max), longitude=rng.uniform(lon_min, lon_max))
+        for n in range(1, count)
+    )
+    default = default_site_id()
+    return [default] + list(Site.objects.exclude(pk=default).order_by('pk').values_list('pk', flat=True))
+
+
+def generate(donors=100000, requests=100000, users=100, bags=10000, days=365, seed=0, sites=1):
+    """
+    Fill the configured database. The first regular user is ``bench_user``, who owns
+    an equal share of the requests; ``bench_admin`` is a superuser. Requests and bags
+    are spread over the sites evenly and at random. Returns row counts.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from blood_management.history import backfill_requests
+    from blood_management.models import BloodRequest
+    from blood_management.search import rebuild_index
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.now(timezone.utc)
+    User.objects.create_superuser(username=ADMIN[0], password=ADMIN[1])
+    password = make_password(USER[1])  # Hashed once for every generated user
+    user_ids = [User.objects.create(username=USER[0], password=password).pk]
+    User.objects.bulk_create(User(username=f'bench_user_{n}', password=password) for n in range(1, users))
+    user_ids += list(User.objects.filter(username__startswith='bench_user_').values_list('pk', flat=True))
+    site_ids = make_sites(sites, rng)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for rows in _batches(donors, lambda i: (
+                f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{i % 997}',
+                rng.choices(BLOOD_TYPES, TYPE_WEIGHTS)[0], f'555-{i:07d}',
+                (today - timedelta(days=rng.randrange(3650))).isoformat())):
+            cursor.executemany(
+                'INSERT INTO blood_management_donor (name, blood_type, contact_info, last_donation_date) '
+                'VALUES (%s, %s, %s, %s)', rows)
+
+        def make_request(i):
+            urgency = rng.choices(URGENCIES, URGENCY_WEIGHTS)[0]
+            return (user_ids[i % len(user_ids)], site_ids[i % len(site_ids)],
+                    rng.choices(BLOOD_TYPES, TYPE_WEIGHTS)[0], rng.randint(1, 4),
+                    rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                    (now - timedelta(seconds=rng.randrange(days * 86400))).isoformat(),
+                    urgency, BloodRequest.URGENCY_PRIORITY[urgency])
+
+        for rows in _batches(requests, make_request):
+            cursor.executemany(
+                'INSERT INTO blood_management_bloodrequest '
+                '(user_id, site_id, blood_type, units_requested, status, request_date, urgency, priority) '
+                'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)', rows)
+
+        bag_counts = {(site_id, blood_type): 0 for site_id in site_ids for blood_type in BLOOD_TYPES}
+
+        def make_bag(i):
+            site_id, blood_type = rng.choice(site_ids), rng.choices(BLOOD_TYPES, TYPE_WEIGHTS)[0]
+            bag_counts[site_id, blood_type] += 1
+            collected = today - timedelta(days=rng.randrange(35))
+            return (site_id, blood_type, collected.isoformat(), (collected + timedelta(days=42)).isoformat(),
+                    'Available')
+
+        for rows in _batches(bags, make_bag):
+            cursor.executemany(
+                'INSERT INTO blood_management_bloodbag (site_id, blood_type, collection_date, expiry_date, status) '
+                'VALUES (%s, %s, %s, %s, %s)', rows)
+        cursor.executemany(
+            'INSERT INTO blood_management_bloodinventory (site_id, blood_type, units_available, units_reserved) '
+            'VALUES (%s, %s, %s, 0)',
+            [(site_id, blood_type, count + UNTRACKED_UNITS) for (site_id, blood_type), count in bag_counts.items()])
+
+    rebuild_index()
+    history = sum(backfill_requests(chunk_size=BATCH_SIZE))
+    return {'donors': donors, 'requests': requests, 'users': users, 'bags': bags, 'sites': sites,
+            'history_requests': history}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donors', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--bags', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365, help='Spread of request dates')
+    parser.add_argument('--sites', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help='SQLite file to create')
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f'{args.output} already exists.')
+    setup_django(args.output)
+    start = time.perf_counter()
+    counts = generate(args.donors, args.requests, args.users, args.bags, args.days, args.seed, args.sites)
+    print(json.dumps({**counts, 'seconds': round(time.perf_counter() - start, 1)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
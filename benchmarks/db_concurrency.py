@@ -0,0 +1,130 @@
+"""
+Concurrent writers against a SQLite file: ``--writers`` threads each run ``--ops``
+write transactions (request fulfillment alternating with a read-then-write inventory
+adjustment). Compares Django's stock SQLite setup (rollback journal, deferred
+transactions, one connection per request) with the tuned profile from settings.py
+(WAL, busy_timeout, synchronous=NORMAL, BEGIN IMMEDIATE, persistent connections)
+and counts "database is locked" failures.
+
+    python -m benchmarks.db_concurrency --writers 50 --ops 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from .common import setup_django
+
+PROFILES = ['stock', 'tuned']
+
+
+def apply_profile(profile):
+    # Must run before Django opens any connection
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blood_bank.settings')
+    from django.conf import settings
+    if profile == 'stock':
+        settings.DATABASES['default'].update(OPTIONS={}, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        settings.SQLITE_PRAGMAS = {}
+
+
+def populate(writers, ops):
+    from django.contrib.auth.models import User
+    from blood_management.models import BloodInventory, BloodRequest
+    user = User.objects.create_user(username='bench_user', password='benchpass')
+    BloodInventory.objects.create(blood_type='O+', units_available=writers * ops)
+    BloodRequest.objects.bulk_create(
+        BloodRequest(user=user, blood_type='O+', units_requested=1) for _ in range(writers * ops)
+    )
+    return list(BloodRequest.objects.order_by('id'))
+
+
+def adjust_inventory():
+    # Reads before writing, the pattern a deferred SQLite transaction cannot upgrade under contention
+    from django.db import transaction
+    from blood_management.models import BloodInventory
+    with transaction.atomic():
+        inventory = BloodInventory.objects.get(blood_type='O+')
+        inventory.units_available += 1
+        inventory.save(update_fields=['units_available'])
+
+
+def writer(requests, stats, lock):
+    from django.db import OperationalError, connection
+    from blood_management.allocation import InventoryConflict, fulfill_request
+    ok = locked = 0
+    latencies = []
+    for index, blood_request in enumerate(requests):
+        start = time.perf_counter()
+        try:
+            if index % 2:
+                adjust_inventory()
+            else:
+                fulfill_request(blood_request)
+            ok += 1
+        except (OperationalError, InventoryConflict):
+            locked += 1  # InventoryConflict wraps "database is locked" on this path
+        latencies.append(time.perf_counter() - start)
+        if connection.settings_dict['CONN_MAX_AGE'] == 0:
+            connection.close()  # What request_finished does between requests without persistent connections
+    connection.close()
+    with lock:
+        stats['ok'] += ok
+        stats['locked'] += locked
+        stats['latencies'] += latencies
+
+
+def run(profile, writers, ops):
+    apply_profile(profile)
+    setup_django()
+    requests = populate(writers, ops)
+    stats, lock = {'ok': 0, 'locked': 0, 'latencies': []}, threading.Lock()
+    threads = [
+        threading.Thread(target=writer, args=(requests[i * ops:(i + 1) * ops], stats, lock))
+        for i in range(writers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(stats['latencies'])
+    return {
+        'profile': profile,
+        'transactions': len(latencies),
+        'committed': stats['ok'],
+        'database_locked_errors': stats['locked'],
+        'transactions_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--ops', type=int, default=20, help='Transactions per writer')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run(args.profile, args.writers, args.ops)))
+        return
+
+    # One process per profile, since the database settings are read once per process
+    results = []
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_concurrency', '--profile', profile,
+             '--writers', str(args.writers), '--ops', str(args.ops)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Latency of /api/donors/compatible/ for a narrow (O-) and the widest (AB+)
+recipient, on the first page and after following the cursor deep into the list.
+
+    python -m benchmarks.donor_matching --rows 1000000
+"""
+import argparse
+import json
+from .common import auth_client, measure, setup_django
+from .donor_search import populate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    populate(args.rows)
+    from django.contrib.auth.models import User
+    client = auth_client(User.objects.create_superuser(username='bench_admin', password='benchpass'))
+
+    results = []
+    for recipient in ('O-', 'A+', 'AB+'):
+        first_url = f'/api/donors/compatible/?recipient={recipient.replace("+", "%2B")}&page_size={args.page_size}'
+        deep_url = first_url
+        for _ in range(100):
+            deep_url = client.get(deep_url).data['next'] or deep_url
+        results.append({
+            'recipient': recipient,
+            'first_page': measure(lambda: client.get(first_url), args.repeat),
+            'page_101': measure(lambda: client.get(deep_url), args.repeat),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Donor search latency: the legacy ``SearchFilter`` icontains scan against the
+FTS5 index used by ``?search=`` on /api/donors/.
+
+    python -m benchmarks.donor_search --rows 1000000
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+from .common import measure, setup_django
+
+FIRST_NAMES = ['Jane', 'John', 'Amina', 'Carlos', 'Mei', 'Olga', 'Ravi', 'Sara', 'Tom', 'Yusuf']
+LAST_NAMES = ['Doe', 'Smith', 'Garcia', 'Chen', 'Ivanova', 'Patel', 'Okafor', 'Nakamura', 'Brown', 'Khan']
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+
+def populate(rows, seed=0):
+    from django.db import connection, transaction
+    from blood_management.search import rebuild_index
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, rows, 50000):
+            cursor.executemany(
+                'INSERT INTO blood_management_donor (name, blood_type, contact_info, last_donation_date) '
+                'VALUES (%s, %s, %s, %s)',
+                [
+                    (f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{i % 997}', rng.choice(BLOOD_TYPES),
+                     f'555-{i:07d}', (start + timedelta(days=rng.randrange(3650))).isoformat())
+                    for i in range(offset, min(rows, offset + 50000))
+                ],
+            )
+        rebuild_index()
+
+
+def legacy_search(term):
+    from django.db.models import Q
+    from blood_management.models import Donor
+    queryset = Donor.objects.filter(
+        Q(name__icontains=term) | Q(blood_type__icontains=term)
+        | Q(contact_info__icontains=term) | Q(last_donation_date__icontains=term)
+    )
+    return queryset.count(), list(queryset[:10])
+
+
+def indexed_search(term):
+    from blood_management.models import Donor
+    from blood_management.search import DonorSearchFilter
+    queryset = DonorSearchFilter().filter_queryset(_Request(term), Donor.objects.all(), None)
+    return queryset.count(), list(queryset[:10])
+
+
+class _Request:
+    def __init__(self, term):
+        self.query_params = {'search': term}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    populate(args.rows)
+
+    results = []
+    for term in ('Nakamura42', '555-0000123', 'Oka', 'O-'):
+        results.append({
+            'term': term,
+            'matches': indexed_search(term)[0],
+            'icontains': measure(lambda: legacy_search(term), args.repeat),
+            'fts5': measure(lambda: indexed_search(term), args.repeat),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
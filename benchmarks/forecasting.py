@@ -0,0 +1,105 @@
+"""
+Demand forecast refresh over years of fulfilled-request history: loading the daily
+rollups into a NumPy matrix plus the vectorized statistics, against replaying every
+request row in Python and smoothing each blood type in a loop. The history is loaded
+into the rollups with the backfill first, as on an existing deployment.
+
+    python -m benchmarks.forecasting --years 5 --per-day 200
+"""
+import argparse
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from .common import measure, setup_django
+
+
+def populate(years, per_day):
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from blood_management.models import default_site_id
+    from blood_management.matching import BLOOD_TYPES
+    user = User.objects.create_user(username='bench_user', password='benchpass')
+    site_id = default_site_id()
+    # Skewed mix so common types (O+, A+) see far more demand than rare ones (AB-)
+    weights = [30, 6, 9, 2, 3, 1, 38, 7]
+    rng = random.Random(17)
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = years * 365
+    with transaction.atomic(), connection.cursor() as cursor:
+        for day in range(days, 0, -1):
+            start = end - timedelta(days=day)
+            cursor.executemany(
+                'INSERT INTO blood_management_bloodrequest '
+                '(user_id, site_id, blood_type, units_requested, status, request_date, urgency, priority) '
+                "VALUES (%s, %s, %s, %s, %s, %s, 'Routine', 2)",
+                [(user.id, site_id, blood_type, rng.randint(1, 4), 'Fulfilled',
+                  (start + timedelta(seconds=rng.randrange(86400))).isoformat())
+                 for blood_type in rng.choices(BLOOD_TYPES, weights, k=per_day)],
+            )
+    return days
+
+
+def python_forecast(days, window, alpha, lead_time, z):
+    # What a per-row replay looks like without NumPy
+    from blood_management.history import bucket_start
+    from blood_management.matching import BLOOD_TYPES
+    from blood_management.models import BloodRequest
+    end = bucket_start(datetime.now(timezone.utc), 'day')
+    start = end - timedelta(days=days)
+    series = {blood_type: [0] * days for blood_type in BLOOD_TYPES}
+    for blood_type, units, requested in (BloodRequest.objects
+                                         .filter(status='Fulfilled', request_date__gte=start, request_date__lt=end)
+                                         .values_list('blood_type', 'units_requested', 'request_date')
+                                         .iterator(chunk_size=5000)):
+        series[blood_type][(requested - start).days] += units
+    forecast = {}
+    for blood_type, values in series.items():
+        smoothed = values[0]
+        for value in values[1:]:
+            smoothed = alpha * value + (1 - alpha) * smoothed
+        recent = values[-window:]
+        mean = sum(recent) / len(recent)
+        spread = math.sqrt(sum((v - mean) ** 2 for v in recent) / len(recent))
+        forecast[blood_type] = math.ceil(round(smoothed * lead_time + z * spread * math.sqrt(lead_time), 6))
+    return forecast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--per-day', type=int, default=200, help='Fulfilled requests per day')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    days = populate(args.years, args.per_day)
+
+    import time
+    from django.test import override_settings
+    from blood_management.forecasting import compute_forecast, load_daily_demand, refresh_forecast
+    from blood_management.history import backfill_requests
+    start = time.perf_counter()
+    for _ in backfill_requests(chunk_size=5000):
+        pass
+    backfill_seconds = time.perf_counter() - start
+    demand = load_daily_demand(days)
+    params = {'window': 28, 'alpha': 0.3, 'lead_time': 2, 'z': 1.65}
+    with override_settings(FORECAST_HISTORY_DAYS=days):
+        numpy_points = {t: s['reorder_point'] for t, s in refresh_forecast().items()}
+        results = {
+            'rows': args.per_day * days,
+            'days': days,
+            'backfill_s': round(backfill_seconds, 2),
+            'load_matrix': measure(lambda: load_daily_demand(days), args.repeat, warmup=1),
+            'vectorized_stats': measure(lambda: compute_forecast(demand, **params), args.repeat * 20),
+            'refresh_forecast': measure(refresh_forecast, args.repeat, warmup=1),
+            'python_replay': measure(lambda: python_forecast(days, **params), args.repeat, warmup=1),
+        }
+    python_points = python_forecast(days, **params)
+    results['reorder_points_match'] = all(numpy_points.get(t, 0) == p for t, p in python_points.items())
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Page latency at increasing depths of /api/admin/requests/ for page number
+pagination (COUNT(*) + OFFSET) and ``?paginator=cursor`` (keyset).
+
+    python -m benchmarks.pagination --rows 100010
+"""
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+from .common import auth_client, measure, setup_django
+
+
+def populate(rows):
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from blood_management.models import default_site_id
+    admin = User.objects.create_superuser(username='bench_admin', password='benchpass')
+    user = User.objects.create_user(username='bench_user', password='benchpass')
+    site_id = default_site_id()
+
+    # Raw inserts so every row gets a distinct request_date (auto_now_add would not allow it)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO blood_management_bloodrequest '
+            '(user_id, site_id, blood_type, units_requested, status, request_date, urgency, priority) '
+            "VALUES (%s, %s, %s, %s, %s, %s, 'Routine', 2)",
+            [(user.id, site_id, 'O+', 1, 'Pending', (start + timedelta(seconds=i)).isoformat()) for i in range(rows)],
+        )
+    return admin
+
+
+def cursor_url_at(offset):
+    # Build the cursor a client would hold after walking to ``offset``
+    from rest_framework.pagination import Cursor
+    from blood_management.models import BloodRequest
+    from blood_management.pagination import BloodRequestCursorPagination
+    last_seen = BloodRequest.objects.order_by('-request_date', '-id')[offset - 1]
+    paginator = BloodRequestCursorPagination()
+    paginator.base_url = '/api/admin/requests/?paginator=cursor'
+    return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(last_seen.request_date)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100010)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    client = auth_client(populate(args.rows))
+
+    results = []
+    for page in (1, 100, 1000, 10000):
+        if (page - 1) * 10 >= args.rows:
+            break
+        page_url = f'/api/admin/requests/?page={page}'
+        cursor_url = cursor_url_at((page - 1) * 10) if page > 1 else '/api/admin/requests/?paginator=cursor'
+        results.append({
+            'page': page,
+            'page_number': measure(lambda: client.get(page_url), args.repeat),
+            'cursor': measure(lambda: client.get(cursor_url), args.repeat),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
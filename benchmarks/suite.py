@@ -0,0 +1,484 @@
+"""
+Benchmark suite covering every named route in blood_bank/urls.py. A synthetic
+dataset (benchmarks.datagen) is generated, or copied from ``--db``, and every
+scenario is measured through the Django test client (``client`` mode) and over
+HTTP against uvicorn serving blood_bank/asgi.py (``server`` mode, requires uvicorn).
+Results are written as JSON and compared with a stored baseline: a scenario whose
+p50 latency grew by more than ``--threshold`` (and by at least ``--min-delta-ms``)
+fails the run with exit status 1, and so does a missing baseline unless the run
+is told not to compare with ``--no-baseline``.
+
+    python -m benchmarks.suite --donors 100000 --requests 100000 --save-baseline
+    python -m benchmarks.suite --donors 100000 --requests 100000 --output results.json
+    python -m benchmarks.suite --db bench.sqlite3 --mode client --only donor
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from .common import measure, setup_django
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MODES = ['client', 'server']
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Scenario:
+    """
+    One request to measure. ``path`` and ``data`` are either constants or callables
+    taking the ``Fixtures``, for requests that need fresh rows on every call.
+    """
+
+    def __init__(self, label, route, method='GET', role='admin', path=None, data=None,
+                 content_type='application/json', headers=None, repeat=None, stream=False):
+        self.label = label
+        self.route = route
+        self.method = method
+        self.role = role
+        self.path = path
+        self.data = data
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.repeat = repeat  # Caps the repetitions of expensive scenarios such as full exports
+        self.stream = stream  # Never-ending response; the time to the first event is measured
+
+    def build(self, fixtures):
+        from django.urls import reverse
+        path = self.path(fixtures) if callable(self.path) else self.path or reverse(self.route)
+        data = self.data(fixtures) if callable(self.data) else self.data
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data).encode()
+        return path, data
+
+
+class Fixtures:
+    """
+    Tokens, ids and a pool of pending requests read from the generated database.
+    Each pending request is handed out once, so fulfilling scenarios never collide.
+    """
+
+    def __init__(self):
+        from django.contrib.auth.models import User
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from blood_management.models import BloodInventory, BloodRequest, Campaign, Donor, default_site_id
+        from .datagen import ADMIN, USER
+        admin = User.objects.get(username=ADMIN[0])
+        self.user = User.objects.get(username=USER[0])
+        self.credentials = {'username': USER[0], 'password': USER[1]}
+        self.refresh = str(RefreshToken.for_user(self.user))
+        self.tokens = {
+            'admin': str(RefreshToken.for_user(admin).access_token),
+            'user': str(RefreshToken.for_user(self.user).access_token),
+        }
+        self.donor = Donor.objects.order_by('id').values('id', 'name', 'blood_type', 'contact_info').first()
+        self.site = default_site_id()
+        # A finished campaign to read back; generated donors have phone numbers, so it has no recipients
+        self.campaign = Campaign.objects.create(blood_type='O-', subject='Bench', message='Bench',
+                                                eligible_before=date.today(), status='Completed').pk
+        # A finished campaign to read back; created ones are dispatched and change under the benchmark
+        self.campaign = Campaign.objects.create(blood_type='O-', subject='Bench recall', message='Bench recall',
+                                                eligible_before=date.today(), status='Completed').pk
+        self.inventory = (BloodInventory.objects
+                          .values('id', 'blood_type', 'units_available')
+                          .get(site_id=self.site, blood_type='O+'))
+        self.replay_request = BloodRequest.objects.filter(status='Pending').order_by('-id').values_list('id', flat=True)[0]
+        self._pending = iter(BloodRequest.objects
+                             .filter(status='Pending')
+                             .exclude(pk=self.replay_request)
+                             .order_by('id')
+                             .values_list('id', flat=True))
+        self._counter = itertools.count()
+
+    def pending(self, count=None):
+        ids = list(itertools.islice(self._pending, count or 1))
+        if len(ids) < (count or 1):
+            raise BenchmarkError('Ran out of pending requests; generate more --requests or lower --repeat.')
+        return ids if count else ids[0]
+
+    def unique(self, prefix):
+        return f'{prefix}_{os.getpid()}_{next(self._counter)}'
+
+
+def _donor_csv(fixtures, rows=100):
+    lines = ['name,blood_type,contact_info,last_donation_date']
+    lines += [f'Bench Import{fixtures.unique("n")},A+,{fixtures.unique("555")},2024-01-01' for _ in range(rows)]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _history_start(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+SCENARIOS = [
+    Scenario('token obtain', 'token_obtain_pair', 'POST', role=None, data=lambda f: f.credentials),
+    Scenario('token refresh', 'token_refresh', 'POST', role=None, data=lambda f: {'refresh': f.refresh}),
+    Scenario('register', 'register', 'POST', role=None,
+             data=lambda f: {'username': f.unique('bench_new'), 'password': 'benchpass', 'email': 'bench@example.com'}),
+    Scenario('metrics', 'metrics'),
+    Scenario('donor list', 'donor_list_create'),
+    Scenario('donor search', 'donor_list_create', path='/api/donors/?search=Nakamura42'),
+    Scenario('donor list cursor', 'donor_list_create', path='/api/donors/?paginator=cursor'),
+    Scenario('donor create', 'donor_list_create', 'POST',
+             data=lambda f: {'name': 'Bench Donor', 'blood_type': 'O-', 'contact_info': f.unique('555'),
+                             'last_donation_date': '2024-01-01'}),
+    Scenario('compatible donors', 'compatible_donor_list', path='/api/donors/compatible/?recipient=AB%2B'),
+    Scenario('donor import 100 rows', 'donor_import', 'POST', data=_donor_csv, content_type='text/csv'),
+    Scenario('donor export', 'donor_export', repeat=3),
+    Scenario('donor detail', 'donor_detail', path=lambda f: f'/api/donors/{f.donor["id"]}/'),
+    Scenario('donor update', 'donor_detail', 'PUT', path=lambda f: f'/api/donors/{f.donor["id"]}/',
+             data=lambda f: {**f.donor, 'last_donation_date': date.today().isoformat()}),
+    Scenario('campaign list', 'campaign_list_create'),
+    Scenario('campaign create', 'campaign_list_create', 'POST',
+             data={'blood_type': 'AB-', 'subject': 'Donors needed', 'message': 'Dear {name}, {blood_type} is low.'}),
+    Scenario('campaign detail', 'campaign_detail', path=lambda f: f'/api/campaigns/{f.campaign}/'),
+    Scenario('campaign list', 'campaign_list_create'),
+    Scenario('campaign detail', 'campaign_detail', path=lambda f: f'/api/campaigns/{f.campaign}/'),
+    Scenario('site list', 'site_list_create'),
+    Scenario('inventory list', 'inventory_list_create'),
+    Scenario('inventory list one site', 'inventory_list_create', path=lambda f: f'/api/inventory/?site={f.site}'),
+    Scenario('inventory update', 'inventory_detail', 'PUT', path=lambda f: f'/api/inventory/{f.inventory["id"]}/',
+             data=lambda f: {'blood_type': 'O+', 'units_available': f.inventory['units_available']}),
+    Scenario('inventory history 30 days', 'inventory_history',
+             path=lambda f: f'/api/inventory/history/?granularity=day&start={_history_start(30)}'),
+    Scenario('inventory forecast', 'inventory_forecast'),
+    Scenario('transfer plan', 'inventory_transfers'),
+    Scenario('bag list', 'bag_list_create'),
+    Scenario('bag receive', 'bag_list_create', 'POST',
+             data=lambda f: {'blood_type': 'A+', 'collection_date': date.today().isoformat()}),
+    Scenario('user requests', 'request_list_create', role='user'),
+    Scenario('request create', 'request_list_create', 'POST', role='user',
+             data={'blood_type': 'A+', 'units_requested': 1}),
+    Scenario('admin requests', 'admin_request_list'),
+    Scenario('admin requests cursor', 'admin_request_list', path='/api/admin/requests/?paginator=cursor&status=Pending'),
+    Scenario('triage queue 20', 'admin_request_queue', path='/api/admin/requests/queue/?limit=20'),
+    Scenario('bulk fulfill 10', 'admin_request_bulk_fulfill', 'POST', data=lambda f: {'request_ids': f.pending(10)}),
+    Scenario('request export', 'admin_request_export', repeat=3),
+    Scenario('request fulfill', 'admin_request_detail', 'PATCH',
+             path=lambda f: f'/api/admin/requests/{f.pending()}/', data={'status': 'Fulfilled'}),
+    Scenario('request reserve', 'admin_request_reserve', 'POST',
+             path=lambda f: f'/api/admin/requests/{f.pending()}/reserve/', data={}),
+    Scenario('async inventory', 'async_inventory_list'),
+    Scenario('async user requests', 'async_request_list', role='user'),
+    Scenario('async admin requests', 'async_admin_request_list'),
+    # The same key on every call: the first one fulfills, every other one is a replay
+    Scenario('request fulfill replay', 'admin_request_detail', 'PATCH',
+             path=lambda f: f'/api/admin/requests/{f.replay_request}/', data={'status': 'Fulfilled'},
+             headers={'Idempotency-Key': 'bench-replay'}),
+    Scenario('event stream connect', 'event_stream', stream=True),
+]
+
+
+def uncovered_routes():
+    """
+    Named routes of blood_bank/urls.py without a scenario.
+    """
+    from django.urls import URLPattern
+    from blood_bank.urls import urlpatterns
+    routes = {pattern.name for pattern in urlpatterns if isinstance(pattern, URLPattern) and pattern.name}
+    return routes - {scenario.route for scenario in SCENARIOS}
+
+
+def _headers(scenario, fixtures):
+    headers = dict(scenario.headers)
+    if scenario.role:
+        headers['Authorization'] = f'Bearer {fixtures.tokens[scenario.role]}'
+    return headers
+
+
+def _check(scenario, status_code):
+    if status_code >= 400:
+        raise BenchmarkError(f'{scenario.method} {scenario.label} returned {status_code}')
+
+
+# Client mode
+
+def _client_call(client, scenario, fixtures):
+    path, data = scenario.build(fixtures)
+    kwargs = {'headers': _headers(scenario, fixtures)}
+    if scenario.method != 'GET':
+        kwargs.update(data=data or b'', content_type=scenario.content_type)
+    response = getattr(client, scenario.method.lower())(path, **kwargs)
+    _check(scenario, response.status_code)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+async def _stream_call(client, scenario, fixtures):
+    path, _ = scenario.build(fixtures)
+    response = await client.get(path, headers=_headers(scenario, fixtures))
+    _check(scenario, response.status_code)
+    stream = response.streaming_content
+    await anext(stream)
+    await stream.aclose()
+
+
+def _measure_stream(scenario, fixtures, repeat):
+    from django.test import AsyncClient
+    client = AsyncClient()
+
+    async def run():
+        samples = []
+        for index in range(repeat + 2):
+            start = time.perf_counter()
+            await _stream_call(client, scenario, fixtures)
+            if index >= 2:  # Warmup
+                samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    return _summary(asyncio.run(run()), sum_ms=None)
+
+
+def run_client(scenario, fixtures, repeat):
+    from django.test import Client
+    if scenario.stream:
+        return _measure_stream(scenario, fixtures, repeat)
+    client = Client()
+    stats = measure(lambda: _client_call(client, scenario, fixtures), repeat)
+    return {**stats, 'requests_per_sec': round(1000 / stats['mean_ms'], 1) if stats['mean_ms'] else None}
+
+
+# Server mode
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by the server')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return int(status_line.split()[1]), headers
+
+
+async def _read_body(reader, headers):
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)  # Chunk and its CRLF
+            if not size:
+                break
+
+
+def _http_request(scenario, fixtures, port):
+    path, data = scenario.build(fixtures)
+    lines = [f'{scenario.method} {path} HTTP/1.1', f'Host: 127.0.0.1:{port}']
+    lines += [f'{name}: {value}' for name, value in _headers(scenario, fixtures).items()]
+    if data is not None or scenario.method != 'GET':
+        data = data or b''
+        lines += [f'Content-Type: {scenario.content_type}', f'Content-Length: {len(data)}']
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode() + (data or b'')
+
+
+async def _server_worker(scenario, fixtures, port, calls, samples):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for _ in range(calls):
+            start = time.perf_counter()
+            writer.write(_http_request(scenario, fixtures, port))
+            await writer.drain()
+            status_code, headers = await _read_response(reader)
+            _check(scenario, status_code)
+            if scenario.stream:
+                await reader.readuntil(b'\n\n')  # First event, then a new connection
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            else:
+                await _read_body(reader, headers)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+async def _server_run(scenario, fixtures, port, repeat, concurrency):
+    await _server_worker(scenario, fixtures, port, 2, [])  # Warmup
+    concurrency = min(concurrency, repeat)
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _server_worker(scenario, fixtures, port, repeat // concurrency + (i < repeat % concurrency), samples)
+        for i in range(concurrency)
+    ])
+    return _summary(samples, sum_ms=(time.perf_counter() - start) * 1000)
+
+
+def run_server(scenario, fixtures, port, repeat, concurrency):
+    return asyncio.run(_server_run(scenario, fixtures, port, repeat, concurrency))
+
+
+def _summary(samples, sum_ms):
+    samples.sort()
+    elapsed = sum_ms if sum_ms is not None else sum(samples)
+    return {
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        'requests_per_sec': round(len(samples) / elapsed * 1000, 1) if elapsed else None,
+    }
+
+
+async def _wait_for_server(server, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise BenchmarkError('uvicorn exited; is it installed? (pip install uvicorn)')
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise BenchmarkError('uvicorn did not start')
+
+
+# Baseline comparison
+
+def compare(results, baseline, threshold, min_delta_ms=1.0):
+    """
+    Scenarios whose p50 latency regressed against ``baseline`` by more than
+    ``threshold`` (a fraction) and ``min_delta_ms``, as a list of readable lines.
+    """
+    regressions = []
+    for label, modes in results['results'].items():
+        for mode, stats in modes.items():
+            if mode not in MODES:
+                continue
+            before = baseline['results'].get(label, {}).get(mode)
+            if not before or 'p50_ms' not in before or 'p50_ms' not in stats:
+                continue
+            delta = stats['p50_ms'] - before['p50_ms']
+            if delta > min_delta_ms and delta > before['p50_ms'] * threshold:
+                regressions.append(f'{label} [{mode}]: p50 {before["p50_ms"]} ms -> {stats["p50_ms"]} ms '
+                                   f'(+{delta / before["p50_ms"]:.0%})')
+    return regressions
+
+
+def check_baseline(report, path, threshold, min_delta_ms=1.0):
+    """
+    Failure lines of ``report`` against the baseline stored at ``path``. A missing
+    baseline is one as well: nothing would have been compared.
+    """
+    if not os.path.exists(path):
+        return [f'no baseline at {path}; run with --save-baseline to create one, '
+                f'or --no-baseline to skip the comparison']
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline['meta']['dataset'].get('donors') != report['meta']['dataset'].get('donors'):
+        print('Warning: the baseline was measured on a different dataset size.', file=sys.stderr)
+    return compare(report, baseline, threshold, min_delta_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donors', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--bags', type=int, default=10000)
+    parser.add_argument('--db', help='Run against a copy of a database made by benchmarks.datagen')
+    parser.add_argument('--mode', choices=MODES + ['both'], default='both')
+    parser.add_argument('--repeat', type=int, default=50, help='Measured calls per scenario and mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='Connections per scenario in server mode')
+    parser.add_argument('--only', help='Run the scenarios whose label contains this text')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--no-baseline', action='store_true', help='Skip the comparison with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed p50 growth, as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore regressions smaller than this')
+    args = parser.parse_args()
+
+    db_path = setup_django(copy_from=args.db)
+    from django.contrib.auth.models import User
+    from blood_management.models import BloodRequest, Donor
+    if args.db:
+        dataset = {'source': os.path.basename(args.db)}
+    else:
+        from .datagen import generate
+        start = time.perf_counter()
+        dataset = generate(args.donors, args.requests, args.users, args.bags)
+        dataset['generate_s'] = round(time.perf_counter() - start, 1)
+    dataset.update(donors=Donor.objects.count(), requests=BloodRequest.objects.count(), users=User.objects.count())
+
+    missing = uncovered_routes()
+    if missing:
+        parser.error(f'Routes without a scenario: {", ".join(sorted(missing))}')
+    scenarios = [s for s in SCENARIOS if not args.only or args.only in s.label]
+    modes = MODES if args.mode == 'both' else [args.mode]
+    fixtures = Fixtures()
+
+    server = None
+    if 'server' in modes:
+        from django.db import connections
+        connections.close_all()  # The server writes to the same file
+        server = subprocess.Popen([sys.executable, '-m', 'benchmarks.asgi_load', '--serve', db_path,
+                                   '--port', str(args.port)])
+    results = {}
+    failed = []
+    try:
+        if server:
+            asyncio.run(_wait_for_server(server, args.port))
+        for scenario in scenarios:
+            repeat = min(args.repeat, scenario.repeat or args.repeat)
+            entry = results.setdefault(scenario.label, {'route': scenario.route, 'method': scenario.method})
+            for mode in modes:
+                try:
+                    if mode == 'client':
+                        entry[mode] = run_client(scenario, fixtures, repeat)
+                    else:
+                        entry[mode] = run_server(scenario, fixtures, args.port, repeat, args.concurrency)
+                except (BenchmarkError, ConnectionError, asyncio.IncompleteReadError) as exc:
+                    entry[mode] = {'error': str(exc)}
+                    failed.append(f'{scenario.label} [{mode}]: {exc}')
+                print(f'{scenario.label:<28} {mode:<6} {json.dumps(entry[mode])}', file=sys.stderr)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'meta': {
+            'dataset': dataset,
+            'modes': modes,
+            'repeat': args.repeat,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + '\n')
+        print(f'Baseline saved to {args.baseline}', file=sys.stderr)
+    elif not args.no_baseline:
+        failed += check_baseline(report, args.baseline, args.threshold, args.min_delta_ms)
+
+    for line in failed:
+        print(f'FAILED {line}', file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
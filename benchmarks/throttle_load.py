@@ -0,0 +1,138 @@
+"""
+Flood load test of the token-bucket throttles, served by uvicorn through
+blood_bank/asgi.py. ``--clients`` well-behaved users each list their requests
+``--rate`` times per second while one admin integration floods donor searches and
+anonymous clients flood /api/token/, each over ``--flood`` connections. The
+well-behaved latency is reported without a flood, under the flood with throttling
+off and under the flood with throttling on, along with how much of the flood was
+served and how much was answered 429.
+
+Requires uvicorn (pip install uvicorn):
+
+    python -m benchmarks.throttle_load --clients 20 --flood 20 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from .asgi_load import _wait_for_port
+from .common import setup_django
+
+
+async def _send(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1]) if status_line else 0
+
+
+def _get(path, token):
+    return f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n'.encode()
+
+
+def _post_form(path, body):
+    return (f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n{body}').encode()
+
+
+async def _client(port, requests, deadline, interval, latencies, statuses):
+    # Sends the requests in turn, at most one per ``interval`` seconds (0: back to back)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        sent = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            code = await _send(reader, writer, requests[sent % len(requests)])
+            sent += 1
+            statuses[code] = statuses.get(code, 0) + 1
+            if latencies is not None:
+                latencies.append(time.perf_counter() - start)
+            if interval:
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+    except (ConnectionError, asyncio.IncompleteReadError):
+        statuses['disconnected'] = statuses.get('disconnected', 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_phase(port, tokens, args, flood):
+    deadline = time.perf_counter() + args.duration
+    latencies, polite, search, login = [], {}, {}, {}
+    clients = [_client(port, [_get('/api/requests/', token)], deadline, 1 / args.rate, latencies, polite)
+               for token in tokens['users']]
+    if flood:
+        searches = [_get(f'/api/donors/?search={term}', tokens['admin']) for term in ('Jane', 'Smith', 'Patel', 'Chen')]
+        clients += [_client(port, searches, deadline, 0, None, search) for _ in range(args.flood)]
+        clients += [_client(port, [_post_form('/api/token/', 'username=bench_user&password=benchpass')],
+                            deadline, 0, None, login) for _ in range(args.flood)]
+    await asyncio.gather(*clients)
+    latencies.sort()
+    return {
+        'well_behaved': {
+            'requests': len(latencies),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+            'p90_ms': round(latencies[int(len(latencies) * 0.9)] * 1000, 2),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+            'statuses': polite,
+        },
+        'search_flood': search,
+        'token_flood': login,
+    }
+
+
+def start_server(db_path, port, throttle):
+    env = {**os.environ, 'BLOOD_BANK_THROTTLE': 'on' if throttle else 'off'}
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.asgi_load', '--serve', db_path,
+                               '--port', str(port)], env=env)
+    asyncio.run(_wait_for_port(port))
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=20, help='Well-behaved users')
+    parser.add_argument('--rate', type=float, default=2, help='Requests per second of each well-behaved user')
+    parser.add_argument('--flood', type=int, default=20, help='Connections of each flood')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--donors', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    db_path = setup_django(throttle=True)
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from .datagen import ADMIN, generate
+    generate(donors=args.donors, requests=args.requests, users=args.clients + 1, bags=1000)
+    users = User.objects.filter(username__startswith='bench_user_').order_by('pk')[:args.clients]
+    tokens = {
+        'admin': str(RefreshToken.for_user(User.objects.get(username=ADMIN[0])).access_token),
+        'users': [str(RefreshToken.for_user(user).access_token) for user in users],
+    }
+
+    results = {'clients': args.clients, 'rate': args.rate, 'flood_connections': args.flood}
+    for phase, throttle, flood in (('quiet', True, False), ('flood_unthrottled', False, True),
+                                   ('flood_throttled', True, True)):
+        server = start_server(db_path, args.port, throttle)
+        try:
+            results[phase] = asyncio.run(run_phase(args.port, tokens, args, flood))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
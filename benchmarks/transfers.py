@@ -0,0 +1,112 @@
+"""
+Multi-site routing and rebalancing over ``--sites`` sites with stock scattered
+around the low-inventory threshold: the transfer plan (min-cost transport per blood
+type) against a greedy plan that fills each deficit from the nearest surplus, and
+nearest-site routing of single requests with NumPy distances against a Python loop
+over the inventory rows.
+
+    python -m benchmarks.transfers --sites 500
+"""
+import argparse
+import json
+import math
+import random
+from .common import measure, setup_django
+
+THRESHOLD = 20
+
+
+def populate(sites, spread, seed):
+    from blood_management.matching import BLOOD_TYPES
+    from blood_management.models import BloodInventory
+    from .datagen import make_sites
+    rng = random.Random(seed)
+    site_ids = make_sites(sites, rng)
+    BloodInventory.objects.bulk_create(
+        BloodInventory(site_id=site_id, blood_type=blood_type,
+                       units_available=max(0, round(rng.gauss(THRESHOLD, spread))))
+        for site_id in site_ids for blood_type in BLOOD_TYPES
+    )
+    return site_ids
+
+
+def _haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, h)))
+
+
+def greedy_plan(blood_types):
+    # Every deficit, largest first, takes from the nearest surplus until covered
+    from blood_management.models import BloodInventory, Site
+    coordinates = dict((pk, (lat, lon)) for pk, lat, lon in Site.objects.values_list('pk', 'latitude', 'longitude'))
+    cost = 0.0
+    for blood_type in blood_types:
+        rows = BloodInventory.objects.filter(blood_type=blood_type).values_list('site_id', 'units_available')
+        surplus = {site: units - THRESHOLD for site, units in rows if units > THRESHOLD}
+        deficits = sorted(((THRESHOLD - units, site) for site, units in rows if units < THRESHOLD), reverse=True)
+        for need, site in deficits:
+            for source in sorted(surplus, key=lambda s: _haversine(coordinates[s], coordinates[site])):
+                if not need:
+                    break
+                units = min(need, surplus[source])
+                if units:
+                    surplus[source] -= units
+                    need -= units
+                    cost += units * _haversine(coordinates[source], coordinates[site])
+    return cost
+
+
+def python_route(site_id, blood_type, units):
+    from blood_management.models import BloodInventory, Site
+    coordinates = dict((pk, (lat, lon)) for pk, lat, lon in Site.objects.values_list('pk', 'latitude', 'longitude'))
+    best, best_distance = None, math.inf
+    for candidate, available, reserved in (BloodInventory.objects
+                                           .filter(blood_type=blood_type)
+                                           .values_list('site_id', 'units_available', 'units_reserved')):
+        distance = _haversine(coordinates[site_id], coordinates[candidate])
+        if available - reserved >= units and distance < best_distance:
+            best, best_distance = candidate, distance
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, default=500)
+    parser.add_argument('--spread', type=float, default=8.0, help='Standard deviation of stock around the threshold')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    site_ids = populate(args.sites, args.spread, args.seed)
+
+    from django.test import override_settings
+    from blood_management.matching import BLOOD_TYPES
+    from blood_management.models import BloodRequest
+    from blood_management.sites import route
+    from blood_management.transfers import plan_transfers
+    rng = random.Random(args.seed)
+    requests = [(BloodRequest(site_id=rng.choice(site_ids), units_requested=rng.randint(1, 4)), rng.choice(BLOOD_TYPES))
+                for _ in range(100)]
+    with override_settings(LOW_INVENTORY_THRESHOLDS=dict.fromkeys(BLOOD_TYPES, THRESHOLD)):
+        moves, shortfall = plan_transfers()
+        results = {
+            'sites': args.sites,
+            'moves': len(moves),
+            'units_moved': sum(move['units'] for move in moves),
+            'shortfall': sum(shortfall.values()),
+            'plan_unit_km': round(sum(move['units'] * move['distance_km'] for move in moves)),
+            'greedy_unit_km': round(greedy_plan(BLOOD_TYPES)),
+            'plan': measure(plan_transfers, args.repeat, warmup=1),
+            'greedy_plan': measure(lambda: greedy_plan(BLOOD_TYPES), args.repeat, warmup=1),
+            'route_100_requests': measure(lambda: [route(r, t) for r, t in requests], args.repeat),
+            'python_route_100_requests': measure(
+                lambda: [python_route(r.site_id, t, r.units_requested) for r, t in requests], args.repeat),
+        }
+    results['routes_match'] = all(route(r, t) == python_route(r.site_id, t, r.units_requested) for r, t in requests)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
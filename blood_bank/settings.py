@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blood_management.middleware.PerformanceMetricsMiddleware',  # Outermost so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,14 +78,70 @@ WSGI_APPLICATION = 'blood_bank.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# BLOOD_BANK_DB selects the profile: 'sqlite' (default) or 'postgres' (pooled, needs psycopg[pool])
+
+DB_PROFILE = os.environ.get('BLOOD_BANK_DB', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BLOOD_BANK_DB_NAME', 'blood_bank'),
+            'USER': os.environ.get('BLOOD_BANK_DB_USER', 'blood_bank'),
+            'PASSWORD': os.environ.get('BLOOD_BANK_DB_PASSWORD', ''),
+            'HOST': os.environ.get('BLOOD_BANK_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('BLOOD_BANK_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0,  # The pool keeps connections open; Django requires 0 with it
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('BLOOD_BANK_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('BLOOD_BANK_DB_POOL_MAX', 20)),
+                    'timeout': 10,  # Seconds to wait for a free connection
+                },
+            },
+        }
+    }
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BLOOD_BANK_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,  # Reuse each thread's connection instead of opening one per request
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock when the transaction starts, so a transaction that reads
+                # first waits on busy_timeout instead of failing with "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown BLOOD_BANK_DB profile {DB_PROFILE!r}; use 'sqlite' or 'postgres'.")
+
+# Applied to every new SQLite connection by blood_management.signals
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers no longer block the writer
+    'busy_timeout': 20000,  # Milliseconds a writer waits for the lock; SQLite's retry loop is not fair
+    'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints only
+}
 
-DATABASES = {
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point INVENTORY_CACHE_ALIAS at a shared backend (e.g. Redis) when running several processes
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+INVENTORY_CACHE_ALIAS = 'default'
+INVENTORY_CACHE_TIMEOUT = 300  # Seconds a snapshot may live without any write
+
+AUTH_PRINCIPAL_CACHE_ALIAS = 'default'
+AUTH_PRINCIPAL_CACHE_TIMEOUT = 60  # Seconds a JWT user principal is served without a query
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,12 +186,96 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'blood_management.authentication.CachedJWTAuthentication',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-        'PAGE_SIZE': 10
+        'PAGE_SIZE': 10,
+
+    'DEFAULT_THROTTLE_CLASSES': (
+        'blood_management.throttling.RoleTokenBucketThrottle',
+    ),
+}
+
+# Token buckets per endpoint scope and role (admin, user, anon): (capacity, refill per second).
+# Clients are throttled per user, or per address when anonymous; roles and scopes without a
+# bucket are not throttled. BLOOD_BANK_THROTTLE=off disables throttling (benchmarks do).
+THROTTLE_BUCKETS = {} if os.environ.get('BLOOD_BANK_THROTTLE') == 'off' else {
+    'default': {'admin': (120, 20), 'user': (60, 10), 'anon': (30, 5)},
+    'donor_search': {'admin': (10, 1)},  # /api/donors/?search=
+    'token': {'anon': (5, 0.2), 'user': (5, 0.2), 'admin': (5, 0.2)},  # /api/token/ hashes the password
+}
+THROTTLE_CACHE_ALIAS = 'default'  # Per process with LocMem; point at a shared backend for one bucket across workers
+THROTTLE_LOCK_TIMEOUT = 0.05  # Seconds a request waits for its bucket before counting as throttled
+
+# Identical concurrent GETs of the same user share one execution; a copy waits at most this long
+COALESCE_WAIT_TIMEOUT = 30  # Seconds
+
+# Upper bound for ?page_size= when list endpoints are called with ?paginator=cursor
+CURSOR_PAGINATION_MAX_PAGE_SIZE = 100
+
+# Minimum days between whole blood donations for a donor to be matched again
+DONOR_ELIGIBILITY_DAYS = 56
+
+# Largest number of rollup buckets one /api/inventory/history/ call may span
+INVENTORY_HISTORY_MAX_BUCKETS = 1000
+
+# Sites (branches): stock, bags and requests without a site belong to the first site,
+# created with this name on a single-site deployment
+DEFAULT_SITE_NAME = 'Main'
+
+# Triage queue: requests due within this window are escalated to Emergency priority;
+# /api/admin/requests/queue/ returns at most TRIAGE_MAX_LIMIT requests, reading
+# pending requests TRIAGE_CHUNK_SIZE at a time
+TRIAGE_ESCALATION_WINDOW = 2 * 60 * 60  # Seconds
+# How often the background thread escalates due requests (None disables the thread; run
+# `manage.py escalate_due_requests` from cron instead)
+TRIAGE_ESCALATION_INTERVAL = 60  # Seconds
+TRIAGE_MAX_LIMIT = 100
+TRIAGE_CHUNK_SIZE = 100
+
+# Server-sent events (/api/events/): keepalive comment interval, events kept for
+# Last-Event-ID resumption, and how far a stream may fall behind before it is dropped
+EVENT_STREAM_HEARTBEAT = 15  # Seconds
+EVENT_STREAM_BUFFER = 1000
+EVENT_STREAM_QUEUE_SIZE = 1000
+
+# Idempotency-Key responses are replayed for this long; purge expired keys with
+# `manage.py purge_idempotency_keys`
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # Seconds
+IDEMPOTENCY_WAIT_TIMEOUT = 10  # Seconds a duplicate waits for the original request to finish
+
+# Default shelf life of a received bag when no expiry date is given (red cells keep 42 days)
+BLOOD_BAG_SHELF_LIFE_DAYS = 42
+
+# Inventory holds: default lifetime, and how often the background sweeper releases expired ones
+# (None disables the thread; run `manage.py release_expired_reservations` from cron instead)
+RESERVATION_TTL = 30 * 60  # Seconds
+RESERVATION_SWEEP_INTERVAL = 60  # Seconds
+RESERVATION_SWEEP_BATCH_SIZE = 500
+
+# Demand forecast driving the low-inventory thresholds (blood_management/forecasting.py)
+FORECAST_HISTORY_DAYS = 365  # Days of fulfilled requests loaded per refresh
+FORECAST_WINDOW_DAYS = 28  # Moving average and demand spread window
+FORECAST_SMOOTHING = 0.3  # Exponential smoothing factor
+FORECAST_REFRESH_INTERVAL = 6 * 60 * 60  # Seconds a cached forecast is used
+REORDER_LEAD_TIME_DAYS = 2  # Days to restock a blood type
+REORDER_SERVICE_LEVEL_Z = 1.65  # Safety stock in standard deviations (~95% service level)
+
+# Donor recall campaigns (/api/campaigns/): donors read and mailed per batch over one
+# connection, and the most messages sent per second (None for no limit)
+CAMPAIGN_BATCH_SIZE = 500
+CAMPAIGN_RATE_LIMIT = None
+
+#Low_Inventory Check thresholds (units), per blood type with a default for the rest.
+#Configured types override the forecast reorder point; the default covers types without demand history
+LOW_INVENTORY_DEFAULT_THRESHOLD = 5
+LOW_INVENTORY_MIN_THRESHOLD = 1  # Floor of forecast thresholds, so an empty type always alerts
+LOW_INVENTORY_THRESHOLDS = {
+    # 'O-': 20,
 }
+LOW_INVENTORY_ALERT_DEBOUNCE = 60 * 60  # Seconds before the same blood type is reported again
+LOW_INVENTORY_ALERT_RECIPIENTS = ['placeholder@example.com']  # Placeholder email since local testing
 
 #Local Email Testing for Low_Inventory Check
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' 
@@ -3,16 +3,18 @@
 from django.contrib import admin
 from django.urls import path
 from django.http import HttpResponse
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.urls import path
+from blood_management import async_views
 from blood_management.views import (
     DonorListCreateView, DonorDetailView,
     BloodInventoryListCreateView, BloodInventoryDetailView,
     BloodRequestAdminListView, BloodRequestListCreateView,
-    UserRegistrationView,BloodRequestAdminDetailView
+    UserRegistrationView,BloodRequestAdminDetailView,
+    BloodRequestBulkFulfillView, CompatibleDonorListView,
+    DonorImportView, DonorExportView, BloodRequestExportView,
+    BloodRequestReservationView, BloodRequestQueueView, BloodBagListCreateView, InventoryHistoryView, InventoryForecastView,
+    InventoryTransferView, MetricsView, SiteListCreateView, CampaignListCreateView, CampaignDetailView, TokenObtainView
 )
 
 def home_view(request):
@@ -21,21 +23,41 @@ def home_view(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home_view),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', TokenObtainView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/register/', UserRegistrationView.as_view(), name='register'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 
     # Donor URLs (Admins)
     path('api/donors/', DonorListCreateView.as_view(), name='donor_list_create'),
+    path('api/donors/compatible/', CompatibleDonorListView.as_view(), name='compatible_donor_list'),
+    path('api/donors/import/', DonorImportView.as_view(), name='donor_import'),
+    path('api/donors/export/', DonorExportView.as_view(), name='donor_export'),
     path('api/donors/<int:pk>/', DonorDetailView.as_view(), name='donor_detail'),
+    path('api/campaigns/', CampaignListCreateView.as_view(), name='campaign_list_create'),
+    path('api/campaigns/<int:pk>/', CampaignDetailView.as_view(), name='campaign_detail'),
 
-    # Blood Inventory URLs (Admins)
+    # Site and Blood Inventory URLs (Admins)
+    path('api/sites/', SiteListCreateView.as_view(), name='site_list_create'),
     path('api/inventory/', BloodInventoryListCreateView.as_view(), name='inventory_list_create'),
     path('api/inventory/<int:pk>/', BloodInventoryDetailView.as_view(), name='inventory_detail'),
+    path('api/inventory/history/', InventoryHistoryView.as_view(), name='inventory_history'),
+    path('api/inventory/forecast/', InventoryForecastView.as_view(), name='inventory_forecast'),
+    path('api/inventory/transfers/', InventoryTransferView.as_view(), name='inventory_transfers'),
+    path('api/bags/', BloodBagListCreateView.as_view(), name='bag_list_create'),
 
     # Blood Request URLs (Regular Users and Admins)
     path('api/requests/', BloodRequestListCreateView.as_view(), name='request_list_create'),
     path('api/admin/requests/', BloodRequestAdminListView.as_view(), name='admin_request_list'),
+    path('api/admin/requests/queue/', BloodRequestQueueView.as_view(), name='admin_request_queue'),
+    path('api/admin/requests/fulfill/', BloodRequestBulkFulfillView.as_view(), name='admin_request_bulk_fulfill'),
+    path('api/admin/requests/export/', BloodRequestExportView.as_view(), name='admin_request_export'),
     path('api/admin/requests/<int:pk>/', BloodRequestAdminDetailView.as_view(), name='admin_request_detail'),
+    path('api/admin/requests/<int:pk>/reserve/', BloodRequestReservationView.as_view(), name='admin_request_reserve'),
 
+    # Async-native read endpoints (best served through blood_bank/asgi.py)
+    path('api/async/inventory/', async_views.inventory_snapshot, name='async_inventory_list'),
+    path('api/async/requests/', async_views.user_requests, name='async_request_list'),
+    path('api/async/admin/requests/', async_views.admin_requests, name='async_admin_request_list'),
+    path('api/events/', async_views.events, name='event_stream'),
 ]
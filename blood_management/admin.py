@@ -0,0 +1,86 @@
+from django.contrib import admin
+from django.db import transaction
+from .history import adjustment_changes, record_changes
+from .models import Donor, BloodBag, BloodInventory, BloodRequest, Campaign, Reservation, Site
+
+
+@admin.register(Donor)
+class DonorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'blood_type', 'contact_info', 'last_donation_date']
+    list_filter = ['blood_type']
+    search_fields = ['name', 'contact_info']
+
+
+@admin.register(Site)
+class SiteAdmin(admin.ModelAdmin):
+    list_display = ['name', 'latitude', 'longitude']
+    search_fields = ['name']
+
+
+@admin.register(BloodInventory)
+class BloodInventoryAdmin(admin.ModelAdmin):
+    list_display = ['site', 'blood_type', 'units_available', 'units_reserved']
+    list_filter = ['site', 'blood_type']
+    list_select_related = ['site']
+    readonly_fields = ['units_reserved']  # Maintained by reservations only
+
+    def save_model(self, request, obj, form, change):
+        # Admin edits are recorded in the inventory ledger like API edits
+        with transaction.atomic():
+            previous = ((form.initial.get('site'), form.initial.get('blood_type'), form.initial.get('units_available', 0))
+                        if change else None)
+            super().save_model(request, obj, form, change)
+            if previous is None:
+                record_changes([(obj.site_id, obj.blood_type, obj.units_available, 'create', None)])
+            else:
+                record_changes(adjustment_changes(previous, obj))
+
+
+@admin.register(BloodRequest)
+class BloodRequestAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'site', 'blood_type', 'units_requested', 'urgency', 'status', 'request_date']
+    list_filter = ['status', 'urgency', 'blood_type', 'site']
+    readonly_fields = ['priority', 'fulfilled_from']  # Derived on save and set by fulfillment
+    # The user column (and BloodRequest.__str__) reads user.username and the site column site.name for every row
+    list_select_related = ['user', 'site']
+    raw_id_fields = ['user']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).only(
+            'id', 'blood_type', 'units_requested', 'urgency', 'status', 'request_date', 'user', 'user__id',
+            'user__username', 'site', 'site__id', 'site__name',
+        )
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'blood_request', 'site', 'blood_type', 'units', 'status', 'expires_at']
+    list_filter = ['status', 'site', 'blood_type']
+    list_select_related = ['site']
+    raw_id_fields = ['blood_request']
+    # Holds change units_reserved, so they are created and released through the API only
+    readonly_fields = ['blood_request', 'site', 'blood_type', 'units', 'status', 'expires_at', 'released_at']
+
+
+@admin.register(BloodBag)
+class BloodBagAdmin(admin.ModelAdmin):
+    list_display = ['id', 'site', 'blood_type', 'collection_date', 'expiry_date', 'status', 'blood_request']
+    list_filter = ['status', 'site', 'blood_type']
+    list_select_related = ['site']
+    raw_id_fields = ['donor', 'blood_request']
+    # Bags move the inventory counts, so they are received and allocated through the API only
+    readonly_fields = ['site', 'status', 'blood_request']  # Bags change site through transfers
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ['id', 'blood_type', 'subject', 'status', 'sent', 'total', 'created_at']
+    list_filter = ['status', 'blood_type']
+    # Campaigns are started, paused and resumed through the API, which runs the dispatcher
+    readonly_fields = ['status', 'created_by', 'finished_at', 'total', 'sent', 'cursor', 'error']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.core.mail import send_mail
+from .forecasting import get_forecast
+from .inventory_cache import get_site_levels
+
+logger = logging.getLogger(__name__)
+
+
+def get_threshold(blood_type, forecast=None):
+    """
+    Critical level for a blood type: a configured threshold, else the forecast
+    reorder point (at least ``LOW_INVENTORY_MIN_THRESHOLD``), else the default
+    threshold for types without demand history.
+    """
+    thresholds = getattr(settings, 'LOW_INVENTORY_THRESHOLDS', {})
+    if blood_type in thresholds:
+        return thresholds[blood_type]
+    if forecast and blood_type in forecast:
+        # Demand that stopped within the window leaves a reorder point of 0, which nothing is below
+        return max(forecast[blood_type]['reorder_point'], getattr(settings, 'LOW_INVENTORY_MIN_THRESHOLD', 1))
+    return getattr(settings, 'LOW_INVENTORY_DEFAULT_THRESHOLD', 5)
+
+
+def get_thresholds(blood_types, site_id=None):
+    forecast = get_forecast(site_id)
+    return {blood_type: get_threshold(blood_type, forecast) for blood_type in blood_types}
+
+
+class LowInventoryAlerter:
+    """
+    Background worker that sends low-inventory emails off the request thread.
+    Only blood types that crossed below their threshold at a site since that site's
+    last snapshot are reported, and a type is not reported again for the same site
+    until the debounce window has passed.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._below = {}
+        self._last_sent = {}
+
+    def submit(self, levels, thresholds=None, site=None):
+        # levels maps blood_type -> units free at the named site, thresholds blood_type -> critical level
+        self._ensure_worker()
+        self._queue.put((levels, thresholds, site))
+
+    def join(self):
+        """
+        Block until every submitted snapshot has been processed.
+        """
+        self._queue.join()
+
+    def reset(self):
+        with self._lock:
+            self._below.clear()
+            self._last_sent.clear()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='low-inventory-alerts', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            levels, thresholds, site = self._queue.get()
+            try:
+                self.process(levels, thresholds, site)
+            except Exception:
+                logger.exception("Failed to send low inventory alert")
+            finally:
+                self._queue.task_done()
+
+    def process(self, levels, thresholds=None, site=None):
+        now = time.monotonic()
+        debounce = getattr(settings, 'LOW_INVENTORY_ALERT_DEBOUNCE', 3600)
+        thresholds = thresholds or {}
+        with self._lock:
+            below = {
+                blood_type for blood_type, units in levels.items()
+                if units < thresholds.get(blood_type, get_threshold(blood_type))
+            }
+            previous = self._below.get(site, set())
+            crossed = sorted(
+                blood_type for blood_type in below - previous
+                if now - self._last_sent.get((site, blood_type), -debounce) >= debounce
+            )
+            # Types missing from a snapshot keep their previous state
+            self._below[site] = (previous - set(levels)) | below
+            for blood_type in crossed:
+                self._last_sent[(site, blood_type)] = now
+
+        if crossed:
+            where = f' at {site}' if site else ''
+            send_mail(
+                'Critical Blood Inventory Alert',
+                f'The following blood types are below critical levels{where}: {", ".join(crossed)}. '
+                'Please replenish soon.',
+                settings.DEFAULT_FROM_EMAIL,
+                getattr(settings, 'LOW_INVENTORY_ALERT_RECIPIENTS', ['placeholder@example.com']),
+            )
+
+
+alerter = LowInventoryAlerter()
+
+
+# Function to check low inventory and queue email notifications
+def check_low_inventory(site_ids=None):
+    # Levels of the given sites (default: all) come from the cached inventory snapshot and
+    # thresholds from each site's cached demand forecast; the mail is sent by the background worker
+    for site_id, (name, levels) in get_site_levels(site_ids).items():
+        alerter.submit(levels, get_thresholds(levels, site_id), name)
@@ -0,0 +1,182 @@
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from .models import BloodInventory, BloodRequest, Reservation
+from .inventory_cache import invalidate_inventory
+from .bags import allocate_bags
+from .events import request_status_changed
+from .history import record_changes
+from .matching import TYPE_INDEX
+from .sites import SiteMap, load_free_stock, nearest_with_stock, route, site_type_filter, site_type_increment
+
+
+class InventoryConflict(APIException):
+    """
+    Raised when another admin changed the request or the inventory row first.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The request or inventory was modified concurrently. Please retry.'
+    default_code = 'conflict'
+
+
+def fulfill_request(blood_request, source_type=None, site=None):
+    """
+    Fulfill a single blood request with conditional UPDATEs in one transaction:
+    the status transition claims the request, the inventory decrement only matches
+    while enough unreserved units (plus the request's own hold) are left, so
+    concurrent admins can never oversell stock or take units held for another request.
+    Tracked bags are then assigned first-expiring-first-out. ``source_type`` fulfills
+    the request from a compatible substitute instead of its own blood type, and
+    ``site`` from that site's stock; by default the nearest site with enough is used.
+    """
+    units = blood_request.units_requested
+    source_type = source_type or blood_request.blood_type
+    previous_status = blood_request.status
+    hold = (Reservation.objects
+            .filter(blood_request=blood_request, status='Active')
+            .values_list('pk', 'site_id', 'blood_type', 'units')
+            .first())
+    site_id = getattr(site, 'pk', site) or route(blood_request, source_type, hold and hold[1:])
+    if site_id is None:
+        if not BloodInventory.objects.filter(blood_type=source_type).exists():
+            raise Http404('No inventory found for this blood type.')
+        raise ValidationError("Not enough units available in inventory to fulfill this request.")
+    try:
+        with transaction.atomic():
+            claimed = (BloodRequest.objects
+                       .filter(pk=blood_request.pk)
+                       .exclude(status='Fulfilled')
+                       .update(status='Fulfilled', fulfilled_from=site_id))
+            if not claimed:
+                raise InventoryConflict('This request has already been fulfilled.')
+
+            # An active hold on the source site and type is consumed: its units move from
+            # reserved to dispatched. A hold anywhere else is no longer needed and is released.
+            held = 0
+            if hold:
+                hold_id, hold_site, hold_type, hold_units = hold
+                consumed = (hold_site, hold_type) == (site_id, source_type)
+                if Reservation.objects.filter(pk=hold_id, status='Active').update(
+                        status='Consumed' if consumed else 'Released', released_at=timezone.now()):
+                    if consumed:
+                        held = hold_units
+                    else:
+                        BloodInventory.objects.filter(site_id=hold_site, blood_type=hold_type).update(
+                            units_reserved=F('units_reserved') - hold_units)
+
+            decremented = (BloodInventory.objects
+                           .filter(site_id=site_id, blood_type=source_type,
+                                   units_available__gte=F('units_reserved') - held + units)
+                           .update(units_available=F('units_available') - units,
+                                   units_reserved=F('units_reserved') - held))
+            if not decremented:
+                # Rolls back the status transition above
+                if not BloodInventory.objects.filter(site_id=site_id, blood_type=source_type).exists():
+                    raise Http404('No inventory found for this blood type.')
+                raise ValidationError("Not enough units available in inventory to fulfill this request.")
+            allocate_bags([(blood_request.pk, site_id, source_type, units)])
+            record_changes([(site_id, source_type, -units, 'fulfill', blood_request.pk)])
+            invalidate_inventory()  # QuerySet.update() bypasses the post_save signal
+    except OperationalError as exc:
+        # SQLite reports writer contention as "database is locked"
+        raise InventoryConflict() from exc
+
+    blood_request.status = 'Fulfilled'
+    blood_request.fulfilled_from_id = site_id
+    request_status_changed.send(sender=BloodRequest, transitions=[(blood_request, previous_status)])
+    return blood_request
+
+
+def allocate_requests(pending):
+    """
+    Fulfill many pending requests in one transaction with a constant number of queries.
+    Requests are served in FIFO ``request_date`` order, each from the nearest site that
+    still has enough of its blood type; a request no site can cover is skipped so
+    smaller, later requests can still be served.
+    Returns ``(fulfilled, skipped)`` where ``skipped`` maps request id to a reason.
+    """
+    pending = list(pending.filter(status='Pending').order_by('request_date', 'id'))
+    sites = SiteMap()
+    remaining = load_free_stock(sites, {r.blood_type for r in pending})
+    holds = {request_id: (pk, site_id, units)
+             for pk, request_id, site_id, units in (Reservation.objects
+                                                    .filter(blood_request__in=[r.pk for r in pending], status='Active')
+                                                    .values_list('pk', 'blood_request_id', 'site_id', 'units'))}
+
+    # Per (site_id, blood_type): units dispatched, and units leaving units_reserved
+    fulfilled, skipped, allocated, unreserved, consumed, released = [], {}, {}, {}, [], []
+    for blood_request in pending:
+        blood_type, units = blood_request.blood_type, blood_request.units_requested
+        column = TYPE_INDEX[blood_type]
+        # A request's own hold counts towards it at its site; only the rest must come from free stock
+        hold_id, hold_site, held = holds.get(blood_request.pk, (None, None, 0))
+        free = remaining[:, column].copy()
+        if hold_id is not None:
+            free[sites.index[hold_site]] += held
+        nearest = nearest_with_stock(sites.distances_from(blood_request.site_id), free, units)
+        if nearest is None:
+            skipped[blood_request.pk] = ('Not enough units available in inventory.' if (free >= 0).any()
+                                         else 'No inventory found for this blood type.')
+            continue
+
+        site_id = sites.ids[nearest]
+        remaining[nearest, column] -= units
+        allocated[(site_id, blood_type)] = allocated.get((site_id, blood_type), 0) + units
+        if hold_id is not None:
+            # Consumed where the units are taken from; a hold at another site goes back to its free pool
+            remaining[sites.index[hold_site], column] += held
+            unreserved[(hold_site, blood_type)] = unreserved.get((hold_site, blood_type), 0) + held
+            (consumed if hold_site == site_id else released).append(hold_id)
+        blood_request.status = 'Fulfilled'
+        blood_request.fulfilled_from_id = site_id
+        fulfilled.append(blood_request)
+
+    if not fulfilled:
+        return fulfilled, skipped
+
+    by_site = {}
+    for blood_request in fulfilled:
+        by_site.setdefault(blood_request.fulfilled_from_id, []).append(blood_request.pk)
+    try:
+        with transaction.atomic():
+            # Every status change is the same, so one conditional UPDATE both applies
+            # them and detects requests another admin claimed in the meantime
+            claimed = (BloodRequest.objects
+                       .filter(pk__in=[r.pk for r in fulfilled], status='Pending')
+                       .update(status='Fulfilled', fulfilled_from=Case(
+                           *[When(pk__in=ids, then=Value(site_id)) for site_id, ids in by_site.items()],
+                           output_field=BloodRequest._meta.get_field('fulfilled_from'),
+                       )))
+            if claimed != len(fulfilled):
+                raise InventoryConflict()
+
+            for hold_ids, hold_status in ((consumed, 'Consumed'), (released, 'Released')):
+                if hold_ids and Reservation.objects.filter(pk__in=hold_ids, status='Active').update(
+                        status=hold_status, released_at=timezone.now()) != len(hold_ids):
+                    raise InventoryConflict()
+
+            # Re-check every allocation inside one UPDATE so a concurrent writer aborts the batch
+            enough = site_type_filter(set(unreserved) - set(allocated))
+            for (site_id, blood_type), units in allocated.items():
+                enough |= Q(site_id=site_id, blood_type=blood_type,
+                            units_available__gte=F('units_reserved') - unreserved.get((site_id, blood_type), 0) + units)
+            decremented = BloodInventory.objects.filter(enough).update(
+                units_available=site_type_increment(
+                    BloodInventory, 'units_available', {key: -units for key, units in allocated.items()}),
+                units_reserved=site_type_increment(
+                    BloodInventory, 'units_reserved', {key: -units for key, units in unreserved.items()}),
+            )
+            if decremented != len(set(allocated) | set(unreserved)):
+                raise InventoryConflict()
+            allocate_bags([(r.pk, r.fulfilled_from_id, r.blood_type, r.units_requested) for r in fulfilled])
+            record_changes([(r.fulfilled_from_id, r.blood_type, -r.units_requested, 'fulfill', r.pk)
+                            for r in fulfilled])
+            invalidate_inventory()
+    except OperationalError as exc:
+        raise InventoryConflict() from exc
+
+    request_status_changed.send(sender=BloodRequest, transitions=[(r, 'Pending') for r in fulfilled])
+    return fulfilled, skipped
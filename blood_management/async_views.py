@@ -0,0 +1,187 @@
+"""
+Async-native read endpoints served alongside the DRF views when running under ASGI
+(blood_bank/asgi.py). They authenticate with the cached JWT principal and read with
+the async ORM, and return the same JSON shapes as their sync counterparts.
+"""
+import time
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .authentication import CachedJWTAuthentication
+from .events import hub
+from .inventory_cache import aget_inventory_snapshot, is_not_modified, set_validators
+from .models import BloodRequest
+from .permissions import IsAdminUser, IsRegularUser
+from .serializer import BloodRequestSerializer
+
+
+def _error(detail, status_code, **headers):
+    response = JsonResponse({'detail': detail}, status=status_code)
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+
+async def _authorize(request, permission):
+    """
+    Authenticate the bearer token and check ``permission``.
+    Returns an error response, or None once ``request.user`` is set.
+    """
+    auth = CachedJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return _error('Authentication credentials were not provided.', status.HTTP_401_UNAUTHORIZED,
+                      WWW_Authenticate=auth.authenticate_header(request))
+    try:
+        token = auth.get_validated_token(raw_token)
+        request.jwt_decode_seconds = auth.decode_seconds
+        request.user = await auth.aget_user(token)
+        request.auth = token
+    except APIException as exc:
+        return _error(exc.detail, exc.status_code, WWW_Authenticate=auth.authenticate_header(request))
+
+    if not permission().has_permission(request, None):
+        return _error('You do not have permission to perform this action.', status.HTTP_403_FORBIDDEN)
+    return None
+
+
+def _site_param(request):
+    """
+    The site id given as ``?site=``, parsed like ``views.site_param``.
+    Returns ``(site_id, error)``; both are None when the parameter is absent.
+    """
+    value = request.GET.get('site')
+    if not value:
+        return None, None
+    try:
+        return int(value), None
+    except ValueError:
+        return None, JsonResponse({'site': 'A valid integer is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+async def _paginate(request, queryset):
+    # Same page number shape as DRF's PageNumberPagination
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    if not 1 <= page <= last_page:
+        return None
+
+    offset = (page - 1) * page_size
+    items = [item async for item in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    previous_url = None
+    if page > 1:
+        previous_url = replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < last_page else None,
+        'previous': previous_url,
+        'results': BloodRequestSerializer(items, many=True).data,
+    }
+
+
+@require_GET
+async def inventory_snapshot(request):
+    error = await _authorize(request, IsAdminUser)
+    if error:
+        return error
+    site_id, error = _site_param(request)
+    if error:
+        return error
+    version, rows = await aget_inventory_snapshot(site_id)
+    if is_not_modified(request, version):
+        return set_validators(HttpResponseNotModified(), version)
+    return set_validators(JsonResponse({'count': len(rows), 'next': None, 'previous': None, 'results': rows}),
+                          version)
+
+
+@require_GET
+async def user_requests(request):
+    error = await _authorize(request, IsRegularUser)
+    if error:
+        return error
+    site_id, error = _site_param(request)
+    if error:
+        return error
+    queryset = BloodRequest.objects.filter(user=request.user)
+    if site_id is not None:
+        queryset = queryset.filter(site_id=site_id)
+    data = await _paginate(request, queryset)
+    return JsonResponse(data) if data else _error('Invalid page.', status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+async def admin_requests(request):
+    error = await _authorize(request, IsAdminUser)
+    if error:
+        return error
+    site_id, error = _site_param(request)
+    if error:
+        return error
+    queryset = BloodRequest.objects.all()
+    for field in ('status', 'blood_type'):
+        value = request.GET.get(field)
+        if value:
+            queryset = queryset.filter(**{field: value})
+    if site_id is not None:
+        queryset = queryset.filter(site_id=site_id)
+    data = await _paginate(request, queryset)
+    return JsonResponse(data) if data else _error('Invalid page.', status.HTTP_404_NOT_FOUND)
+
+
+async def _stream(user, last_event_id, expires_at):
+    heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+    # Subscribed once the body is being sent, so an unsent response cannot leak a subscriber
+    subscription, backlog = hub.subscribe(user, last_event_id)
+    try:
+        yield 'retry: 3000\n\n'  # Reconnect delay for EventSource clients, in milliseconds
+        if backlog is None:
+            yield 'event: reset\ndata: {}\n\n'  # Events were missed; reload the lists before following
+        for event in backlog or ():
+            yield event.frame
+        while not subscription.overflowed:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                break  # The client reconnects with a fresh access token
+            events = await subscription.wait(min(heartbeat, remaining))
+            if not events:
+                yield ': keepalive\n\n'
+            for event in events:
+                yield event.frame
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@require_GET
+async def events(request):
+    """
+    Server-sent events: ``inventory`` deltas and ``request`` status transitions
+    (admins see every event, regular users the transitions of their own requests).
+    Refused under WSGI, where each open stream would hold a worker thread until it ends.
+    """
+    if not isinstance(request, ASGIRequest):
+        return _error('The event stream is only served through ASGI.', status.HTTP_501_NOT_IMPLEMENTED)
+    error = await _authorize(request, IsAuthenticated)
+    if error:
+        return error
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = -1  # Not one of ours, so the stream starts with a reset
+    response = StreamingHttpResponse(_stream(request.user, last_event_id, request.auth['exp']),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
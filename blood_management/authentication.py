@@ -0,0 +1,103 @@
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+PRINCIPAL_KEY = 'auth:principal:{}'
+# In User's concrete field order, as Model.from_db() expects
+PRINCIPAL_FIELDS = ['id', 'is_superuser', 'username', 'is_staff', 'is_active']
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_PRINCIPAL_CACHE_ALIAS', 'default')]
+
+
+def invalidate_principal(user_id):
+    _cache().delete(PRINCIPAL_KEY.format(user_id))
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that records how long token validation took on the underlying
+    Django request, for the performance metrics middleware.
+    """
+    decode_seconds = None
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        finally:
+            if self.decode_seconds is not None:
+                request._request.jwt_decode_seconds = self.decode_seconds
+
+    def get_validated_token(self, raw_token):
+        start = time.perf_counter()
+        try:
+            return super().get_validated_token(raw_token)
+        finally:
+            self.decode_seconds = time.perf_counter() - start
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    Serves the user for a valid token from a short-lived cache of its principal
+    (id, is_superuser, username, is_staff, is_active) instead of querying auth_user on
+    every request. The entry is dropped by signals when the user is saved or deleted.
+    The returned user has every other field deferred, so touching one loads it lazily
+    and saving it only writes the loaded fields.
+    """
+    def get_user(self, validated_token):
+        if self.uses_stock_lookup():
+            return super().get_user(validated_token)
+
+        key = PRINCIPAL_KEY.format(self.get_user_id(validated_token))
+        principal = _cache().get(key)
+        if principal is None:
+            principal = self.principal_queryset(validated_token).first()
+            self.remember_principal(key, principal)
+        return self.build_user(principal)
+
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of get_user() for the async views.
+        """
+        if self.uses_stock_lookup():
+            return await sync_to_async(super().get_user)(validated_token)
+
+        key = PRINCIPAL_KEY.format(self.get_user_id(validated_token))
+        principal = await _cache().aget(key)
+        if principal is None:
+            principal = await self.principal_queryset(validated_token).afirst()
+            if principal is not None:
+                await _cache().aset(key, principal, timeout=getattr(settings, 'AUTH_PRINCIPAL_CACHE_TIMEOUT', 60))
+        return self.build_user(principal)
+
+    def uses_stock_lookup(self):
+        # Revocation needs the password hash; keep the stock lookup for that setup
+        return api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != 'id'
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def principal_queryset(self, validated_token):
+        return self.user_model.objects.filter(pk=self.get_user_id(validated_token)).values_list(*PRINCIPAL_FIELDS)
+
+    def remember_principal(self, key, principal):
+        if principal is not None:
+            _cache().set(key, principal, timeout=getattr(settings, 'AUTH_PRINCIPAL_CACHE_TIMEOUT', 60))
+
+    def build_user(self, principal):
+        if principal is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, PRINCIPAL_FIELDS, principal)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
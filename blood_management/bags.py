@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.utils import timezone
+from .history import record_changes
+from .inventory_cache import invalidate_inventory
+from .models import BloodBag, BloodInventory
+from .sites import site_type_filter, site_type_increment
+
+# BloodInventory.units_available is the materialized count of usable units per site and type.
+# Bags move it incrementally: +1 when received, -1 when allocated (through the
+# fulfillment decrement) or expired. Units entered directly on the inventory are
+# not backed by bags and are handed out after the tracked bags run out.
+
+
+def receive_bags(bags):
+    """
+    Insert new bags and add them to the inventory counts of their sites, one UPDATE
+    for all sites and types.
+    """
+    totals = {}
+    for bag in bags:
+        key = (bag.site_id, bag.blood_type)
+        totals[key] = totals.get(key, 0) + 1
+    if not totals:
+        return []
+
+    with transaction.atomic():
+        bags = BloodBag.objects.bulk_create(bags)
+        BloodInventory.objects.bulk_create(
+            [BloodInventory(site_id=site_id, blood_type=blood_type, units_available=0) for site_id, blood_type in totals],
+            ignore_conflicts=True,  # Only types without an inventory row at the site yet
+        )
+        BloodInventory.objects.filter(site_type_filter(totals)).update(
+            units_available=site_type_increment(BloodInventory, 'units_available', totals))
+        record_changes([(site_id, blood_type, count, 'receive', None)
+                        for (site_id, blood_type), count in totals.items()])
+        invalidate_inventory()
+    return bags
+
+
+def allocate_bags(allocations, today=None):
+    """
+    Assign bags first-expiring-first-out to ``(request_id, site_id, blood_type, units)``
+    allocations, served in the given order. One ranked SELECT picks the bags of every
+    site and type and one UPDATE assigns them, however many requests there are. The
+    caller's transaction decrements the inventory counts.
+    Returns the number of bags allocated.
+    """
+    today = today or timezone.localdate()
+    needed = {}
+    for _, site_id, blood_type, units in allocations:
+        needed[(site_id, blood_type)] = needed.get((site_id, blood_type), 0) + units
+
+    within_need = Q()
+    for (site_id, blood_type), units in needed.items():
+        within_need |= Q(site_id=site_id, blood_type=blood_type, fefo_rank__lte=units)
+    bag_ids = {}
+    for pk, site_id, blood_type in (BloodBag.objects
+                                    .filter(site_type_filter(needed), status='Available', expiry_date__gte=today)
+                                    .annotate(fefo_rank=Window(RowNumber(), partition_by=[F('site'), F('blood_type')],
+                                                               order_by=[F('expiry_date'), F('id')]))
+                                    .filter(within_need)
+                                    .order_by('expiry_date', 'id')
+                                    .values_list('pk', 'site_id', 'blood_type')):
+        bag_ids.setdefault((site_id, blood_type), []).append(pk)
+    if not bag_ids:
+        return 0
+
+    assigned = []
+    for request_id, site_id, blood_type, units in allocations:
+        key = (site_id, blood_type)
+        ids = bag_ids.get(key, [])[:units]
+        bag_ids[key] = bag_ids.get(key, [])[units:]
+        if ids:
+            assigned.append((request_id, ids))
+    return BloodBag.objects.filter(pk__in=[pk for _, ids in assigned for pk in ids]).update(
+        status='Allocated',
+        blood_request=Case(
+            *[When(pk__in=ids, then=Value(request_id)) for request_id, ids in assigned],
+            output_field=BloodBag._meta.get_field('blood_request'),
+        ),
+    )
+
+
+def expire_bags(today=None):
+    """
+    Mark every available bag past its expiry date as expired, one bulk UPDATE per
+    site and blood type, each committed with the matching inventory decrement.
+    Returns the number of bags expired per blood type, over all sites.
+    """
+    today = today or timezone.localdate()
+    expired = {}
+    stocks = (BloodBag.objects
+              .filter(status='Available', expiry_date__lt=today)
+              .values_list('site_id', 'blood_type')
+              .distinct())
+    for site_id, blood_type in list(stocks):
+        with transaction.atomic():
+            count = (BloodBag.objects
+                     .filter(site_id=site_id, blood_type=blood_type, status='Available', expiry_date__lt=today)
+                     .update(status='Expired'))
+            if count:
+                # Never below zero when manual edits left fewer units than bags
+                BloodInventory.objects.filter(site_id=site_id, blood_type=blood_type).update(
+                    units_available=Greatest(F('units_available') - count, 0))
+                record_changes([(site_id, blood_type, -count, 'expire', None)])
+                invalidate_inventory()
+                expired[blood_type] = expired.get(blood_type, 0) + count
+    return expired
@@ -0,0 +1,132 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from .models import Donor, BloodRequest
+from .serializer import DonorSerializer
+from . import search
+
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+MAX_REPORTED_ERRORS = 1000  # Keep the report bounded for very dirty files
+
+DONOR_EXPORT_FIELDS = ['id', 'name', 'blood_type', 'contact_info', 'last_donation_date']
+REQUEST_EXPORT_FIELDS = ['id', 'user__username', 'blood_type', 'units_requested', 'status', 'request_date']
+
+
+class MalformedUpload(ValueError):
+    """
+    The stream cannot be read past ``row``: invalid UTF-8, or CSV the parser rejects.
+    """
+    def __init__(self, row, message):
+        super().__init__(f'Row {row}: {message}')
+        self.row = row
+
+
+def iter_records(stream, fmt):
+    """
+    Yield ``(row_number, record)`` from a binary stream without loading it into memory.
+    ``record`` is a dict, or an error message when the line cannot be parsed.
+    Raises MalformedUpload when the rest of the stream cannot be read.
+    """
+    row_number = 0
+    try:
+        for row_number, record in _iter_records(stream, fmt):
+            yield row_number, record
+    except UnicodeDecodeError as exc:
+        raise MalformedUpload(row_number + 1, f'Invalid UTF-8: {exc.reason}.')
+    except csv.Error as exc:
+        raise MalformedUpload(row_number + 1, f'Invalid CSV: {exc}.')
+
+
+def _iter_records(stream, fmt):
+    # Binary streams (files, Django requests) iterate line by line
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        for row_number, record in enumerate(csv.DictReader(text), start=1):
+            # Empty CSV cells mean "not provided", e.g. no last_donation_date
+            yield row_number, {key: value for key, value in record.items() if value != ''}
+        return
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield row_number, f'Invalid JSON: {exc}'
+            continue
+        yield row_number, record if isinstance(record, dict) else 'Each line must be a JSON object.'
+
+
+def import_donors(records, chunk_size=1000):
+    """
+    Validate and insert donor records chunk by chunk. Each chunk is inserted with one
+    ``bulk_create`` in its own transaction; invalid rows are reported and skipped.
+    A malformed stream stops the import after the rows read before it, and is
+    reported under ``malformed``.
+    """
+    created, error_count, errors, malformed = 0, 0, [], None
+    records = iter(records)
+    while malformed is None:
+        chunk = []
+        try:
+            chunk.extend(islice(records, chunk_size))
+        except MalformedUpload as exc:
+            malformed = {'row': exc.row, 'detail': str(exc)}
+        if not chunk:
+            break
+
+        donors = []
+        for row_number, record in chunk:
+            serializer = DonorSerializer(data=record) if isinstance(record, dict) else None
+            if serializer is not None and serializer.is_valid():
+                donors.append(Donor(**serializer.validated_data))
+                continue
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'errors': serializer.errors if serializer else record})
+
+        if donors:
+            with transaction.atomic():
+                Donor.objects.bulk_create(donors, batch_size=chunk_size)
+                # bulk_create skips post_save, so index the new rows here
+                search.rebuild_index([donor.pk for donor in donors])
+            created += len(donors)
+
+    report = {'created': created, 'error_count': error_count, 'errors': errors}
+    if malformed is not None:
+        report['malformed'] = malformed
+    return report
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def stream_rows(queryset, fields, fmt, chunk_size=2000):
+    """
+    Yield CSV or NDJSON lines for ``queryset`` using a server-side iterator.
+    """
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), default=str) + '\n'
+
+
+def export_donors(fmt):
+    return stream_rows(Donor.objects.order_by('id'), DONOR_EXPORT_FIELDS, fmt)
+
+
+def export_requests(fmt):
+    return stream_rows(BloodRequest.objects.order_by('id'), REQUEST_EXPORT_FIELDS, fmt)
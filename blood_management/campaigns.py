@@ -0,0 +1,181 @@
+"""
+Donor recall campaigns. Eligible donors of one blood type are read as keyset ranges
+of the ``(blood_type, last_donation_date)`` index, ``CAMPAIGN_BATCH_SIZE`` at a time,
+so a campaign streams through any number of donors in constant memory. Every batch
+is rendered and handed to one mail connection, opened once for the whole batch,
+and the position of its last donor is stored on the campaign with the sent count:
+a paused, failed or interrupted campaign resumes after the last batch it finished.
+"""
+import logging
+import queue
+import string
+import threading
+import time
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.utils import timezone
+from .matching import DONOR_ORDERING, encode_cursor, eligibility_filter
+from .models import Campaign, Donor
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FIELDS = ('name', 'blood_type')
+
+
+def validate_template(text):
+    """
+    Reject templates using anything but the plain ``{name}`` and ``{blood_type}``
+    fields, so a template cannot reach attributes or indexes of the values, nor pad
+    them to any width with a format spec such as ``{name:>100000000}``.
+    """
+    try:
+        parsed = [(field, spec, conversion) for _, field, spec, conversion in string.Formatter().parse(text)
+                  if field is not None]
+    except ValueError as exc:
+        raise ValueError(f'Invalid template: {exc}.')
+    if any(spec or conversion for _, spec, conversion in parsed):
+        raise ValueError('Format specs and conversions such as {name:>10} or {name!r} are not allowed.')
+    fields = [field for field, _, _ in parsed]
+    unknown = sorted(set(fields) - set(TEMPLATE_FIELDS))
+    if unknown:
+        raise ValueError(f'Unknown placeholders: {", ".join(unknown)}. '
+                         f'Use {", ".join("{" + field + "}" for field in TEMPLATE_FIELDS)}.')
+
+
+def recipients(campaign, cursor=None):
+    # Donors with an email address, in DONOR_ORDERING after the cursor
+    return (Donor.objects
+            .filter(eligibility_filter(campaign.eligible_before, cursor or None),
+                    blood_type=campaign.blood_type, contact_info__contains='@')
+            .order_by(*DONOR_ORDERING))
+
+
+def count_recipients(campaign):
+    return recipients(campaign).count()
+
+
+def iter_batches(campaign, batch_size=None):
+    """
+    Recipients of ``campaign`` after its stored cursor, ``batch_size`` donors at a
+    time. Every batch is one range seek of the donor index continuing after the last
+    donor read. Yields ``(donors, cursor)`` where ``cursor`` marks the batch's end.
+    """
+    batch_size = batch_size or getattr(settings, 'CAMPAIGN_BATCH_SIZE', 500)
+    cursor = campaign.cursor
+    while True:
+        batch = list(recipients(campaign, cursor)
+                     .only('id', 'name', 'contact_info', 'last_donation_date')[:batch_size])
+        if not batch:
+            return
+        cursor = encode_cursor(batch[-1])
+        yield batch, cursor
+        if len(batch) < batch_size:
+            return
+
+
+def render_messages(campaign, donors, connection=None):
+    return [
+        EmailMessage(
+            campaign.subject.format(name=donor.name, blood_type=campaign.blood_type),
+            campaign.message.format(name=donor.name, blood_type=campaign.blood_type),
+            settings.DEFAULT_FROM_EMAIL,
+            [donor.contact_info.strip()],
+            connection=connection,
+        )
+        for donor in donors
+    ]
+
+
+def run_campaign(campaign_id, batch_size=None, rate=None):
+    """
+    Send the remaining batches of a running campaign and return it. At most ``rate``
+    messages per second are sent (``CAMPAIGN_RATE_LIMIT``, None for no limit); the
+    campaign stops after the current batch once it is paused. A batch that fails
+    marks the campaign Failed and is sent again, whole, when the campaign resumes.
+    """
+    rate = rate if rate is not None else getattr(settings, 'CAMPAIGN_RATE_LIMIT', None)
+    campaign = Campaign.objects.get(pk=campaign_id)
+    if campaign.status != 'Running':
+        return campaign
+    try:
+        # Templates saved through the admin or before validation existed are checked here too
+        validate_template(campaign.subject)
+        validate_template(campaign.message)
+    except ValueError as exc:
+        Campaign.objects.filter(pk=campaign_id).update(status='Failed', error=str(exc))
+        campaign.refresh_from_db()
+        return campaign
+
+    started, sent = time.monotonic(), 0
+    for donors, cursor in iter_batches(campaign, batch_size):
+        if rate:
+            delay = sent / rate - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            connection = get_connection()
+            with connection:
+                count = connection.send_messages(render_messages(campaign, donors, connection))
+        except Exception as exc:
+            logger.exception("Campaign %s failed", campaign_id)
+            Campaign.objects.filter(pk=campaign_id).update(status='Failed', error=str(exc) or repr(exc))
+            campaign.refresh_from_db()
+            return campaign
+        count = len(donors) if count is None else count
+        sent += count
+        campaign.sent += count
+        campaign.cursor = cursor
+        # The progress is kept even when the campaign was paused meanwhile; it then stops here
+        running = Campaign.objects.filter(pk=campaign_id, status='Running').update(
+            sent=campaign.sent, cursor=cursor)
+        if not running:
+            Campaign.objects.filter(pk=campaign_id).update(sent=campaign.sent, cursor=cursor)
+            campaign.refresh_from_db()
+            return campaign
+
+    Campaign.objects.filter(pk=campaign_id, status='Running').update(
+        status='Completed', finished_at=timezone.now())
+    campaign.refresh_from_db()
+    return campaign
+
+
+class CampaignDispatcher:
+    """
+    Background worker running submitted campaigns one at a time, off the request
+    thread. Campaigns left running by a restart are resumed with ``manage.py run_campaigns``.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, campaign_id):
+        self._ensure_worker()
+        self._queue.put(campaign_id)
+
+    def join(self):
+        """
+        Block until every submitted campaign has been run.
+        """
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='donor-campaigns', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            campaign_id = self._queue.get()
+            try:
+                run_campaign(campaign_id)
+            except Exception:
+                logger.exception("Failed to run campaign %s", campaign_id)
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+
+dispatcher = CampaignDispatcher()
@@ -0,0 +1,71 @@
+"""
+Coalescing of identical concurrent reads. A GET that arrives while the same user's
+identical GET (same path, query string and ``Accept`` header) is still running in
+this process does not run the view again: it waits for the running one and answers
+with a copy of its response. Bursts of the same expensive search or report then
+cost one execution however many times they are sent.
+"""
+import threading
+from django.conf import settings
+from rest_framework.response import Response
+from .metrics import registry
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, func):
+        """
+        Call ``func`` unless a call with the same ``key`` is running; then wait for it,
+        for at most ``COALESCE_WAIT_TIMEOUT`` seconds, and share its outcome.
+        Returns ``(response, shared)``.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(getattr(settings, 'COALESCE_WAIT_TIMEOUT', 30)):
+                if call.error is not None:
+                    raise call.error
+                return call.response, True
+            return func(), False  # Too slow to wait for; run this one as well
+        try:
+            call.response = func()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.response, False
+
+
+coalescer = RequestCoalescer()
+
+
+class CoalescedReadMixin:
+    """
+    Coalesce identical concurrent GETs of a DRF view per user. Runs after
+    authentication, permissions and throttling, so every copy is still checked and counted.
+    """
+    def get(self, request, *args, **kwargs):
+        key = (type(self).__name__, request.user.pk, request.get_full_path(), request.headers.get('Accept'))
+        response, shared = coalescer.run(key, lambda: super(CoalescedReadMixin, self).get(request, *args, **kwargs))
+        if not shared:
+            return response
+        registry.increment('coalesced_requests_total', view=request.resolver_match.view_name)
+        # The data is only read while rendering, so the copies may share it
+        headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+        return Response(response.data, status=response.status_code, headers=headers)
@@ -0,0 +1,150 @@
+"""
+Live change events for the server-sent events stream (``/api/events/``). The write
+paths send the ``inventory_changed`` and ``request_status_changed`` signals; the
+receivers in signals.py publish them to the process-wide ``hub`` once the
+transaction commits, and the hub fans every event out to the connected streams.
+Each event is encoded once, however many subscribers there are.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from django.conf import settings
+from django.dispatch import Signal
+
+# changes: [(site_id, blood_type, change, reason, blood_request_id)], as written to the ledger
+inventory_changed = Signal()
+# transitions: [(blood_request, previous_status)], with the new status on the instance
+request_status_changed = Signal()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Event:
+    __slots__ = ('id', 'user_id', 'frame')
+
+    def __init__(self, event_id, kind, data, user_id=None):
+        self.id = event_id
+        # Events of a request are also delivered to its requester; the rest only to admins
+        self.user_id = user_id
+        self.frame = f'id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+class Subscription:
+    """
+    One connected stream. Events are handed over from any thread to the event loop
+    that serves the stream; a subscriber that falls ``EVENT_STREAM_QUEUE_SIZE`` events
+    behind is disconnected and resumes with ``Last-Event-ID``.
+    """
+
+    def __init__(self, hub, user, loop):
+        self.hub = hub
+        self.user_id = user.pk
+        self.is_admin = user.is_staff
+        self.loop = loop
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.is_admin or event.user_id == self.user_id
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._push, event)
+        except RuntimeError:
+            self.hub.unsubscribe(self)  # The stream's event loop is gone
+
+    def _push(self, event):
+        if len(self.pending) >= _setting('EVENT_STREAM_QUEUE_SIZE', 1000):
+            self.overflowed = True
+        else:
+            self.pending.append(event)
+        self.wakeup.set()
+
+    async def wait(self, timeout):
+        """
+        Wait up to ``timeout`` seconds and return the events delivered since the last call.
+        """
+        if not self.pending and not self.overflowed:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.wakeup.clear()
+        events = list(self.pending)
+        self.pending.clear()
+        return events
+
+
+class Hub:
+    """
+    In-process fan-out of change events. Keeps the last ``EVENT_STREAM_BUFFER`` events
+    so a reconnecting stream can catch up from its ``Last-Event-ID``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=_setting('EVENT_STREAM_BUFFER', 1000))
+        self._last_id = 0
+
+    def publish(self, kind, data, user_id=None):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, kind, data, user_id)
+            self._recent.append(event)
+            subscribers = [s for s in self._subscribers if s.wants(event)]
+        for subscriber in subscribers:
+            subscriber.offer(event)
+        return event
+
+    def subscribe(self, user, last_event_id=None):
+        """
+        Register a stream for ``user`` on the running event loop. Returns the subscription
+        and the buffered events after ``last_event_id``, or None for those when the
+        stream cannot be resumed without a gap.
+        """
+        subscription = Subscription(self, user, asyncio.get_running_loop())
+        with self._lock:
+            # Registered under the lock, so no event falls between the backlog and the stream
+            self._subscribers.add(subscription)
+            if last_event_id is None:
+                return subscription, []
+            oldest = self._recent[0].id if self._recent else self._last_id + 1
+            if not oldest - 1 <= last_event_id <= self._last_id:
+                return subscription, None
+            backlog = [e for e in self._recent if e.id > last_event_id and subscription.wants(e)]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+hub = Hub()
+
+
+def inventory_events(changes):
+    return [
+        ('inventory', {'site': site_id, 'blood_type': blood_type, 'change': change, 'reason': reason,
+                       'request': blood_request_id}, None)
+        for site_id, blood_type, change, reason, blood_request_id in changes if change
+    ]
+
+
+def request_events(transitions):
+    return [
+        ('request', {'id': blood_request.pk, 'user': blood_request.user_id, 'site': blood_request.site_id,
+                     'blood_type': blood_request.blood_type, 'units_requested': blood_request.units_requested,
+                     'status': blood_request.status, 'previous_status': previous,
+                     'fulfilled_from': blood_request.fulfilled_from_id}, blood_request.user_id)
+        for blood_request, previous in transitions
+    ]
+
+
+def publish_all(events):
+    for kind, data, user_id in events:
+        hub.publish(kind, data, user_id)
@@ -0,0 +1,203 @@
+"""
+Demand forecasting per site and blood type. Daily fulfilled units are loaded from
+the inventory rollups into a ``(sites x blood types x days)`` NumPy array and every
+statistic is computed for all sites and types at once, plus the network-wide totals;
+the resulting reorder points replace the static low-inventory thresholds for types
+with demand history.
+"""
+import logging
+import math
+import threading
+import numpy as np
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .history import bucket_start
+from .matching import BLOOD_TYPES, TYPE_INDEX
+from .models import InventoryRollup
+
+logger = logging.getLogger(__name__)
+
+FORECAST_KEY = 'demand_forecast'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def load_site_demand(days, today=None):
+    """
+    Fulfilled units per site, blood type and day for the ``days`` days before ``today``,
+    oldest day first. Returns ``(site_ids, demand)`` where ``demand`` is an ``int64``
+    array of shape ``(len(site_ids), len(BLOOD_TYPES), days)`` covering the sites with
+    any demand. Read from the daily inventory rollups, so at most ``sites * 8 * days``
+    rows are loaded however many requests there were (run ``backfill_inventory_history``
+    once to include requests fulfilled before the ledger existed).
+    """
+    end = bucket_start(timezone.now(), 'day') if today is None else timezone.make_aware(
+        datetime.combine(today, time.min))
+    start = end - timedelta(days=days)
+    rows = list(InventoryRollup.objects
+                .filter(granularity='day', bucket__gte=start, bucket__lt=end, units_fulfilled__gt=0)
+                .values_list('site_id', 'blood_type', 'bucket', 'units_fulfilled'))
+    site_ids = sorted({row[0] for row in rows})
+    demand = np.zeros((len(site_ids), len(BLOOD_TYPES), days), dtype=np.int64)
+    if rows:
+        site_index = {site_id: position for position, site_id in enumerate(site_ids)}
+        sites, types, buckets, units = zip(*rows)
+        np.add.at(demand, (
+            np.fromiter((site_index[s] for s in sites), dtype=np.intp, count=len(rows)),
+            np.fromiter((TYPE_INDEX[t] for t in types), dtype=np.intp, count=len(rows)),
+            np.fromiter(((b - start).days for b in buckets), dtype=np.intp, count=len(rows)),
+        ), np.asarray(units, dtype=np.int64))
+    return site_ids, demand
+
+
+def load_daily_demand(days, today=None):
+    """
+    Network-wide fulfilled units per blood type and day, as an ``int64`` matrix of
+    shape ``(len(BLOOD_TYPES), days)``, oldest day first.
+    """
+    return load_site_demand(days, today)[1].sum(axis=0)
+
+
+def smoothing_weights(days, alpha):
+    """
+    Weights that turn simple exponential smoothing over ``days`` observations into
+    one dot product: ``s_T = alpha * sum((1 - alpha)^k * x_{T-k}) + (1 - alpha)^(T-1) * x_0``.
+    """
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (days - 1)  # The series is seeded with its first value
+    return weights
+
+
+def compute_forecast(demand, window, alpha, lead_time, z):
+    """
+    Moving average, exponentially smoothed demand, demand spread and reorder point
+    for every row of ``demand`` in one vectorized pass.
+    """
+    recent = demand[:, -window:]
+    moving_average = recent.mean(axis=1)
+    smoothed = demand @ smoothing_weights(demand.shape[1], alpha)
+    spread = recent.std(axis=1)
+    # Cover the expected lead-time demand plus safety stock for the chosen service level
+    reorder_point = smoothed * lead_time + z * spread * math.sqrt(lead_time)
+    return {
+        'moving_average': moving_average,
+        'smoothed_demand': smoothed,
+        'demand_std': spread,
+        # Rounded first so float noise on a whole number does not add a unit
+        'reorder_point': np.ceil(np.round(reorder_point, 6)).astype(np.int64),
+        'observed': demand.sum(axis=1) > 0,
+    }
+
+
+def days_of_cover(units, daily_demand):
+    """
+    Days the given stock lasts at the forecast demand (infinite without demand).
+    """
+    units = np.asarray(units, dtype=np.float64)
+    daily_demand = np.asarray(daily_demand, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        return np.where(daily_demand > 0, units / daily_demand, np.inf)
+
+
+def refresh_forecast(today=None):
+    """
+    Recompute the forecast of every site and of the whole network from history and
+    cache it for ``FORECAST_REFRESH_INTERVAL``. Returns the network-wide
+    ``blood_type -> stats`` for every type that had demand in the history window.
+    """
+    return _refresh(today)[None]
+
+
+def _refresh(today=None):
+    history_days = _setting('FORECAST_HISTORY_DAYS', 365)
+    site_ids, demand = load_site_demand(history_days, today)
+    # Row block 0 is the network, block k + 1 site k; all of them in one vectorized pass
+    stats = compute_forecast(
+        np.concatenate([demand.sum(axis=0), demand.reshape(-1, history_days)]),
+        window=min(_setting('FORECAST_WINDOW_DAYS', 28), history_days),
+        alpha=_setting('FORECAST_SMOOTHING', 0.3),
+        lead_time=_setting('REORDER_LEAD_TIME_DAYS', 2),
+        z=_setting('REORDER_SERVICE_LEVEL_Z', 1.65),
+    )
+
+    def block(offset):
+        return {
+            blood_type: {
+                'moving_average': round(float(stats['moving_average'][offset + index]), 3),
+                'smoothed_demand': round(float(stats['smoothed_demand'][offset + index]), 3),
+                'demand_std': round(float(stats['demand_std'][offset + index]), 3),
+                'reorder_point': int(stats['reorder_point'][offset + index]),
+            }
+            for index, blood_type in enumerate(BLOOD_TYPES) if stats['observed'][offset + index]
+        }
+
+    forecasts = {None: block(0)}
+    for position, site_id in enumerate(site_ids):
+        forecasts[site_id] = block((position + 1) * len(BLOOD_TYPES))
+    _cache().set(FORECAST_KEY, forecasts, timeout=_setting('FORECAST_REFRESH_INTERVAL', 6 * 60 * 60))
+    return forecasts
+
+
+class ForecastRefresher:
+    """
+    Daemon thread recomputing the forecast after a cache miss, so the request that
+    missed never pays for loading the demand history. One refresh runs at a time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='forecast-refresh', daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """
+        Block until the running refresh, if any, has finished.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        try:
+            _refresh()
+        except Exception:
+            logger.exception("Failed to refresh the demand forecast")
+        finally:
+            close_old_connections()
+
+
+refresher = ForecastRefresher()
+
+
+def get_forecasts():
+    """
+    Cached forecasts keyed by site id, with the whole network under None. On a miss
+    the static thresholds apply (an empty forecast) while the refresher recomputes
+    it, started once the caller's transaction has committed its history.
+    """
+    forecasts = _cache().get(FORECAST_KEY)
+    if forecasts is None:
+        transaction.on_commit(refresher.submit)
+        return {}
+    return forecasts
+
+
+def get_forecast(site_id=None):
+    """
+    Cached forecast of ``site_id``, or of the whole network. Sites without demand
+    history get an empty forecast.
+    """
+    return get_forecasts().get(site_id, {})
@@ -0,0 +1,167 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Abs, Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+from .events import inventory_changed
+from .models import BloodRequest, InventoryLedgerEntry, InventoryRollup
+from .sites import site_type_filter, site_type_increment
+
+BUCKET_SIZES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+TRUNCATE = {'hour': TruncHour, 'day': TruncDay}
+
+
+def bucket_start(moment, granularity):
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == 'day' else moment
+
+
+def record_changes(changes, at=None):
+    """
+    Append ``(site_id, blood_type, change, reason, blood_request_id)`` rows to the ledger
+    and add them to the hourly and daily rollups. Three queries however many changes
+    there are; call it inside the transaction that changes ``units_available``. Sends
+    ``inventory_changed`` for the live event stream.
+    """
+    at = at or timezone.now()
+    entries = [
+        InventoryLedgerEntry(site_id=site_id, blood_type=blood_type, change=change, reason=reason,
+                             blood_request_id=blood_request_id, created_at=at)
+        for site_id, blood_type, change, reason, blood_request_id in changes if change
+    ]
+    if not entries:
+        return
+    InventoryLedgerEntry.objects.bulk_create(entries)
+    inventory_changed.send(sender=InventoryLedgerEntry, changes=[
+        (entry.site_id, entry.blood_type, entry.change, entry.reason, entry.blood_request_id) for entry in entries
+    ])
+
+    totals = {}
+    for entry in entries:
+        key = (entry.site_id, entry.blood_type)
+        units_in, units_out, fulfilled, count = totals.get(key, (0, 0, 0, 0))
+        totals[key] = (
+            units_in + max(entry.change, 0),
+            units_out + max(-entry.change, 0),
+            fulfilled + (-entry.change if entry.reason == 'fulfill' else 0),
+            count + 1,
+        )
+
+    buckets = {granularity: bucket_start(at, granularity) for granularity in BUCKET_SIZES}
+    InventoryRollup.objects.bulk_create(
+        [InventoryRollup(granularity=granularity, bucket=bucket, site_id=site_id, blood_type=blood_type)
+         for granularity, bucket in buckets.items() for site_id, blood_type in totals],
+        ignore_conflicts=True,  # Only buckets that do not exist yet
+    )
+    in_bucket = Q()
+    for granularity, bucket in buckets.items():
+        in_bucket |= Q(granularity=granularity, bucket=bucket)
+
+    def increment(field, position):
+        return site_type_increment(InventoryRollup, field, {key: values[position] for key, values in totals.items()})
+
+    InventoryRollup.objects.filter(in_bucket).filter(site_type_filter(totals)).update(
+        units_in=increment('units_in', 0),
+        units_out=increment('units_out', 1),
+        units_fulfilled=increment('units_fulfilled', 2),
+        entries=increment('entries', 3),
+    )
+
+
+def adjustment_changes(previous, inventory):
+    """
+    Ledger changes for a manual edit of an inventory row, given its previous
+    ``(site_id, blood_type, units_available)``. A changed site or blood type moves all units.
+    """
+    site_id, blood_type, units = previous
+    if (site_id, blood_type) != (inventory.site_id, inventory.blood_type):
+        return [(site_id, blood_type, -units, 'adjust', None),
+                (inventory.site_id, inventory.blood_type, inventory.units_available, 'adjust', None)]
+    return [(site_id, blood_type, inventory.units_available - units, 'adjust', None)]
+
+
+def rebuild_rollups(start, end):
+    """
+    Recompute every rollup bucket between ``start`` and ``end`` (widened to whole days)
+    from the ledger, overwriting what is stored. Idempotent.
+    """
+    start = bucket_start(start, 'day')
+    end = bucket_start(end, 'day') + BUCKET_SIZES['day']
+    ledger = InventoryLedgerEntry.objects.filter(created_at__gte=start, created_at__lt=end)
+    rollups = []
+    for granularity, truncate in TRUNCATE.items():
+        rows = (ledger
+                .annotate(bucket=truncate('created_at'))
+                .values('bucket', 'site_id', 'blood_type')
+                .annotate(units_in=Sum(Case(When(change__gt=0, then=F('change')), default=Value(0))),
+                          units_out=Sum(Case(When(change__lt=0, then=Abs('change')), default=Value(0))),
+                          units_fulfilled=Sum(Case(When(reason='fulfill', then=Abs('change')), default=Value(0))),
+                          entries=Count('id'))
+                .order_by())
+        rollups += [InventoryRollup(granularity=granularity, **row) for row in rows]
+    InventoryRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['granularity', 'bucket', 'site', 'blood_type'],
+        update_fields=['units_in', 'units_out', 'units_fulfilled', 'entries'],
+    )
+    return len(rollups)
+
+
+def backfill_requests(chunk_size=1000):
+    """
+    Write ledger entries for fulfilled requests that predate the ledger, ``chunk_size``
+    requests at a time, dated at their ``request_date`` and booked to the site that
+    fulfilled them (or the requesting site when that is unknown), and rebuild the
+    rollups each chunk touches. Requests that already have a fulfillment entry are skipped, so
+    the backfill can be re-run or resumed. Yields the number of requests per chunk.
+    """
+    last_pk = 0
+    while True:
+        chunk = list(BloodRequest.objects
+                     .filter(status='Fulfilled', pk__gt=last_pk)
+                     .exclude(ledger_entries__reason='fulfill')
+                     .annotate(source_site=Coalesce('fulfilled_from', 'site'))
+                     .order_by('pk')
+                     .values_list('pk', 'blood_type', 'units_requested', 'request_date', 'source_site')[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+        dates = [row[3] for row in chunk]
+        with transaction.atomic():
+            InventoryLedgerEntry.objects.bulk_create(
+                InventoryLedgerEntry(site_id=site_id, blood_type=blood_type, change=-units, reason='fulfill',
+                                     blood_request_id=pk, created_at=request_date)
+                for pk, blood_type, units, request_date, site_id in chunk
+            )
+            rebuild_rollups(min(dates), max(dates))
+        yield len(chunk)
+
+
+def history_range(granularity, start, end, blood_type=None, site_id=None):
+    """
+    Rollup rows for ``[start, end)`` of one site, or summed over every site, read with
+    one range scan of the bucket index.
+    """
+    max_buckets = getattr(settings, 'INVENTORY_HISTORY_MAX_BUCKETS', 1000)
+    if (end - start) / BUCKET_SIZES[granularity] > max_buckets:
+        raise ValueError(f"The range spans more than {max_buckets} {granularity} buckets.")
+    rollups = InventoryRollup.objects.filter(
+        granularity=granularity,
+        bucket__gte=bucket_start(start, granularity),
+        bucket__lt=end,
+    )
+    if site_id:
+        rollups = rollups.filter(site_id=site_id)
+    if blood_type:
+        rollups = rollups.filter(blood_type=blood_type)
+    totals = (rollups
+              .values('bucket', 'blood_type')
+              .annotate(total_in=Sum('units_in'), total_out=Sum('units_out'), total_entries=Sum('entries'))
+              .order_by('bucket', 'blood_type'))
+    return [
+        {'bucket': row['bucket'], 'blood_type': row['blood_type'], 'units_in': row['total_in'],
+         'units_out': row['total_out'], 'entries': row['total_entries']}
+        for row in totals
+    ]
@@ -0,0 +1,189 @@
+"""
+``Idempotency-Key`` support for unsafe requests. The first request with a key claims
+it and runs; its response is stored per user for ``IDEMPOTENCY_KEY_TTL`` seconds and
+replayed for every retry with the same key, without running the view again.
+A duplicate that arrives while the first is still running waits for its response.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+# Transient outcomes are not stored, so a retry runs the request again
+RETRYABLE_STATUS = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+# Keys claimed by this process, so local duplicates wait on an event instead of polling
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_mismatch'
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed. Retry later.'
+    default_code = 'idempotency_key_in_progress'
+
+
+class _Replay(Exception):
+    # Carries the stored response out of APIView.initial()
+    def __init__(self, response):
+        self.response = response
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def claim(request, key):
+    """
+    Claim ``key`` for ``request.user`` and return the new record, or raise ``_Replay``
+    with the stored response of an earlier request with the same key.
+    """
+    if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        raise ValidationError({HEADER: 'Must be at most 255 characters.'})
+    request_fingerprint = fingerprint(request)
+    for _ in range(3):
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=request_fingerprint,
+                        expires_at=timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)),
+                    )
+            except IntegrityError:
+                continue  # A concurrent duplicate claimed it first
+            with _inflight_lock:
+                _inflight[record.pk] = threading.Event()
+            return record
+
+        if record.expires_at <= timezone.now():
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+            continue
+        if record.fingerprint != request_fingerprint:
+            raise IdempotencyKeyMismatch()
+        if record.status_code is None:
+            record = wait_for(record)
+            if record is None:
+                continue  # The first request failed without a stored response; run this one
+        raise _Replay(replay(record))
+    raise IdempotencyKeyInProgress()
+
+
+def wait_for(record):
+    """
+    Block until the request holding ``record`` stores its response, for at most
+    ``IDEMPOTENCY_WAIT_TIMEOUT`` seconds. Returns the completed record, or None
+    when the claim was released.
+    """
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    event = _inflight.get(record.pk)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise IdempotencyKeyInProgress()
+        if event is not None:
+            event.wait(remaining)
+        else:
+            time.sleep(min(0.05, remaining))  # Claimed by another process
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None or record.status_code is not None:
+            return record
+
+
+def _finish(record):
+    with _inflight_lock:
+        event = _inflight.pop(record.pk, None)
+    if event is not None:
+        event.set()
+
+
+def complete(record, response):
+    """
+    Store ``response`` for replays, or release the key when the outcome is transient.
+    """
+    try:
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response_body=response.data)
+    finally:
+        _finish(record)
+
+
+def release(record):
+    try:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+    finally:
+        _finish(record)
+
+
+def purge_expired(batch_size=1000):
+    """
+    Delete expired keys ``batch_size`` rows per statement. Returns the number deleted.
+    """
+    purged = 0
+    while True:
+        ids = list(IdempotencyKey.objects
+                   .filter(expires_at__lte=timezone.now())
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+
+class IdempotencyMixin:
+    """
+    Honour an ``Idempotency-Key`` header on ``idempotent_methods`` of a DRF view.
+    """
+    idempotent_methods = ('POST',)
+    idempotency_record = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # Authenticates, so keys are per user
+        key = request.headers.get(HEADER)
+        if key and request.method in self.idempotent_methods:
+            self.idempotency_record = claim(request, key)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            if self.idempotency_record is not None:
+                release(self.idempotency_record)
+                self.idempotency_record = None
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.idempotency_record is not None:
+            complete(self.idempotency_record, response)
+            self.idempotency_record = None
+        return response
@@ -0,0 +1,135 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+from .models import BloodInventory
+from .serializer import BloodInventorySerializer
+
+# The version doubles as the Last-Modified time (nanoseconds since the epoch)
+VERSION_KEY = 'blood_inventory:version'
+SNAPSHOT_KEY = 'blood_inventory:snapshot:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def _bump_version():
+    _cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _snapshot_queryset():
+    return BloodInventory.objects.select_related('site').order_by('id')
+
+
+def _for_site(rows, site_id):
+    return rows if site_id is None else [row for row in rows if row['site'] == site_id]
+
+
+def get_inventory_snapshot(site_id=None):
+    """
+    Serialized rows of the whole inventory (at most one per site and blood type), or
+    of ``site_id`` only, read through the cache. Snapshots are stored per version, so
+    a reader that raced a write can only ever fill the slot of the version it started with.
+    Returns ``(version, rows)``.
+    """
+    cache = _cache()
+    version = get_version()
+    rows = cache.get(SNAPSHOT_KEY.format(version))
+    if rows is None:
+        rows = [dict(row) for row in BloodInventorySerializer(_snapshot_queryset(), many=True).data]
+        cache.set(SNAPSHOT_KEY.format(version), rows, timeout=getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    return version, _for_site(rows, site_id)
+
+
+async def aget_inventory_snapshot(site_id=None):
+    """
+    Async counterpart of get_inventory_snapshot() for the async views.
+    """
+    cache = _cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    rows = await cache.aget(SNAPSHOT_KEY.format(version))
+    if rows is None:
+        inventory = [item async for item in _snapshot_queryset()]
+        rows = [dict(row) for row in BloodInventorySerializer(inventory, many=True).data]
+        await cache.aset(SNAPSHOT_KEY.format(version), rows, timeout=getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    return version, _for_site(rows, site_id)
+
+
+def get_inventory_levels(site_id=None):
+    """
+    blood_type -> units free to allocate (available minus held) at ``site_id``, or
+    summed over every site, from the cached snapshot.
+    """
+    levels = {}
+    for row in get_inventory_snapshot(site_id)[1]:
+        levels[row['blood_type']] = levels.get(row['blood_type'], 0) + row['units_free']
+    return levels
+
+
+def get_site_levels(site_ids=None):
+    """
+    site_id -> ``(site name, {blood_type: units free})`` for ``site_ids`` (default:
+    every site with inventory), from the cached snapshot.
+    """
+    sites = {}
+    for row in get_inventory_snapshot()[1]:
+        if site_ids is None or row['site'] in site_ids:
+            sites.setdefault(row['site'], (row['site_name'], {}))[1][row['blood_type']] = row['units_free']
+    return sites
+
+
+def invalidate_inventory():
+    # Bump now for this process and again after commit, so a snapshot cached
+    # from pre-commit data by a concurrent reader is never served afterwards
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def is_not_modified(request, version):
+    """
+    Evaluate If-None-Match, or If-Modified-Since only when no If-None-Match was sent
+    (RFC 9110, 13.2.2), against ``version``.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in etags or etag_for(version) in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    modified = last_modified(version)
+    return if_modified_since is not None and modified is not None and modified <= if_modified_since
+
+
+def last_modified(version):
+    """
+    ``version`` truncated to the whole seconds of an HTTP date, or None while that
+    second is still running: another write within it would get the same date, so the
+    date only validates the snapshot once the second is over (RFC 9110, 8.8.2.2).
+    """
+    seconds = version // 10**9
+    return seconds if seconds < time.time_ns() // 10**9 else None
+
+
+def etag_for(version):
+    return f'"{version}"'
+
+
+def set_validators(response, version):
+    response['ETag'] = etag_for(version)
+    modified = last_modified(version)
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
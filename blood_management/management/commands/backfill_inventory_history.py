@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from blood_management.history import backfill_requests
+
+
+class Command(BaseCommand):
+    help = 'Write inventory ledger entries and rollups for fulfilled requests recorded before the ledger existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        for count in backfill_requests(chunk_size=options['chunk_size']):
+            total += count
+            self.stdout.write(f"Backfilled {total} requests...")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} fulfilled requests."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blood_management.triage import escalate_due_requests
+
+
+class Command(BaseCommand):
+    help = 'Raise pending requests whose needed_by deadline is near to Emergency priority.'
+
+    def handle(self, *args, **options):
+        escalated = escalate_due_requests()
+        self.stdout.write(self.style.SUCCESS(f"Escalated {escalated} requests."))
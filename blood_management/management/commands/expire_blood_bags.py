@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from blood_management.alerts import alerter, check_low_inventory
+from blood_management.bags import expire_bags
+
+
+class Command(BaseCommand):
+    help = 'Mark bags past their expiry date as expired and remove them from the inventory counts. Run nightly.'
+
+    def handle(self, *args, **options):
+        expired = expire_bags()
+        if expired:
+            check_low_inventory()
+            alerter.join()  # The process exits right after, so wait for the alert to go out
+        summary = ', '.join(f'{blood_type}: {count}' for blood_type, count in sorted(expired.items())) or 'none'
+        self.stdout.write(self.style.SUCCESS(f"Expired {sum(expired.values())} bags ({summary})."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from blood_management.bulk import import_donors, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Bulk import donors from a CSV or NDJSON file, reporting invalid rows without aborting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Defaults to the file extension (.csv or .ndjson/.jsonl).')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        try:
+            stream = open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        with stream:
+            report = import_donors(iter_records(stream, fmt), chunk_size=options['chunk_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        summary = f"Imported {report['created']} donors, {report['error_count']} rows rejected."
+        if 'malformed' in report:
+            raise CommandError(f"{summary} Stopped at {report['malformed']['detail']}")
+        self.stdout.write(self.style.SUCCESS(summary))
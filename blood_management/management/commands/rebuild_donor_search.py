@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from blood_management.models import Donor
+from blood_management.search import rebuild_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text donor search index from the Donor table.'
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            raise CommandError('The donor search index requires SQLite FTS5.')
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Donor.objects.count()} donors.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from blood_management.forecasting import refresh_forecast
+
+
+class Command(BaseCommand):
+    help = 'Recompute the demand forecast and reorder points used by the low-inventory alerts.'
+
+    def handle(self, *args, **options):
+        forecast = refresh_forecast()
+        for blood_type, stats in sorted(forecast.items()):
+            self.stdout.write(
+                f"{blood_type}: {stats['smoothed_demand']} units/day, reorder point {stats['reorder_point']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Forecast refreshed for {len(forecast)} blood types."))
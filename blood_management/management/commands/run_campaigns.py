@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from blood_management.campaigns import run_campaign
+from blood_management.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Send the remaining batches of every running campaign, resuming where each one stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None, help='Messages per second (default: CAMPAIGN_RATE_LIMIT)')
+
+    def handle(self, *args, **options):
+        for campaign_id in Campaign.objects.filter(status='Running').order_by('id').values_list('pk', flat=True):
+            campaign = run_campaign(campaign_id, batch_size=options['batch_size'], rate=options['rate'])
+            self.stdout.write(f"Campaign {campaign.pk}: {campaign.status}, {campaign.sent}/{campaign.total} sent.")
+        self.stdout.write(self.style.SUCCESS("Done."))
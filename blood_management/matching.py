@@ -0,0 +1,100 @@
+import base64
+import heapq
+import json
+from datetime import date, timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import Donor
+
+BLOOD_TYPES = [blood_type for blood_type, _ in Donor.BLOOD_TYPES]
+BLOOD_TYPE_BITS = {blood_type: 1 << i for i, blood_type in enumerate(BLOOD_TYPES)}
+TYPE_INDEX = {blood_type: index for index, blood_type in enumerate(BLOOD_TYPES)}
+
+
+def _can_donate(donor, recipient):
+    # ABO: every antigen on the donor's cells must be present on the recipient's;
+    # Rh: Rh- recipients can only receive Rh- blood
+    donor_abo, donor_rh = donor[:-1], donor[-1]
+    recipient_abo, recipient_rh = recipient[:-1], recipient[-1]
+    abo_ok = set(donor_abo.replace('O', '')) <= set(recipient_abo.replace('O', ''))
+    return abo_ok and (donor_rh == '-' or recipient_rh == '+')
+
+
+# Recipient blood type -> bitmask of donor blood types it can receive, computed once
+COMPATIBLE_DONOR_MASKS = {
+    recipient: sum(BLOOD_TYPE_BITS[donor] for donor in BLOOD_TYPES if _can_donate(donor, recipient))
+    for recipient in BLOOD_TYPES
+}
+
+
+def compatible_donor_types(recipient):
+    mask = COMPATIBLE_DONOR_MASKS[recipient]
+    return [blood_type for blood_type in BLOOD_TYPES if mask & BLOOD_TYPE_BITS[blood_type]]
+
+
+def encode_cursor(donor):
+    position = {'d': donor.last_donation_date.isoformat() if donor.last_donation_date else None, 'id': donor.pk}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (date.fromisoformat(position['d']) if position['d'] else None), int(position['id'])
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+# Never donated first, then longest since last donation: the order of the (blood_type, last_donation_date) index
+DONOR_ORDERING = (F('last_donation_date').asc(nulls_first=True), 'id')
+
+
+def eligibility_cutoff(eligibility_days=None):
+    # Donors who last donated on or before this date may donate again
+    if eligibility_days is None:
+        eligibility_days = getattr(settings, 'DONOR_ELIGIBILITY_DAYS', 56)
+    return timezone.localdate() - timedelta(days=eligibility_days)
+
+
+def eligibility_filter(cutoff, cursor=None):
+    """
+    Donors eligible on ``cutoff`` (never donated, or last donated on or before it),
+    after the ``cursor`` position in ``DONOR_ORDERING`` when one is given.
+    """
+    eligible = Q(last_donation_date__isnull=True) | Q(last_donation_date__lte=cutoff)
+    if cursor is not None:
+        last_date, last_id = decode_cursor(cursor)
+        if last_date is None:
+            after = Q(last_donation_date__isnull=True, pk__gt=last_id) | Q(last_donation_date__isnull=False)
+        else:
+            # The date bound makes the index read a range seek instead of a scan from the first donor
+            eligible = Q(last_donation_date__gte=last_date, last_donation_date__lte=cutoff)
+            after = Q(last_donation_date__gt=last_date) | Q(last_donation_date=last_date, pk__gt=last_id)
+        eligible &= after
+    return eligible
+
+
+def _sort_key(donor):
+    # Never donated first, then longest since last donation; id breaks ties
+    return (donor.last_donation_date is not None, donor.last_donation_date or date.min, donor.pk)
+
+
+def find_eligible_donors(recipient, page_size, cursor=None, eligibility_days=None):
+    """
+    One page of donors compatible with ``recipient`` who are eligible to donate again,
+    sorted by time since their last donation. Each compatible blood type is read as an
+    ordered range of the (blood_type, last_donation_date) index, limited to one page,
+    and the per-type streams are merged, so the cost does not depend on table size.
+    Returns ``(donors, next_cursor)``.
+    """
+    eligible = eligibility_filter(eligibility_cutoff(eligibility_days), cursor)
+    streams = [
+        Donor.objects.filter(eligible, blood_type=blood_type).order_by(*DONOR_ORDERING)[:page_size + 1]
+        for blood_type in compatible_donor_types(recipient)
+    ]
+    merged = list(heapq.merge(*streams, key=_sort_key))
+    page = merged[:page_size]
+    next_cursor = encode_cursor(page[-1]) if len(merged) > page_size else None
+    return page, next_cursor
@@ -0,0 +1,102 @@
+import threading
+from collections import defaultdict
+
+# Upper bounds of the histogram buckets; +Inf is implied
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines, cumulative = [], 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:g}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process per-view histograms, rendered in the Prometheus text format.
+    """
+    METRICS = {
+        'request_duration_seconds': ('Wall time per request.', DURATION_BUCKETS),
+        'db_queries': ('Database queries per request.', QUERY_COUNT_BUCKETS),
+        'db_duration_seconds': ('Time spent in database queries per request.', DURATION_BUCKETS),
+        'jwt_decode_seconds': ('Time spent validating the JWT per request.', DURATION_BUCKETS),
+    }
+    COUNTERS = {
+        'throttle_total': 'Throttle decisions per scope and role (hit: throttled, miss: let through).',
+        'coalesced_requests_total': 'Read requests answered with the response of an identical running request.',
+    }
+    PREFIX = 'blood_bank_'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {
+            metric: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for metric, (_, buckets) in self.METRICS.items()
+        }
+        self._counters = {metric: defaultdict(int) for metric in self.COUNTERS}
+
+    def observe(self, view_name, **values):
+        with self._lock:
+            for metric, value in values.items():
+                if value is not None:
+                    self._histograms[metric][view_name].observe(value)
+
+    def increment(self, metric, **labels):
+        with self._lock:
+            self._counters[metric][tuple(sorted(labels.items()))] += 1
+
+    def counter(self, metric, **labels):
+        with self._lock:
+            return self._counters[metric].get(tuple(sorted(labels.items())), 0)
+
+    def reset(self):
+        with self._lock:
+            for histograms in self._histograms.values():
+                histograms.clear()
+            for counters in self._counters.values():
+                counters.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric, (help_text, _) in self.METRICS.items():
+                name = self.PREFIX + metric
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for view_name in sorted(self._histograms[metric]):
+                    lines += self._histograms[metric][view_name].render(name, _labels(view=view_name))
+            for metric, help_text in self.COUNTERS.items():
+                name = self.PREFIX + metric
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for labels, value in sorted(self._counters[metric].items()):
+                    lines.append(f'{name}{{{_labels(**dict(labels))}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels.items())
+
+
+registry = MetricsRegistry()
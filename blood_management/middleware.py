@@ -0,0 +1,104 @@
+import contextvars
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from .metrics import registry
+
+# Query stats of the request being served. sync_to_async runs sync views and async ORM
+# calls in a copy of the caller's context, so their queries reach the same stats from
+# whichever thread (and connection) executes them
+_request_stats = contextvars.ContextVar('request_query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - start
+
+
+def install_query_recorder(connection):
+    # Outermost, so connection.execute_wrapper() blocks still pop their own wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+def _on_request_started(sender, **kwargs):
+    # Connections of this thread opened before the middleware was loaded
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='blood_management_query_recorder')
+request_started.connect(_on_request_started, dispatch_uid='blood_management_query_recorder')
+
+
+class PerformanceMetricsMiddleware:
+    """
+    Records wall time, database query count/time and JWT decode time per resolved
+    view, adds them to the response as a ``Server-Timing`` header and feeds the
+    histograms served by ``/api/metrics/``. Works in both sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = {'queries': 0, 'db_seconds': 0.0}
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._finish(request, response, time.perf_counter() - start, stats)
+
+    async def __acall__(self, request):
+        stats = {'queries': 0, 'db_seconds': 0.0}
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._finish(request, response, time.perf_counter() - start, stats)
+
+    def _finish(self, request, response, duration, stats):
+        # Set by the authentication class when a token was presented
+        jwt_seconds = getattr(request, 'jwt_decode_seconds', None)
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else 'unresolved'
+
+        registry.observe(
+            view_name,
+            request_duration_seconds=duration,
+            db_queries=stats['queries'],
+            db_duration_seconds=stats['db_seconds'],
+            jwt_decode_seconds=jwt_seconds,
+        )
+
+        timings = [
+            f'app;dur={duration * 1000:.2f}',
+            f'db;dur={stats["db_seconds"] * 1000:.2f};desc="{stats["queries"]} queries"',
+        ]
+        if jwt_seconds is not None:
+            timings.append(f'jwt;dur={jwt_seconds * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='bloodrequest',
+            options={'ordering': ['-request_date', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='donor',
+            options={'ordering': ['id']},
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['user', 'request_date'], name='request_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['status', 'blood_type', 'request_date'], name='request_status_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['request_date'], name='request_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donor',
+            index=models.Index(fields=['blood_type', 'last_donation_date'], name='donor_type_last_donation_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other databases fall back to icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blood_management_donor_search USING fts5("
+        "name, blood_type, contact_info, last_donation_date, tokenize = \"unicode61 tokenchars '+-'\")"
+    )
+    schema_editor.execute(
+        "INSERT INTO blood_management_donor_search (rowid, name, blood_type, contact_info, last_donation_date) "
+        "SELECT id, name, blood_type, contact_info, COALESCE(last_donation_date, '') FROM blood_management_donor"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS blood_management_donor_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0002_bloodrequest_donor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
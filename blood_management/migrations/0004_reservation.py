@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0003_donor_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bloodinventory',
+            name='units_reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('units', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('Active', 'Active'), ('Consumed', 'Consumed'), ('Released', 'Released'), ('Expired', 'Expired')], default='Active', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('blood_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='blood_management.bloodrequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'Active')), fields=('blood_request',), name='one_active_reservation_per_request')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0004_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloodBag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('collection_date', models.DateField()),
+                ('expiry_date', models.DateField()),
+                ('status', models.CharField(choices=[('Available', 'Available'), ('Allocated', 'Allocated'), ('Expired', 'Expired')], default='Available', max_length=10)),
+                ('blood_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bags', to='blood_management.bloodrequest')),
+                ('donor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bags', to='blood_management.donor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['blood_type', 'status', 'expiry_date'], name='bag_type_status_expiry_idx')],
+            },
+        ),
+    ]
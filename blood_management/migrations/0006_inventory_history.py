@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0005_blood_bag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('bucket', models.DateTimeField()),
+                ('units_in', models.PositiveIntegerField(default=0)),
+                ('units_out', models.PositiveIntegerField(default=0)),
+                ('entries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'blood_type'), name='rollup_bucket_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_type', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('change', models.IntegerField()),
+                ('reason', models.CharField(choices=[('create', 'Inventory created'), ('adjust', 'Manual adjustment'), ('receive', 'Bags received'), ('fulfill', 'Request fulfilled'), ('expire', 'Bags expired')], max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('blood_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='blood_management.bloodrequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='ledger_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0006_inventory_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryrollup',
+            name='units_fulfilled',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:52
+
+import blood_management.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_site(apps, schema_editor):
+    # Existing stock, bags, requests and history all belong to the one site this deployment was
+    Site = apps.get_model('blood_management', 'Site')
+    Site.objects.get_or_create(name=getattr(settings, 'DEFAULT_SITE_NAME', 'Main'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0009_request_triage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Site',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('latitude', models.FloatField(default=0)),
+                ('longitude', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(create_default_site, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='inventoryrollup',
+            name='rollup_bucket_unique',
+        ),
+        migrations.RemoveIndex(
+            model_name='bloodbag',
+            name='bag_type_status_expiry_idx',
+        ),
+        migrations.AlterField(
+            model_name='bloodinventory',
+            name='blood_type',
+            field=models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='inventoryledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('create', 'Inventory created'), ('adjust', 'Manual adjustment'), ('receive', 'Bags received'), ('fulfill', 'Request fulfilled'), ('expire', 'Bags expired'), ('transfer', 'Transferred between sites')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='bloodbag',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='bags', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='bloodinventory',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='inventory', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='bloodrequest',
+            name='fulfilled_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fulfilled_requests', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='bloodrequest',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='requests', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='inventoryledgerentry',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='inventoryrollup',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='blood_management.site'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='site',
+            field=models.ForeignKey(default=blood_management.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='blood_management.site'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodbag',
+            index=models.Index(fields=['site', 'blood_type', 'status', 'expiry_date'], name='bag_site_type_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['site', 'request_date'], name='request_site_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bloodinventory',
+            constraint=models.UniqueConstraint(fields=('site', 'blood_type'), name='inventory_site_type_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryrollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'bucket', 'site', 'blood_type'), name='rollup_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:50
+
+import blood_management.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_management', '0011_donor_campaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorSearchEntry',
+            fields=[
+                ('donor', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='blood_management.donor')),
+                ('document', blood_management.search.SearchDocumentField(db_column='blood_management_donor_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'blood_management_donor_search',
+                'managed': False,
+            },
+        ),
+    ]
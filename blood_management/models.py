@@ -1,5 +1,10 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
+from .search import SEARCH_TABLE, SearchDocumentField
 # Create your models here.
 
 
@@ -16,13 +21,67 @@ class Donor(models.Model):
     contact_info = models.CharField(max_length=255)
     last_donation_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['blood_type', 'last_donation_date'], name='donor_type_last_donation_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.blood_type})"
 
 
+class DonorSearchEntry(models.Model):
+    # Row of the FTS5 donor index (SQLite only), maintained with raw SQL by search.py
+    donor = models.OneToOneField(Donor, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                 related_name='search_entry')
+    document = SearchDocumentField(db_column=SEARCH_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = SEARCH_TABLE
+
+
+class Site(models.Model):
+    # A branch holding its own stock; its coordinates give the distances routing and transfers minimise
+    name = models.CharField(max_length=100, unique=True)
+    latitude = models.FloatField(default=0)
+    longitude = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+
+def default_site_id():
+    """
+    The site stock and requests belong to when none is given: the first site, created
+    as ``DEFAULT_SITE_NAME`` on a single-site deployment.
+    """
+    site_id = Site.objects.order_by('pk').values_list('pk', flat=True).first()
+    if site_id is None:
+        site_id = Site.objects.get_or_create(name=getattr(settings, 'DEFAULT_SITE_NAME', 'Main'))[0].pk
+    return site_id
+
+
 class BloodInventory(models.Model):
-    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES, unique=True)
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='inventory', default=default_site_id)
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
     units_available = models.PositiveIntegerField()
+    # Sum of active Reservation holds, maintained incrementally with the holds
+    units_reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'blood_type'], name='inventory_site_type_unique'),
+        ]
+
+    @property
+    def units_free(self):
+        return self.units_available - self.units_reserved
 
     def __str__(self):
         return f"{self.blood_type}: {self.units_available} units"
@@ -35,11 +94,215 @@ class BloodRequest(models.Model):
         ('Denied', 'Denied'),
     ]
 
+    URGENCY = [
+        ('Emergency', 'Emergency'),
+        ('Urgent', 'Urgent'),
+        ('Routine', 'Routine'),
+    ]
+    # Queue rank of each urgency; lower is served first
+    URGENCY_PRIORITY = {'Emergency': 0, 'Urgent': 1, 'Routine': 2}
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Where the blood is needed; fulfillment is routed to the nearest site with stock
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='requests', default=default_site_id)
+    fulfilled_from = models.ForeignKey(Site, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='fulfilled_requests')
     blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
     units_requested = models.PositiveIntegerField()
     status = models.CharField(max_length=10, choices=REQUEST_STATUS, default='Pending')
     request_date = models.DateTimeField(auto_now_add=True)
+    urgency = models.CharField(max_length=10, choices=URGENCY, default='Routine')
+    needed_by = models.DateTimeField(null=True, blank=True)
+    # Derived from urgency on save and raised to Emergency as needed_by approaches
+    priority = models.PositiveSmallIntegerField(default=URGENCY_PRIORITY['Routine'])
+
+    class Meta:
+        # Newest first; id breaks ties between requests created in the same instant
+        ordering = ['-request_date', '-id']
+        indexes = [
+            models.Index(fields=['user', 'request_date'], name='request_user_date_idx'),
+            models.Index(fields=['status', 'blood_type', 'request_date'], name='request_status_type_date_idx'),
+            models.Index(fields=['request_date'], name='request_date_idx'),
+            models.Index(fields=['site', 'request_date'], name='request_site_date_idx'),
+            # The triage queue: pending requests by priority, oldest first
+            models.Index(fields=['status', 'priority', 'request_date'], name='request_queue_idx'),
+            models.Index(fields=['status', 'needed_by'], name='request_deadline_idx'),
+        ]
 
     def __str__(self):
         return f"Request by {self.user.username} for {self.units_requested} units of {self.blood_type}"
+
+    def save(self, *args, **kwargs):
+        self.priority = self.priority_for(self.urgency, self.needed_by)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def priority_for(cls, urgency, needed_by, now=None):
+        window = timedelta(seconds=getattr(settings, 'TRIAGE_ESCALATION_WINDOW', 2 * 60 * 60))
+        if needed_by is not None and needed_by <= (now or timezone.now()) + window:
+            return cls.URGENCY_PRIORITY['Emergency']
+        return cls.URGENCY_PRIORITY[urgency]
+
+
+class Reservation(models.Model):
+    RESERVATION_STATUS = [
+        ('Active', 'Active'),
+        ('Consumed', 'Consumed'),
+        ('Released', 'Released'),
+        ('Expired', 'Expired'),
+    ]
+
+    blood_request = models.ForeignKey(BloodRequest, on_delete=models.CASCADE, related_name='reservations')
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='reservations', default=default_site_id)
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
+    units = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=RESERVATION_STATUS, default='Active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The sweeper scans active holds by expiry
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['blood_request'], condition=models.Q(status='Active'),
+                name='one_active_reservation_per_request',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Hold of {self.units} units of {self.blood_type} for request {self.blood_request_id} ({self.status})"
+
+
+class BloodBag(models.Model):
+    BAG_STATUS = [
+        ('Available', 'Available'),
+        ('Allocated', 'Allocated'),
+        ('Expired', 'Expired'),
+    ]
+
+    donor = models.ForeignKey(Donor, on_delete=models.SET_NULL, null=True, blank=True, related_name='bags')
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='bags', default=default_site_id)
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
+    collection_date = models.DateField()
+    expiry_date = models.DateField()
+    status = models.CharField(max_length=10, choices=BAG_STATUS, default='Available')
+    blood_request = models.ForeignKey(BloodRequest, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='bags')
+
+    class Meta:
+        indexes = [
+            # First-expiring-first-out allocation and the expiry job scan available bags by expiry
+            models.Index(fields=['site', 'blood_type', 'status', 'expiry_date'], name='bag_site_type_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.blood_type} bag collected {self.collection_date}, expires {self.expiry_date} ({self.status})"
+
+
+class InventoryLedgerEntry(models.Model):
+    REASONS = [
+        ('create', 'Inventory created'),
+        ('adjust', 'Manual adjustment'),
+        ('receive', 'Bags received'),
+        ('fulfill', 'Request fulfilled'),
+        ('expire', 'Bags expired'),
+        ('transfer', 'Transferred between sites'),
+    ]
+
+    # Append-only: every change of units_available, signed
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='+', default=default_site_id)
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
+    change = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASONS)
+    blood_request = models.ForeignKey(BloodRequest, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='ledger_entries')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='ledger_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.change:+d} {self.blood_type} ({self.reason}) at {self.created_at}"
+
+
+class InventoryRollup(models.Model):
+    GRANULARITIES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITIES)
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name='+', default=default_site_id)
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
+    bucket = models.DateTimeField()  # Start of the hour or day
+    units_in = models.PositiveIntegerField(default=0)
+    units_out = models.PositiveIntegerField(default=0)
+    units_fulfilled = models.PositiveIntegerField(default=0)  # The part of units_out that met demand
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index range reads go through, with or without a site and blood type
+            models.UniqueConstraint(fields=['granularity', 'bucket', 'site', 'blood_type'],
+                                    name='rollup_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.blood_type} {self.granularity} {self.bucket}: +{self.units_in} -{self.units_out}"
+
+
+class IdempotencyKey(models.Model):
+    # A client-chosen Idempotency-Key and the response its first request produced
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None while in progress
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for user {self.user_id} ({self.status_code or 'in progress'})"
+
+
+class Campaign(models.Model):
+    # A recall of eligible donors of one blood type by email, sent in batches by campaigns.dispatcher
+    STATUSES = [
+        ('Running', 'Running'),
+        ('Paused', 'Paused'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    blood_type = models.CharField(max_length=3, choices=Donor.BLOOD_TYPES)
+    subject = models.CharField(max_length=200)
+    message = models.TextField()  # {name} and {blood_type} are filled in for every donor
+    eligible_before = models.DateField()  # Donors who donated after this date are not contacted
+    status = models.CharField(max_length=10, choices=STATUSES, default='Running')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)  # Recipients selected when the campaign was created
+    sent = models.PositiveIntegerField(default=0)
+    cursor = models.CharField(max_length=100, blank=True, default='')  # Last donor sent to; resumes after it
+    error = models.TextField(blank=True, default='')  # Why the last batch failed
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.blood_type} recall {self.pk} ({self.status}, {self.sent}/{self.total})"
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination with a client-selectable page size. Pages are fetched with
+    ``WHERE key < last seen`` instead of ``OFFSET``, and no ``COUNT(*)`` is issued,
+    so deep pages cost the same as the first one.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'CURSOR_PAGINATION_MAX_PAGE_SIZE', 100)
+
+
+class BloodRequestCursorPagination(KeysetPagination):
+    ordering = ('-request_date', '-id')
+
+
+class DonorCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class SelectablePaginationMixin:
+    """
+    Lets a list view switch to its cursor pagination class with ``?paginator=cursor``,
+    keeping the default page number pagination otherwise.
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.cursor_pagination_class and self.request.query_params.get('paginator') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .allocation import InventoryConflict
+from .events import request_status_changed
+from .inventory_cache import invalidate_inventory
+from .models import BloodInventory, BloodRequest, Reservation
+from .sites import route, site_type_filter, site_type_increment
+
+logger = logging.getLogger(__name__)
+
+
+def reserve_units(blood_request, ttl=None, site=None):
+    """
+    Hold ``units_requested`` units for a pending request until ``ttl`` seconds from now,
+    at ``site`` or by default at the nearest site with enough free units.
+    The hold is taken with one conditional UPDATE on ``units_reserved``, so concurrent
+    admins can never promise more than ``units_available``.
+    """
+    if blood_request.status != 'Pending':
+        raise ValidationError("Only pending requests can be reserved.")
+    ttl = ttl or getattr(settings, 'RESERVATION_TTL', 30 * 60)
+    units = blood_request.units_requested
+    site_id = getattr(site, 'pk', site) or route(blood_request, blood_request.blood_type)
+    if site_id is None:
+        if Reservation.objects.filter(blood_request=blood_request, status='Active').exists():
+            raise InventoryConflict('This request already has an active reservation.')
+        if not BloodInventory.objects.filter(blood_type=blood_request.blood_type).exists():
+            raise Http404('No inventory found for this blood type.')
+        raise ValidationError("Not enough unreserved units available to hold for this request.")
+    try:
+        with transaction.atomic():
+            try:
+                # The partial unique constraint rejects a second active hold for the request
+                with transaction.atomic():
+                    reservation = Reservation.objects.create(
+                        blood_request=blood_request,
+                        site_id=site_id,
+                        blood_type=blood_request.blood_type,
+                        units=units,
+                        expires_at=timezone.now() + timedelta(seconds=ttl),
+                    )
+            except IntegrityError:
+                raise InventoryConflict('This request already has an active reservation.')
+
+            held = (BloodInventory.objects
+                    .filter(site_id=site_id, blood_type=blood_request.blood_type,
+                            units_available__gte=F('units_reserved') + units)
+                    .update(units_reserved=F('units_reserved') + units))
+            if not held:
+                # Rolls back the reservation row above
+                if not BloodInventory.objects.filter(site_id=site_id, blood_type=blood_request.blood_type).exists():
+                    raise Http404('No inventory found for this blood type.')
+                raise ValidationError("Not enough unreserved units available to hold for this request.")
+            invalidate_inventory()
+    except OperationalError as exc:
+        raise InventoryConflict() from exc
+
+    sweeper.ensure_started()
+    return reservation
+
+
+def release_reservation(blood_request, status='Released'):
+    """
+    Return the units of the request's active hold to the free pool.
+    Returns False when the request had no active hold.
+    """
+    try:
+        with transaction.atomic():
+            hold = (Reservation.objects
+                    .filter(blood_request=blood_request, status='Active')
+                    .values_list('pk', 'site_id', 'blood_type', 'units')
+                    .first())
+            if hold is None:
+                return False
+            pk, site_id, blood_type, units = hold
+            # Only the caller that flips the status gives the units back
+            if not Reservation.objects.filter(pk=pk, status='Active').update(
+                    status=status, released_at=timezone.now()):
+                return False
+            BloodInventory.objects.filter(site_id=site_id, blood_type=blood_type).update(
+                units_reserved=F('units_reserved') - units)
+            invalidate_inventory()
+    except OperationalError as exc:
+        raise InventoryConflict() from exc
+    return True
+
+
+def deny_request(blood_request):
+    """
+    Deny a pending request and release its hold in the same transaction, so the
+    units are only returned by the caller whose conditional UPDATE denied it.
+    Returns False when the request was no longer pending.
+    """
+    try:
+        with transaction.atomic():
+            if not BloodRequest.objects.filter(pk=blood_request.pk, status='Pending').update(status='Denied'):
+                return False
+            release_reservation(blood_request)
+    except OperationalError as exc:
+        raise InventoryConflict() from exc
+    blood_request.status = 'Denied'
+    request_status_changed.send(sender=BloodRequest, transitions=[(blood_request, 'Pending')])
+    return True
+
+
+def release_expired(now=None, batch_size=500):
+    """
+    Expire every active hold past its ``expires_at``, ``batch_size`` holds per
+    transaction, with one inventory UPDATE per batch. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(Reservation.objects
+                   .filter(status='Active', expires_at__lte=now)
+                   .order_by('expires_at')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return released
+
+        with transaction.atomic():
+            # The marker identifies the holds this batch claimed, excluding any a
+            # concurrent fulfillment or sweeper took between the SELECT and the UPDATE
+            marker = timezone.now()
+            if not Reservation.objects.filter(pk__in=ids, status='Active').update(status='Expired', released_at=marker):
+                continue
+            totals = {}
+            for site_id, blood_type, units in (Reservation.objects
+                                               .filter(pk__in=ids, status='Expired', released_at=marker)
+                                               .values_list('site_id', 'blood_type', 'units')):
+                totals[(site_id, blood_type)] = totals.get((site_id, blood_type), 0) - units
+                released += 1
+            BloodInventory.objects.filter(site_type_filter(totals)).update(
+                units_reserved=site_type_increment(BloodInventory, 'units_reserved', totals))
+            invalidate_inventory()
+
+
+class ReservationSweeper:
+    """
+    Daemon thread releasing expired holds every ``RESERVATION_SWEEP_INTERVAL`` seconds.
+    Started lazily by the first reservation; set the interval to None to rely on the
+    ``release_expired_reservations`` command instead.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        interval = getattr(settings, 'RESERVATION_SWEEP_INTERVAL', 60)
+        if interval is None:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(interval,),
+                                                name='reservation-sweeper', daemon=True)
+                self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                release_expired(batch_size=getattr(settings, 'RESERVATION_SWEEP_BATCH_SIZE', 500))
+            except Exception:
+                logger.exception("Failed to release expired reservations")
+            finally:
+                close_old_connections()
+
+
+sweeper = ReservationSweeper()
@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from .models import Donor, BloodInventory, BloodRequest
+from datetime import timedelta
+from django.conf import settings
+from .campaigns import validate_template
+from .matching import eligibility_cutoff
+from .models import (Donor, BloodBag, BloodInventory, BloodRequest, Campaign, InventoryRollup, Reservation, Site,
+                     default_site_id)
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
@@ -9,22 +14,176 @@ class DonorSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class SiteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Site
+        fields = '__all__'
+
+
 class BloodInventorySerializer(serializers.ModelSerializer):
+    units_free = serializers.IntegerField(read_only=True)  # units_available minus active holds
+    site = serializers.PrimaryKeyRelatedField(queryset=Site.objects.all(), required=False)  # Default: the first site
+    site_name = serializers.CharField(source='site.name', read_only=True)  # Needs select_related('site')
+
     class Meta:
         model = BloodInventory
         fields = '__all__'
+        read_only_fields = ['units_reserved']  # Maintained by reservations only
+        validators = []  # (site, blood_type) uniqueness is checked in validate(), where the default site is known
+
+    def validate_units_available(self, value):
+        if self.instance is not None and value < self.instance.units_reserved:
+            raise serializers.ValidationError("Cannot drop below the units currently reserved.")
+        return value
+
+    def validate(self, attrs):
+        site = attrs.get('site') or (self.instance.site if self.instance else Site.objects.get(pk=default_site_id()))
+        blood_type = attrs.get('blood_type', getattr(self.instance, 'blood_type', None))
+        duplicate = BloodInventory.objects.filter(site=site, blood_type=blood_type)
+        if self.instance is not None:
+            duplicate = duplicate.exclude(pk=self.instance.pk)
+        if duplicate.exists():
+            raise serializers.ValidationError({'blood_type': "This site already has inventory of this blood type."})
+        attrs.setdefault('site', site)
+        return attrs
+
+
+class BloodBagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BloodBag
+        fields = '__all__'
+        read_only_fields = ['status', 'blood_request']  # Changed by allocation and the expiry job
+        extra_kwargs = {'expiry_date': {'required': False}}  # Defaults to BLOOD_BAG_SHELF_LIFE_DAYS after collection
+
+    def validate(self, attrs):
+        donor = attrs.get('donor')
+        if donor is not None and donor.blood_type != attrs['blood_type']:
+            raise serializers.ValidationError({'blood_type': "Does not match the donor's blood type."})
+        if 'expiry_date' not in attrs:
+            attrs['expiry_date'] = attrs['collection_date'] + timedelta(
+                days=getattr(settings, 'BLOOD_BAG_SHELF_LIFE_DAYS', 42))
+        if attrs['expiry_date'] <= attrs['collection_date']:
+            raise serializers.ValidationError({'expiry_date': "Must be after the collection date."})
+        return attrs
 
 
 class BloodRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = BloodRequest
         fields = '__all__'
-        read_only_fields = ['status', 'request_date', 'user']  # These fields are read-only
+        read_only_fields = ['status', 'request_date', 'user', 'priority', 'fulfilled_from']  # These fields are read-only
 
     blood_type = serializers.CharField(required=False)  # Ensure required fields are not these
     units_requested = serializers.IntegerField(required=False)
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email']
+
+
+class ExpandedBloodRequestSerializer(BloodRequestSerializer):
+    user = UserSummarySerializer(read_only=True)  # Needs select_related('user') to avoid N+1 queries
+
+    # Columns the expanded representation reads, for .only() projections
+    projection = ['id', 'site', 'fulfilled_from', 'blood_type', 'units_requested', 'status', 'request_date', 'urgency',
+                  'needed_by', 'priority', 'user', 'user__id', 'user__username', 'user__email']
+
+
+class BulkFulfillmentSerializer(serializers.Serializer):
+    request_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    blood_type = serializers.ChoiceField(choices=Donor.BLOOD_TYPES, required=False)  # All pending for this type
+    site = serializers.PrimaryKeyRelatedField(queryset=Site.objects.all(), required=False)  # Requests raised there
+
+    def validate(self, attrs):
+        if not attrs.get('request_ids') and not attrs.get('blood_type') and not attrs.get('site'):
+            raise serializers.ValidationError("Provide request_ids, blood_type or site.")
+        return attrs
+
+
+class TriageQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, default=10)
+    site = serializers.IntegerField(min_value=1, required=False)  # Only requests raised at this site
+
+    def validate_limit(self, value):
+        return min(value, settings.TRIAGE_MAX_LIMIT)
+
+
+class TransferPlanQuerySerializer(serializers.Serializer):
+    blood_type = serializers.ChoiceField(choices=Donor.BLOOD_TYPES, required=False)  # Every type by default
+
+
+class TransferSerializer(serializers.Serializer):
+    from_site = serializers.PrimaryKeyRelatedField(queryset=Site.objects.all())
+    to_site = serializers.PrimaryKeyRelatedField(queryset=Site.objects.all())
+    blood_type = serializers.ChoiceField(choices=Donor.BLOOD_TYPES)
+    units = serializers.IntegerField(min_value=1)
+
+    def validate(self, attrs):
+        if attrs['from_site'] == attrs['to_site']:
+            raise serializers.ValidationError({'to_site': "Must differ from the source site."})
+        return attrs
+
+
+class CampaignSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Campaign
+        exclude = ['cursor']
+        read_only_fields = ['status', 'created_by', 'created_at', 'finished_at', 'total', 'sent', 'error']
+        extra_kwargs = {'eligible_before': {'required': False}}  # Defaults to DONOR_ELIGIBILITY_DAYS ago
+
+    def _validate_template(self, value):
+        try:
+            validate_template(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate_subject(self, value):
+        return self._validate_template(value)
+
+    def validate_message(self, value):
+        return self._validate_template(value)
+
+    def validate(self, attrs):
+        attrs.setdefault('eligible_before', eligibility_cutoff())
+        return attrs
+
+
+class CampaignStatusSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=['Running', 'Paused'])  # Pause, or resume a paused or failed campaign
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Reservation
+        fields = '__all__'
+        read_only_fields = ['blood_request', 'blood_type', 'units', 'status', 'expires_at', 'released_at']
+
+    ttl = serializers.IntegerField(min_value=1, required=False, write_only=True)  # Seconds, defaults to RESERVATION_TTL
+
+
+class InventoryHistoryQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=InventoryRollup.GRANULARITIES, default='day')
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField(required=False)  # Defaults to now
+    blood_type = serializers.ChoiceField(choices=Donor.BLOOD_TYPES, required=False)
+    site = serializers.IntegerField(min_value=1, required=False)  # Summed over every site by default
+
+    def validate(self, attrs):
+        if attrs.get('end') and attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({'end': "Must be after start."})
+        return attrs
+
+
+class CompatibleDonorQuerySerializer(serializers.Serializer):
+    recipient = serializers.ChoiceField(choices=Donor.BLOOD_TYPES)
+    eligibility_days = serializers.IntegerField(min_value=0, required=False)
+    page_size = serializers.IntegerField(min_value=1, required=False)
+    cursor = serializers.CharField(required=False)
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import BloodInventory, BloodRequest, Donor, Reservation
+from .events import inventory_changed, inventory_events, publish_all, request_events, request_status_changed
+from .inventory_cache import invalidate_inventory
+from .authentication import invalidate_principal
+from . import search
+
+
+# Keep the donor search index in sync with the registry
+@receiver(post_save, sender=Donor)
+def index_donor(sender, instance, **kwargs):
+    search.rebuild_index([instance.pk])
+
+
+@receiver(post_delete, sender=Donor)
+def unindex_donor(sender, instance, **kwargs):
+    search.remove_donor(instance.pk)
+
+
+# Every inventory write, including Django admin edits, invalidates the cached snapshot
+@receiver(post_save, sender=BloodInventory)
+@receiver(post_delete, sender=BloodInventory)
+def invalidate_inventory_snapshot(sender, **kwargs):
+    invalidate_inventory()
+
+
+# Deleting a request cascades to its holds; an active one must give its units back
+@receiver(post_delete, sender=Reservation)
+def release_deleted_reservation(sender, instance, **kwargs):
+    if instance.status == 'Active':
+        BloodInventory.objects.filter(site_id=instance.site_id, blood_type=instance.blood_type).update(
+            units_reserved=F('units_reserved') - instance.units)
+        invalidate_inventory()
+
+
+# Live events reach the stream subscribers only once their transaction has committed
+@receiver(inventory_changed)
+def stream_inventory_changes(sender, changes, **kwargs):
+    events = inventory_events(changes)
+    transaction.on_commit(lambda: publish_all(events))
+
+
+@receiver(request_status_changed)
+def stream_request_transitions(sender, transitions, **kwargs):
+    events = request_events(transitions)
+    transaction.on_commit(lambda: publish_all(events))
+
+
+@receiver(post_save, sender=BloodRequest)
+def announce_new_request(sender, instance, created, **kwargs):
+    if created:
+        request_status_changed.send(sender=BloodRequest, transitions=[(instance, None)])
+
+
+# Deactivation or a staff change must not be served from the cached JWT principal
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+
+# Tune every new SQLite connection (WAL, busy timeout, synchronous) from SQLITE_PRAGMAS
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.is_in_memory_db():
+        pragmas.pop('journal_mode', None)  # In-memory databases cannot use WAL
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
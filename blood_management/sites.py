@@ -0,0 +1,119 @@
+"""
+Sites (branches) and the distances between them. Distances are great-circle
+kilometres computed from the sites' coordinates with NumPy, a row or a whole matrix
+at a time. Fulfillment and holds are routed to the nearest site with enough free
+stock; the transfer planner (transfers.py) works on the full matrix.
+"""
+import numpy as np
+from django.db.models import Case, F, Q, When
+from .matching import BLOOD_TYPES, TYPE_INDEX
+from .models import BloodInventory, Site
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_matrix(origins, destinations):
+    """
+    Great-circle distances in km from every ``(latitude, longitude)`` of ``origins``
+    to every one of ``destinations``, as a ``(len(origins), len(destinations))`` matrix.
+    """
+    a = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    b = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlon = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+class SiteMap:
+    """
+    Every site's id and coordinates, loaded with one query. Sites are addressed by
+    their position in ``ids``, which is also their row in the stock matrices.
+    """
+
+    def __init__(self):
+        rows = list(Site.objects.order_by('pk').values_list('pk', 'latitude', 'longitude'))
+        self.ids = [pk for pk, _, _ in rows]
+        self.index = {pk: position for position, pk in enumerate(self.ids)}
+        self.coordinates = np.array([(lat, lon) for _, lat, lon in rows], dtype=np.float64).reshape(-1, 2)
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances_from(self, site_id):
+        # Cached per origin, as a batch usually routes many requests from the same sites
+        if site_id not in self._rows:
+            self._rows[site_id] = distance_matrix(self.coordinates[self.index[site_id]], self.coordinates)[0]
+        return self._rows[site_id]
+
+    def distances(self):
+        return distance_matrix(self.coordinates, self.coordinates)
+
+
+def load_free_stock(sites, blood_types=None):
+    """
+    Units free to allocate (available minus held) per site and blood type, as an
+    ``int64`` matrix of shape ``(len(sites), len(BLOOD_TYPES))``. Sites without an
+    inventory row for a type hold -1, so nothing is ever routed there.
+    """
+    free = np.full((len(sites), len(BLOOD_TYPES)), -1, dtype=np.int64)
+    inventory = BloodInventory.objects.all()
+    if blood_types is not None:
+        inventory = inventory.filter(blood_type__in=blood_types)
+    rows = list(inventory.values_list('site_id', 'blood_type', 'units_available', 'units_reserved'))
+    if rows:
+        site_ids, types, available, reserved = zip(*rows)
+        site_index = np.fromiter((sites.index[pk] for pk in site_ids), dtype=np.intp, count=len(rows))
+        type_index = np.fromiter((TYPE_INDEX[t] for t in types), dtype=np.intp, count=len(rows))
+        free[site_index, type_index] = np.asarray(available, dtype=np.int64) - np.asarray(reserved, dtype=np.int64)
+    return free
+
+
+def nearest_with_stock(distances, free, units):
+    """
+    Position of the nearest site whose ``free`` units cover ``units``, or None.
+    Ties go to the site created first.
+    """
+    candidates = np.where(free >= units, distances, np.inf)
+    if not len(candidates):
+        return None
+    nearest = int(np.argmin(candidates))
+    return None if np.isinf(candidates[nearest]) else nearest
+
+
+def route(blood_request, blood_type, hold=None):
+    """
+    Id of the site nearest to where ``blood_request`` is needed with enough free
+    ``blood_type`` units for it, counting the request's own hold ``(site_id, blood_type,
+    units)`` at that site. None when no site has enough. Two queries.
+    """
+    sites = SiteMap()
+    free = load_free_stock(sites, [blood_type])[:, TYPE_INDEX[blood_type]]
+    if hold and hold[1] == blood_type:
+        free[sites.index[hold[0]]] += hold[2]
+    nearest = nearest_with_stock(sites.distances_from(blood_request.site_id), free, blood_request.units_requested)
+    return None if nearest is None else sites.ids[nearest]
+
+
+def site_type_filter(pairs):
+    """
+    Rows of any of the ``(site_id, blood_type)`` pairs.
+    """
+    matches = Q()
+    for site_id, blood_type in pairs:
+        matches |= Q(site_id=site_id, blood_type=blood_type)
+    return matches
+
+
+def site_type_increment(model, field, deltas):
+    """
+    ``field`` plus the delta of its row's ``(site_id, blood_type)`` pair, as one CASE
+    expression for a single UPDATE of many rows; other rows keep their value.
+    """
+    return Case(
+        *[When(site_id=site_id, blood_type=blood_type, then=F(field) + delta)
+          for (site_id, blood_type), delta in deltas.items()],
+        default=F(field),
+        output_field=model._meta.get_field(field),
+    )
@@ -1,8 +1,51 @@
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.test import APIClient, APITestCase
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework import status
-from .models import Donor, BloodInventory, BloodRequest
+import asyncio
+import json
+import os
+import re
+import runpy
+import tempfile
+import threading
+import time
+from unittest import mock
+from io import BytesIO, StringIO
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from datetime import timedelta
+from django.test.utils import CaptureQueriesContext
+from .models import (Donor, BloodBag, BloodInventory, BloodRequest, Campaign, IdempotencyKey, InventoryLedgerEntry,
+                     InventoryRollup, Reservation, Site, default_site_id)
+from .alerts import alerter
+from .matching import compatible_donor_types
+from .bulk import import_donors, iter_records
+from .metrics import registry as metrics_registry
+from .allocation import InventoryConflict
+from .reservations import release_expired
+from .idempotency import purge_expired
+from .events import hub
+from .forecasting import compute_forecast, days_of_cover, get_forecast, refresh_forecast, refresher, smoothing_weights
+from .transfers import solve_transport
+from .campaigns import dispatcher as campaign_dispatcher, run_campaign
+from django.core.mail.backends import locmem
+from smtplib import SMTPException
+from rest_framework.response import Response
+from .coalescing import RequestCoalescer
+from .throttling import take_token
+from .views import DonorListCreateView
 
 # Authentication Tests
 class AuthenticationTest(APITestCase):
@@ -24,6 +67,39 @@ class AuthenticationTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("access", response.data)
 
+# Cached JWT Principal Tests
+class CachedAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_user_lookup_cached(self):
+        self.client.get("/api/requests/")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/requests/")
+        self.assertFalse(any('"auth_user"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_staff_change_invalidates(self):
+        self.assertEqual(self.client.get("/api/requests/").status_code, status.HTTP_200_OK)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get("/api/requests/").status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get("/api/donors/").status_code, status.HTTP_200_OK)
+
+    def test_deactivation_invalidates(self):
+        self.client.get("/api/requests/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/requests/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_is_safe_to_save(self):
+        self.client.get("/api/requests/")
+        response = self.client.post("/api/requests/", {"blood_type": "A+", "units_requested": 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(BloodRequest.objects.get().user, self.user)
+
 # Donor Management Tests (Admin Only)
 class DonorManagementTest(APITestCase):
     def setUp(self):
@@ -48,6 +124,291 @@ class DonorManagementTest(APITestCase):
         response = self.client.get("/api/donors/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+# Donor Search Tests (Admin Only)
+@override_settings(THROTTLE_BUCKETS={})  # Buckets are keyed by user pk, which rolled back tests reuse
+class DonorSearchTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.jane = Donor.objects.create(name="Jane Doe", blood_type="O-", contact_info="555-0101")
+        self.john = Donor.objects.create(name="John Johnson", blood_type="A+", contact_info="555-0202")
+
+    def _search(self, term):
+        response = self.client.get("/api/donors/", {"search": term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [d["id"] for d in response.data["results"]]
+
+    def test_prefix_match_ranked(self):
+        # "john" matches both of John's name tokens, so he ranks first
+        self.assertEqual(self._search("joh"), [self.john.id])
+        self.assertEqual(self._search("555"), [self.jane.id, self.john.id])
+        self.assertEqual(self._search("O-"), [self.jane.id])
+        self.assertEqual(self._search('jane "doe'), [self.jane.id])
+
+    def test_match_runs_once_per_query(self):
+        # A per-row rank subquery would repeat the MATCH for every candidate donor
+        with CaptureQueriesContext(connection) as ctx:
+            self._search("555")
+        searches = [query["sql"] for query in ctx.captured_queries if "MATCH" in query["sql"]]
+        self.assertEqual(len(searches), 2, searches)  # COUNT and page
+        for sql in searches:
+            self.assertEqual(sql.count("MATCH"), 1, sql)
+
+    def test_composes_with_filters_and_pagination(self):
+        response = self.client.get("/api/donors/", {"search": "555", "blood_type": "A+"})
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual([d["id"] for d in response.data["results"]], [self.john.id])
+        response = self.client.get("/api/donors/", {"search": "555", "paginator": "cursor", "page_size": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_index_follows_save_and_delete(self):
+        self.jane.name = "Janet Smith"
+        self.jane.save()
+        self.assertEqual(self._search("smi"), [self.jane.id])
+        self.assertEqual(self._search("doe"), [])
+
+        self.john.delete()
+        self.assertEqual(self._search("john"), [])
+
+    def test_rebuild_command(self):
+        Donor.objects.bulk_create([Donor(name="Bulk Donor", blood_type="B+", contact_info="1")])
+        self.assertEqual(self._search("bulk"), [])
+        call_command("rebuild_donor_search", stdout=StringIO())
+        self.assertEqual(len(self._search("bulk")), 1)
+
+# Async Read Endpoint Tests
+class AsyncReadViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        other_user = User.objects.create_user(username="other", password="userpass")
+        BloodInventory.objects.create(blood_type="A+", units_available=10)
+        for n in range(12):
+            BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=n + 1)
+        BloodRequest.objects.create(user=other_user, blood_type="O-", units_requested=1)
+
+    def _auth(self, user, **headers):
+        return {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}", **headers}
+
+    async def test_user_requests_match_sync_view(self):
+        response = await self.async_client.get("/api/async/requests/?page=2", headers=self._auth(self.regular_user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sync_response = await sync_to_async(self.client.get)("/api/requests/?page=2", headers=self._auth(self.regular_user))
+        data, sync_data = response.json(), json.loads(sync_response.content)
+        self.assertEqual(data["count"], sync_data["count"])
+        self.assertEqual(data["results"], sync_data["results"])
+        self.assertTrue(data["previous"].endswith("/api/async/requests/"))
+
+    async def test_admin_requests_filters_and_permissions(self):
+        response = await self.async_client.get("/api/async/admin/requests/?blood_type=O-", headers=self._auth(self.admin_user))
+        self.assertEqual(response.json()["count"], 1)
+
+        response = await self.async_client.get("/api/async/admin/requests/", headers=self._auth(self.regular_user))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = await self.async_client.get("/api/async/admin/requests/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_server_timing_counts_queries_under_asgi(self):
+        # Sync views and the async ORM run their queries on another thread than the event loop
+        for path in ("/api/admin/requests/", "/api/async/admin/requests/"):
+            response = await self.async_client.get(path, headers=self._auth(self.admin_user))
+            queries = int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+            self.assertGreater(queries, 0, path)
+
+    async def test_inventory_snapshot_conditional(self):
+        response = await self.async_client.get("/api/async/inventory/", headers=self._auth(self.admin_user))
+        self.assertEqual(response.json()["results"][0]["units_available"], 10)
+        response = await self.async_client.get(
+            "/api/async/inventory/", headers=self._auth(self.admin_user, **{"If-None-Match": response["ETag"]})
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+# Live Event Stream Tests
+class EventStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        self.other_user = User.objects.create_user(username="other", password="userpass")
+        BloodInventory.objects.create(blood_type="A+", units_available=10)
+        self.site_id = default_site_id()
+        self.own = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=2)
+        self.others = BloodRequest.objects.create(user=self.other_user, blood_type="A+", units_requested=3)
+
+    def _auth(self, user, **headers):
+        return {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}", **headers}
+
+    async def _connect(self, user, **headers):
+        response = await self.async_client.get("/api/events/", headers=self._auth(user, **headers))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))  # Subscribed from here on
+        return stream
+
+    @staticmethod
+    async def _next(stream):
+        frame = await asyncio.wait_for(anext(stream), timeout=2)
+        fields = dict(line.split(": ", 1) for line in frame.decode().strip().splitlines())
+        return fields["event"], json.loads(fields["data"])
+
+    def _fulfill(self, blood_request):
+        # Events are published on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(f"/api/admin/requests/{blood_request.id}/", {"status": "Fulfilled"},
+                                     content_type="application/json", headers=self._auth(self.admin_user))
+
+    async def test_admin_sees_inventory_and_request_changes(self):
+        stream = await self._connect(self.admin_user)
+        await sync_to_async(self._fulfill)(self.others)
+        self.assertEqual(await self._next(stream), (
+            "inventory", {"site": self.site_id, "blood_type": "A+", "change": -3, "reason": "fulfill",
+                          "request": self.others.id}))
+        kind, data = await self._next(stream)
+        self.assertEqual((kind, data["id"], data["previous_status"], data["status"]),
+                         ("request", self.others.id, "Pending", "Fulfilled"))
+        await stream.aclose()
+
+    async def test_users_only_see_their_own_requests(self):
+        stream = await self._connect(self.regular_user)
+        await sync_to_async(self._fulfill)(self.others)
+        await sync_to_async(self._fulfill)(self.own)
+        kind, data = await self._next(stream)
+        self.assertEqual((kind, data["id"], data["status"]), ("request", self.own.id, "Fulfilled"))
+        await stream.aclose()
+
+        response = await self.async_client.get("/api/events/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refused_under_wsgi(self):
+        # A WSGI worker would be held for the whole stream
+        response = self.client.get("/api/events/", headers=self._auth(self.admin_user))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertFalse(response.streaming)
+
+    async def test_rolled_back_changes_are_not_published(self):
+        stream = await self._connect(self.admin_user)
+        oversized = await BloodRequest.objects.acreate(user=self.other_user, blood_type="A+", units_requested=50)
+        response = await sync_to_async(self._fulfill)(oversized)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        last = hub.publish("marker", {})
+        self.assertEqual(await self._next(stream), ("marker", {}))
+        await stream.aclose()
+
+        # Reconnecting streams catch up from Last-Event-ID, or are told to reload when it is too old
+        hub.publish("inventory", {"blood_type": "A+"})
+        stream = await self._connect(self.admin_user, **{"Last-Event-ID": str(last.id)})
+        self.assertEqual(await self._next(stream), ("inventory", {"blood_type": "A+"}))
+        await stream.aclose()
+        stream = await self._connect(self.admin_user, **{"Last-Event-ID": "not-a-number"})
+        self.assertEqual(await self._next(stream), ("reset", {}))
+        await stream.aclose()
+
+# Bulk Import / Export Tests (Admin Only)
+class BulkImportExportTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_csv_import_reports_bad_rows(self):
+        body = (
+            "name,blood_type,contact_info,last_donation_date\n"
+            "Jane Doe,O-,555-0101,2023-08-01\n"
+            "Bad Type,X+,555-0102,\n"
+            "John Roe,A+,555-0103,\n"
+        )
+        response = self.client.generic("POST", "/api/donors/import/", body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([e["row"] for e in response.data["errors"]], [2])
+        # Imported rows are searchable although bulk_create skips signals
+        self.assertEqual(self.client.get("/api/donors/", {"search": "roe"}).data["count"], 1)
+
+    def test_ndjson_import_in_chunks(self):
+        lines = [json.dumps({"name": f"Donor {i}", "blood_type": "B+", "contact_info": str(i)}) for i in range(5)]
+        stream = BytesIO("\n".join(lines[:3] + ["{not json"] + lines[3:]).encode())
+        report = import_donors(iter_records(stream, "ndjson"), chunk_size=2)
+        self.assertEqual(report["created"], 5)
+        self.assertEqual(report["errors"][0]["row"], 4)
+
+    def test_malformed_upload_is_rejected_with_its_row(self):
+        header = "name,blood_type,contact_info\n"
+        cases = [
+            ((header + "Jane Doe,O-,1\n").encode() + b"J\xffhn,A+,2\n", "Invalid UTF-8"),
+            (header + "Jane Doe,O-,1\n" + "John," + "x" * 200000 + ",2\n", "Invalid CSV"),
+        ]
+        for body, message in cases:
+            response = self.client.generic("POST", "/api/donors/import/", body, content_type="text/csv")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["malformed"]["row"], 2)
+            self.assertIn(message, response.data["malformed"]["detail"])
+            self.assertEqual(response.data["created"], 1)
+
+    def test_import_rejects_unknown_content_type(self):
+        response = self.client.post("/api/donors/import/", {"name": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_streaming_exports(self):
+        Donor.objects.create(name="Jane Doe", blood_type="O-", contact_info="555-0101")
+        user = User.objects.create_user(username="user", password="userpass")
+        BloodRequest.objects.create(user=user, blood_type="O-", units_requested=2)
+
+        response = self.client.get("/api/donors/export/")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,name,blood_type,contact_info,last_donation_date")
+        self.assertIn("Jane Doe", lines[1])
+
+        response = self.client.get("/api/admin/requests/export/", {"output": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]["user__username"], "user")
+        self.assertEqual(rows[0]["units_requested"], 2)
+
+# Compatible Donor Matching Tests (Admin Only)
+class CompatibleDonorTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        today = timezone.localdate()
+        self.never = Donor.objects.create(name="Never", blood_type="O+", contact_info="1")
+        self.old = Donor.objects.create(name="Old", blood_type="A-", contact_info="2",
+                                        last_donation_date=today - timedelta(days=400))
+        self.older = Donor.objects.create(name="Older", blood_type="O-", contact_info="3",
+                                          last_donation_date=today - timedelta(days=500))
+        self.recent = Donor.objects.create(name="Recent", blood_type="O-", contact_info="4",
+                                           last_donation_date=today - timedelta(days=10))
+        self.incompatible = Donor.objects.create(name="Incompatible", blood_type="B+", contact_info="5")
+
+    def test_compatibility_table(self):
+        self.assertEqual(compatible_donor_types("O-"), ["O-"])
+        self.assertEqual(compatible_donor_types("A+"), ["A+", "A-", "O+", "O-"])
+        self.assertEqual(compatible_donor_types("AB-"), ["A-", "B-", "AB-", "O-"])
+        self.assertEqual(len(compatible_donor_types("AB+")), 8)
+
+    def test_eligible_donors_sorted_and_paged(self):
+        seen, url = [], "/api/donors/compatible/?recipient=A%2B&page_size=1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [d["id"] for d in response.data["results"]]
+            url = response.data["next"]
+
+        # Never donated first, then longest since last donation; recent and B+ donors excluded
+        self.assertEqual(seen, [self.never.id, self.older.id, self.old.id])
+
+    def test_eligibility_window_and_validation(self):
+        response = self.client.get("/api/donors/compatible/", {"recipient": "O-", "eligibility_days": 5})
+        self.assertEqual([d["id"] for d in response.data["results"]], [self.older.id, self.recent.id])
+
+        response = self.client.get("/api/donors/compatible/", {"recipient": "C+"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 # Blood Inventory Management Tests (Admin Only)
 class BloodInventoryTest(APITestCase):
     def setUp(self):
@@ -67,6 +428,180 @@ class BloodInventoryTest(APITestCase):
         self.inventory.refresh_from_db()
         self.assertEqual(self.inventory.units_available, 5)
 
+# Low Inventory Alert Tests
+@override_settings(LOW_INVENTORY_THRESHOLDS={"O-": 20}, LOW_INVENTORY_ALERT_DEBOUNCE=3600)
+class LowInventoryAlertTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        alerter.reset()
+
+    def test_alerts_once_when_crossing_threshold(self):
+        inventory = BloodInventory.objects.create(blood_type="A+", units_available=10)
+        for units in (3, 2, 8, 1):
+            self.client.put(f"/api/inventory/{inventory.id}/", {"blood_type": "A+", "units_available": units})
+        alerter.join()
+
+        # Dropping to 3 alerts; staying low and the debounced re-crossing to 1 do not
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("A+", mail.outbox[0].body)
+
+    def test_per_blood_type_threshold(self):
+        self.client.post("/api/inventory/", {"blood_type": "O-", "units_available": 15})
+        self.client.post("/api/inventory/", {"blood_type": "B+", "units_available": 15})
+        alerter.join()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("O-", mail.outbox[0].body)
+        self.assertNotIn("B+", mail.outbox[0].body)
+
+# Demand Forecast Tests
+@override_settings(LOW_INVENTORY_THRESHOLDS={}, REORDER_LEAD_TIME_DAYS=2)
+class DemandForecastTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        alerter.reset()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def _history(self, blood_type, daily_units, days=30, ago=1):
+        now = timezone.now()
+        for day in range(ago, ago + days):
+            blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type=blood_type,
+                                                        units_requested=daily_units, status="Fulfilled")
+            BloodRequest.objects.filter(pk=blood_request.pk).update(request_date=now - timedelta(days=day))
+        call_command("backfill_inventory_history", stdout=StringIO())  # Loads the daily rollups
+
+    def test_smoothing_weights_match_recursive_smoothing(self):
+        series = [3, 0, 7, 4, 4, 9, 1]
+        smoothed = series[0]
+        for value in series[1:]:
+            smoothed = 0.3 * value + 0.7 * smoothed
+        weights = smoothing_weights(len(series), 0.3)
+        self.assertAlmostEqual(float(sum(w * x for w, x in zip(weights, series))), smoothed)
+
+    def test_vectorized_statistics(self):
+        import numpy as np
+        demand = np.array([[10] * 14, [0] * 14, [0, 4] * 7])
+        stats = compute_forecast(demand, window=7, alpha=0.3, lead_time=2, z=1.0)
+        self.assertEqual(list(stats["reorder_point"][:2]), [20, 0])
+        self.assertEqual(list(stats["observed"]), [True, False, True])
+        self.assertEqual(list(days_of_cover([30, 5], [10, 0])), [3.0, float("inf")])
+
+    def test_forecast_drives_low_inventory_alerts(self):
+        self._history("A+", 10)
+        self._history("B+", 1)
+        BloodInventory.objects.create(blood_type="A+", units_available=15)  # Alerts: under two days of demand
+        BloodInventory.objects.create(blood_type="B+", units_available=4)  # Below the static 5, yet plenty
+        BloodInventory.objects.create(blood_type="O-", units_available=4)  # No history: static threshold
+        refresh_forecast()
+        self.client.put(f"/api/inventory/{BloodInventory.objects.get(blood_type='A+').id}/",
+                        {"blood_type": "A+", "units_available": 14})
+        alerter.join()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("A+, O-", mail.outbox[0].body)
+        self.assertNotIn("B+", mail.outbox[0].body)
+
+    def test_stopped_demand_still_alerts_when_empty(self):
+        self._history("AB-", 3, days=10, ago=60)  # Nothing in the recent window: reorder point 0
+        refresh_forecast()
+        self.assertEqual(get_forecast()["AB-"]["reorder_point"], 0)
+        self.client.post("/api/inventory/", {"blood_type": "AB-", "units_available": 0})
+        alerter.join()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("AB-", mail.outbox[0].body)
+
+    def test_miss_refreshes_in_background(self):
+        self._history("A+", 10)
+        # The request thread falls back to the static thresholds; the refresh starts after commit
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(0):
+            self.assertEqual(get_forecast(), {})
+        self.assertEqual(callbacks, [refresher.submit])
+
+    def test_forecast_endpoint(self):
+        self._history("A+", 10)
+        BloodInventory.objects.create(blood_type="A+", units_available=25)
+        out = StringIO()
+        call_command("refresh_demand_forecast", stdout=out)
+        self.assertIn("A+: 10.0 units/day, reorder point 20", out.getvalue())
+
+        self.client.get("/api/inventory/forecast/")
+        with self.assertNumQueries(0):  # Forecast, levels and principal are all cached
+            response = self.client.get("/api/inventory/forecast/")
+        [row] = response.data["results"]
+        self.assertEqual((row["threshold"], row["days_of_cover"]), (20, 2.5))
+        self.assertEqual(row["forecast"]["moving_average"], 10.0)
+
+# Inventory Snapshot Cache Tests (Admin Only)
+class InventoryCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.inventory = BloodInventory.objects.create(blood_type="A+", units_available=10)
+
+    def test_snapshot_served_from_cache(self):
+        self.client.get("/api/inventory/")
+        # Neither the snapshot nor the JWT user lookup touches the database once cached
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/inventory/")
+        self.assertEqual(response.data["results"][0]["units_available"], 10)
+
+    def test_conditional_get(self):
+        response = self.client.get("/api/inventory/")
+        etag = response["ETag"]
+
+        response = self.client.get("/api/inventory/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(f"/api/inventory/{self.inventory.id}/", {"blood_type": "A+", "units_available": 7})
+        response = self.client.get("/api/inventory/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["units_available"], 7)
+
+    def test_last_modified_validates_only_past_seconds(self):
+        second = 1_700_000_000
+        with mock.patch("blood_management.inventory_cache.time", wraps=time) as clock:
+            clock.time_ns.return_value = second * 10**9 + 200_000_000
+            self.client.put(f"/api/inventory/{self.inventory.id}/", {"blood_type": "A+", "units_available": 7})
+            # A second write within this second would share its date, so none is sent yet
+            response = self.client.get("/api/inventory/")
+            self.assertNotIn("Last-Modified", response)
+            response = self.client.get("/api/inventory/", HTTP_IF_MODIFIED_SINCE=http_date(second))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            clock.time_ns.return_value = (second + 1) * 10**9
+            response = self.client.get("/api/inventory/")
+            etag, last_modified = response["ETag"], response["Last-Modified"]
+            self.assertEqual(last_modified, http_date(second))
+            response = self.client.get("/api/inventory/", HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            # If-None-Match takes precedence: a stale ETag is not rescued by a current date
+            self.client.put(f"/api/inventory/{self.inventory.id}/", {"blood_type": "A+", "units_available": 6})
+            response = self.client.get("/api/inventory/", HTTP_IF_NONE_MATCH=etag,
+                                       HTTP_IF_MODIFIED_SINCE=http_date(second + 5))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_fulfillment_invalidates_snapshot(self):
+        self.client.get("/api/inventory/")
+        request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=4)
+        self.client.patch(f"/api/admin/requests/{request.id}/", {"status": "Fulfilled"})
+
+        response = self.client.get("/api/inventory/")
+        self.assertEqual(response.data["results"][0]["units_available"], 6)
+
 # Blood Request Management Tests
 class BloodRequestTest(APITestCase):
     def setUp(self):
@@ -117,4 +652,1213 @@ class BloodRequestTest(APITestCase):
 
         # Reload the blood request instance from the database
         request.refresh_from_db()
-        self.assertEqual(request.status, "Fulfilled")  # Verify that the status has been updated
\ No newline at end of file
+        self.assertEqual(request.status, "Fulfilled")  # Verify that the status has been updated
+
+    def test_fulfill_insufficient_inventory(self):
+        request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=20)
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        response = self.client.patch(f"/api/admin/requests/{request.id}/", {"status": "Fulfilled"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The status transition is rolled back together with the failed decrement
+        request.refresh_from_db()
+        self.inventory.refresh_from_db()
+        self.assertEqual(request.status, "Pending")
+        self.assertEqual(self.inventory.units_available, 10)
+
+    def test_fulfill_twice_conflicts(self):
+        request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=2)
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        # A stale admin view still thinks the request is pending
+        BloodRequest.objects.filter(pk=request.pk).update(status="Fulfilled")
+        from .allocation import InventoryConflict, fulfill_request
+        with self.assertRaises(InventoryConflict):
+            fulfill_request(request)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.units_available, 10)
+
+# Bulk Fulfillment Tests (Admin Only)
+class BulkFulfillmentTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        BloodInventory.objects.create(blood_type="A+", units_available=5)
+        BloodInventory.objects.create(blood_type="O-", units_available=10)
+
+    def _create_requests(self, blood_type, *units):
+        return [
+            BloodRequest.objects.create(user=self.regular_user, blood_type=blood_type, units_requested=n)
+            for n in units
+        ]
+
+    def test_allocates_fifo_and_skips_what_does_not_fit(self):
+        first, too_big, last = self._create_requests("A+", 3, 4, 2)
+        response = self.client.post("/api/admin/requests/fulfill/", {"blood_type": "A+"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["fulfilled"], [first.id, last.id])
+        self.assertEqual([s["id"] for s in response.data["skipped"]], [too_big.id])
+        self.assertEqual(BloodInventory.objects.get(blood_type="A+").units_available, 0)
+
+    def test_reports_named_requests_it_cannot_apply(self):
+        pending, done, other_type = self._create_requests("A+", 1, 1) + self._create_requests("O-", 1)
+        BloodRequest.objects.filter(pk=done.pk).update(status="Fulfilled")
+        response = self.client.post("/api/admin/requests/fulfill/", {
+            "request_ids": [pending.id, done.id, other_type.id, 999999], "blood_type": "A+"}, format="json")
+        self.assertEqual(response.data["fulfilled"], [pending.id])
+        self.assertEqual({s["id"]: s["reason"] for s in response.data["skipped"]}, {
+            done.id: "Request is Fulfilled, not Pending.",
+            other_type.id: "Request does not match the blood_type or site filter.",
+            999999: "Request not found.",
+        })
+
+    def test_constant_query_count(self):
+        ids = [r.id for r in self._create_requests("A+", *[1] * 5) + self._create_requests("O-", *[1] * 10)]
+        # Auth, pending select, site select, inventory select, hold select, savepoint, status update,
+        # inventory update, bag select, 3 ledger writes, release and the low-inventory snapshot,
+        # independent of the number of requests
+        with self.assertNumQueries(14):
+            response = self.client.post("/api/admin/requests/fulfill/", {"request_ids": ids}, format="json")
+        self.assertEqual(len(response.data["fulfilled"]), 15)
+        self.assertFalse(BloodRequest.objects.filter(status="Pending").exists())
+
+    def test_requires_ids_or_blood_type(self):
+        response = self.client.post("/api/admin/requests/fulfill/", {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+# Reservation Tests (Admin Only)
+@override_settings(RESERVATION_SWEEP_INTERVAL=None)
+class ReservationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.inventory = BloodInventory.objects.create(blood_type="A+", units_available=10)
+        self.held, self.other = [
+            BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=n) for n in (6, 5)
+        ]
+
+    def _reserve(self, blood_request, **data):
+        return self.client.post(f"/api/admin/requests/{blood_request.id}/reserve/", data, format="json")
+
+    def test_hold_reduces_free_units(self):
+        response = self._reserve(self.held, ttl=60)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["units"], 6)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.units_available, self.inventory.units_reserved), (10, 6))
+        self.assertEqual(self.client.get("/api/inventory/").data["results"][0]["units_free"], 4)
+
+        # Held units cannot be promised twice
+        self.assertEqual(self._reserve(self.other).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._reserve(self.held).status_code, status.HTTP_409_CONFLICT)
+
+    def test_unheld_request_cannot_take_held_units(self):
+        self._reserve(self.held)
+        response = self.client.patch(f"/api/admin/requests/{self.other.id}/", {"status": "Fulfilled"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(f"/api/admin/requests/{self.held.id}/", {"status": "Fulfilled"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.units_available, self.inventory.units_reserved), (4, 0))
+        self.assertEqual(Reservation.objects.get().status, "Consumed")
+
+    def test_bulk_fulfillment_consumes_holds(self):
+        self._reserve(self.other)
+        response = self.client.post("/api/admin/requests/fulfill/", {"blood_type": "A+"}, format="json")
+        # FIFO would serve the first request, but its 6 units would eat into the other's hold
+        self.assertEqual(response.data["fulfilled"], [self.other.id])
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.units_available, self.inventory.units_reserved), (5, 0))
+
+    def test_release_and_delete_return_units(self):
+        self._reserve(self.held)
+        response = self.client.delete(f"/api/admin/requests/{self.held.id}/reserve/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(f"/api/admin/requests/{self.held.id}/reserve/").status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+        self._reserve(self.other)
+        self.other.delete()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.units_reserved, 0)
+
+    def test_denial_releases_hold(self):
+        self._reserve(self.held)
+        response = self.client.patch(f"/api/admin/requests/{self.held.id}/", {"status": "Denied"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "Denied")
+        self.held.refresh_from_db()
+        self.assertEqual(self.held.status, "Denied")
+        self.assertEqual(Reservation.objects.get().status, "Released")
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.units_reserved, 0)
+
+        # A denied request keeps its status and cannot take a new hold
+        self.client.patch(f"/api/admin/requests/{self.held.id}/", {"status": "Denied"})
+        self.held.refresh_from_db()
+        self.assertEqual(self.held.status, "Denied")
+        self.assertEqual(self._reserve(self.held).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_holds_are_released_in_batches(self):
+        BloodInventory.objects.update(units_available=20)
+        self._reserve(self.held)
+        self._reserve(self.other)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertNumQueries(13):  # (select, savepoint, claim, read back, decrement, release) per batch, final select
+            self.assertEqual(release_expired(batch_size=1), 2)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.units_reserved, 0)
+        self.assertEqual(set(Reservation.objects.values_list("status", flat=True)), {"Expired"})
+
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("Released 0 expired reservations.", out.getvalue())
+
+    def test_inventory_cannot_drop_below_reserved(self):
+        self._reserve(self.held)
+        response = self.client.put(f"/api/inventory/{self.inventory.id}/", {"blood_type": "A+", "units_available": 5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+# Blood Bag Tests (Admin Only)
+class BloodBagTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.today = timezone.localdate()
+
+    def _receive(self, blood_type, *days_to_expiry):
+        bags = [{"blood_type": blood_type, "collection_date": str(self.today - timedelta(days=30)),
+                 "expiry_date": str(self.today + timedelta(days=days))} for days in days_to_expiry]
+        response = self.client.post("/api/bags/", bags, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return [bag["id"] for bag in response.data]
+
+    def test_receiving_bags_updates_inventory(self):
+        # Auth, default site, savepoint, bag insert, row insert, count update, 3 ledger, release, snapshot
+        with self.assertNumQueries(11):
+            self._receive("A+", 5, 10, 15)
+        self._receive("O-", 5)
+        self.assertEqual(BloodInventory.objects.get(blood_type="A+").units_available, 3)
+        self.assertEqual(BloodInventory.objects.get(blood_type="O-").units_available, 1)
+
+        response = self.client.post("/api/bags/", {"blood_type": "B+", "collection_date": str(self.today)})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["expiry_date"], str(self.today + timedelta(days=42)))
+
+    def test_rejects_bag_not_matching_donor(self):
+        donor = Donor.objects.create(name="Jane Doe", blood_type="O-", contact_info="123")
+        response = self.client.post("/api/bags/", {"donor": donor.id, "blood_type": "A+",
+                                                   "collection_date": str(self.today)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fulfillment_allocates_first_expiring_first(self):
+        late, soon, expired, middle = self._receive("A+", 20, 2, -1, 9)
+        blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=2)
+        response = self.client.patch(f"/api/admin/requests/{blood_request.id}/", {"status": "Fulfilled"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(blood_request.bags.values_list("id", flat=True)), {soon, middle})
+        self.assertEqual(BloodInventory.objects.get(blood_type="A+").units_available, 2)
+
+    def test_bulk_fulfillment_allocates_in_fifo_order(self):
+        first_bags = self._receive("A+", 3, 4)
+        second_bags = self._receive("A+", 8)
+        first, second = [
+            BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=n) for n in (2, 1)
+        ]
+        self.client.post("/api/admin/requests/fulfill/", {"blood_type": "A+"}, format="json")
+        self.assertEqual(sorted(first.bags.values_list("id", flat=True)), first_bags)
+        self.assertEqual(list(second.bags.values_list("id", flat=True)), second_bags)
+
+    def test_nightly_job_expires_bags_in_bulk(self):
+        self._receive("A+", -2, -1, 3)
+        self._receive("O-", -1)
+        out = StringIO()
+        call_command("expire_blood_bags", stdout=out)
+        self.assertIn("Expired 3 bags (A+: 2, O-: 1).", out.getvalue())
+        self.assertEqual(BloodInventory.objects.get(blood_type="A+").units_available, 1)
+        self.assertEqual(BloodInventory.objects.get(blood_type="O-").units_available, 0)
+        self.assertEqual(BloodBag.objects.filter(status="Expired").count(), 3)
+
+    def test_fefo_selection_uses_index(self):
+        self._receive("A+", 1, 2)
+        blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(f"/api/admin/requests/{blood_request.id}/", {"status": "Fulfilled"})
+        query = next(q["sql"] for q in ctx.captured_queries
+                     if q["sql"].startswith("SELECT") and "blood_management_bloodbag" in q["sql"])
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+            plan = " | ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("bag_site_type_expiry_idx", plan)
+
+# Inventory History Tests (Admin Only)
+class InventoryHistoryTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.start = (timezone.now() - timedelta(days=1)).isoformat()
+
+    def _history(self, **params):
+        response = self.client.get("/api/inventory/history/", {"start": self.start, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_every_mutation_path_is_recorded(self):
+        inventory = self.client.post("/api/inventory/", {"blood_type": "A+", "units_available": 10}).data
+        self.client.put(f"/api/inventory/{inventory['id']}/", {"blood_type": "A+", "units_available": 12})
+        blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=3)
+        self.client.patch(f"/api/admin/requests/{blood_request.id}/", {"status": "Fulfilled"})
+
+        self.assertEqual(list(InventoryLedgerEntry.objects.order_by("id").values_list("change", "reason")),
+                         [(10, "create"), (2, "adjust"), (-3, "fulfill")])
+        for granularity in ("day", "hour"):
+            [row] = self._history(granularity=granularity)
+            self.assertEqual((row["blood_type"], row["units_in"], row["units_out"], row["net"], row["entries"]),
+                             ("A+", 12, 3, 9, 3))
+
+    def test_range_is_one_indexed_query(self):
+        self.client.post("/api/inventory/", {"blood_type": "O-", "units_available": 4})
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self._history(blood_type="O-")), 1)
+        [query] = [q["sql"] for q in ctx.captured_queries if "blood_management_inventoryrollup" in q["sql"]]
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+            plan = " | ".join(row[-1] for row in cursor.fetchall())
+        # The unique constraint's index (an sqlite_autoindex) serves the bucket range
+        self.assertIn("USING INDEX", plan)
+        self.assertIn("granularity=? AND bucket>?", plan)
+
+    def test_rejects_too_many_buckets(self):
+        response = self.client.get("/api/inventory/history/",
+                                   {"granularity": "hour", "start": (timezone.now() - timedelta(days=60)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_is_chunked_and_idempotent(self):
+        requests = BloodRequest.objects.bulk_create(
+            BloodRequest(user=self.regular_user, blood_type="B+", units_requested=n, status="Fulfilled")
+            for n in (1, 2, 3)
+        )
+        BloodRequest.objects.filter(pk=requests[0].pk).update(request_date=timezone.now() - timedelta(days=3))
+        out = StringIO()
+        call_command("backfill_inventory_history", "--chunk-size", "2", stdout=out)
+        self.assertIn("Backfilled 3 fulfilled requests.", out.getvalue())
+        call_command("backfill_inventory_history", stdout=StringIO())
+
+        self.assertEqual(InventoryLedgerEntry.objects.count(), 3)
+        days = InventoryRollup.objects.filter(granularity="day").order_by("bucket")
+        self.assertEqual([(r.units_out, r.entries) for r in days], [(1, 1), (5, 2)])
+
+# Cursor Pagination Tests
+class CursorPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.requests = [
+            BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=n)
+            for n in range(1, 8)
+        ]
+
+    def test_walks_every_row_once_without_count(self):
+        seen, url = [], "/api/admin/requests/?paginator=cursor&page_size=3"
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+            seen += [r["id"] for r in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(seen, [r.id for r in reversed(self.requests)])
+
+    def test_page_size_is_capped(self):
+        Donor.objects.bulk_create(
+            Donor(name=f"Donor {i}", blood_type="O+", contact_info=str(i)) for i in range(120)
+        )
+        response = self.client.get("/api/donors/?paginator=cursor&page_size=500")
+        self.assertEqual(len(response.data["results"]), 100)
+
+    def test_page_number_remains_default(self):
+        response = self.client.get("/api/admin/requests/")
+        self.assertEqual(response.data["count"], 7)
+
+# N+1 Query Tests for request listings and the Django admin
+class RequestListingQueryTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass", email="a@example.com")
+        self.users = [User.objects.create_user(username=f"user{i}", password="userpass") for i in range(10)]
+
+    def _create_requests(self, count):
+        for user in self.users[:count]:
+            BloodRequest.objects.create(user=user, blood_type="A+", units_requested=1)
+
+    def _count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_expanded_admin_list_constant_queries(self):
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+        self.client.get("/api/admin/requests/")  # Warm the cached JWT principal
+        self._create_requests(2)
+        few, _ = self._count_queries(self.client, "/api/admin/requests/?expand=user")
+        self._create_requests(8)
+        many, response = self._count_queries(self.client, "/api/admin/requests/?expand=user")
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(set(response.data["results"][0]["user"]), {"id", "username", "email"})
+
+    def test_user_list_expanded(self):
+        user = self.users[0]
+        self._create_requests(1)
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        response = self.client.get("/api/requests/?expand=user")
+        self.assertEqual(response.data["results"][0]["user"]["username"], "user0")
+        # The compact representation keeps the user id
+        response = self.client.get("/api/requests/")
+        self.assertEqual(response.data["results"][0]["user"], user.id)
+
+    def test_admin_changelists_constant_queries(self):
+        client = self.client_class()
+        client.force_login(self.admin_user)
+        for model in ("donor", "bloodinventory", "bloodrequest"):
+            with self.subTest(model=model):
+                url = f"/admin/blood_management/{model}/"
+                few, _ = self._count_queries(client, url)
+                self._create_requests(10)
+                Donor.objects.create(name="Jane", blood_type="O-", contact_info="1")
+                many, _ = self._count_queries(client, url)
+                self.assertEqual(few, many)
+                BloodRequest.objects.all().delete()
+                Donor.objects.all().delete()
+
+# Query Plan Tests for the hot list filters
+class QueryPlanTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        Donor.objects.create(name="Jane Doe", blood_type="O-", contact_info="123", last_donation_date="2023-01-01")
+        BloodRequest.objects.create(user=self.regular_user, blood_type="O-", units_requested=1)
+
+    def _query_plans(self, user, url):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if query["sql"].startswith("SELECT") and "blood_management_" in query["sql"]:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plans.append(" | ".join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def assertNoTableScan(self, plans):
+        self.assertTrue(plans)
+        for plan in plans:
+            # "SCAN t USING [COVERING] INDEX" walks an index, a bare "SCAN t" reads every row
+            for step in plan.split(" | "):
+                if step.startswith("SCAN "):
+                    self.assertIn("INDEX", step, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_user_request_list_uses_index(self):
+        plans = self._query_plans(self.regular_user, "/api/requests/")
+        self.assertNoTableScan(plans)
+        self.assertTrue(any("request_user_date_idx" in plan for plan in plans), plans)
+
+    def test_admin_request_list_uses_index(self):
+        self.assertNoTableScan(self._query_plans(self.admin_user, "/api/admin/requests/"))
+        plans = self._query_plans(self.admin_user, "/api/admin/requests/?status=Pending&blood_type=O-")
+        self.assertNoTableScan(plans)
+        self.assertTrue(any("request_status_type_date_idx" in plan for plan in plans), plans)
+
+    def test_triage_queue_uses_index(self):
+        BloodInventory.objects.create(blood_type="O-", units_available=1)
+        plans = self._query_plans(self.admin_user, "/api/admin/requests/queue/")
+        self.assertNoTableScan([plan for plan in plans if "bloodrequest" in plan])
+        self.assertTrue(any("request_queue_idx" in plan for plan in plans), plans)
+
+    def test_donor_filter_uses_index(self):
+        plans = self._query_plans(self.admin_user, "/api/donors/?blood_type=O-&last_donation_before=2024-01-01")
+        for plan in plans:
+            self.assertNotRegex(plan, r"SCAN blood_management_donor($| \|)")
+        self.assertTrue(any("donor_type_last_donation_idx" in plan for plan in plans), plans)
+
+# Query Budget Tests: fail when an endpoint starts issuing more queries than recorded
+QUERY_BUDGETS = {
+    ("get", "donor_list_create"): 3,
+    ("get", "compatible_donor_list"): 9,
+    ("get", "inventory_list_create"): 2,
+    ("put", "inventory_detail"): 9,
+    ("get", "request_list_create"): 3,
+    ("post", "request_list_create"): 2,
+    ("get", "admin_request_list"): 3,
+    ("get", "admin_request_queue"): 5,
+    ("patch", "admin_request_detail"): 13,  # Includes routing to the nearest site (two queries)
+    ("post", "admin_request_bulk_fulfill"): 13,
+}
+
+
+class QueryBudgetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        self.admin = APIClient()
+        self.admin.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin_user).access_token}')
+        self.user = APIClient()
+        self.user.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.regular_user).access_token}')
+
+        self.inventory = BloodInventory.objects.create(blood_type="A+", units_available=100)
+        for i in range(8):
+            Donor.objects.create(name=f"Donor {i}", blood_type="A+", contact_info=str(i))
+            BloodRequest.objects.create(user=self.regular_user, blood_type="A+", units_requested=1)
+        refresh_forecast()  # Kept warm by the scheduled refresh; a miss costs one aggregate query
+        metrics_registry.reset()
+
+    def _queries(self, response):
+        self.assertLess(response.status_code, 400, getattr(response, "data", None))
+        timing = dict(part.strip().split(";", 1) for part in response["Server-Timing"].split(","))
+        return int(re.search(r'desc="(\d+) queries"', timing["db"]).group(1))
+
+    def test_endpoints_stay_within_query_budget(self):
+        request = BloodRequest.objects.first()
+        calls = {
+            ("get", "donor_list_create"): lambda: self.admin.get("/api/donors/"),
+            ("get", "compatible_donor_list"): lambda: self.admin.get("/api/donors/compatible/?recipient=AB%2B"),
+            ("get", "inventory_list_create"): lambda: self.admin.get("/api/inventory/"),
+            ("put", "inventory_detail"): lambda: self.admin.put(
+                f"/api/inventory/{self.inventory.id}/", {"blood_type": "A+", "units_available": 90}),
+            ("get", "request_list_create"): lambda: self.user.get("/api/requests/"),
+            ("post", "request_list_create"): lambda: self.user.post(
+                "/api/requests/", {"blood_type": "A+", "units_requested": 1}),
+            ("get", "admin_request_list"): lambda: self.admin.get("/api/admin/requests/"),
+            ("get", "admin_request_queue"): lambda: self.admin.get("/api/admin/requests/queue/"),
+            ("patch", "admin_request_detail"): lambda: self.admin.patch(
+                f"/api/admin/requests/{request.id}/", {"status": "Fulfilled"}),
+            ("post", "admin_request_bulk_fulfill"): lambda: self.admin.post(
+                "/api/admin/requests/fulfill/", {"blood_type": "A+"}, format="json"),
+        }
+        for key, call in calls.items():
+            with self.subTest(endpoint=key):
+                self.assertLessEqual(self._queries(call()), QUERY_BUDGETS[key])
+
+    def test_metrics_endpoint(self):
+        self.admin.get("/api/donors/")
+        response = self.admin.get("/api/metrics/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('blood_bank_request_duration_seconds_count{view="donor_list_create"} 1', body)
+        self.assertIn('blood_bank_db_queries_bucket{view="donor_list_create",le="+Inf"} 1', body)
+        self.assertIn('blood_bank_jwt_decode_seconds_count{view="donor_list_create"} 1', body)
+
+        self.assertEqual(self.user.get("/api/metrics/").status_code, status.HTTP_403_FORBIDDEN)
+
+# Concurrent Fulfillment Stress Test
+class ConcurrentFulfillmentTest(TransactionTestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        self.token = str(RefreshToken.for_user(self.admin_user).access_token)
+        self.inventory = BloodInventory.objects.create(blood_type="O-", units_available=25)
+        self.requests = [
+            BloodRequest.objects.create(user=self.regular_user, blood_type="O-", units_requested=1)
+            for _ in range(40)
+        ]
+
+    def _fulfill(self, request_id):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        try:
+            return client.patch(f"/api/admin/requests/{request_id}/", {"status": "Fulfilled"}).status_code
+        except OperationalError:
+            # The shared in-memory test database can lock outside the fulfillment transaction too
+            return 409
+        finally:
+            connection.close()
+
+    def test_no_lost_updates_under_concurrency(self):
+        # Every request is submitted twice to also race admins on the same row
+        ids = [r.id for r in self.requests] * 2
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = list(pool.map(self._fulfill, ids))
+
+        self.assertTrue(set(codes) <= {200, 400, 409})
+        self.inventory.refresh_from_db()
+        fulfilled = BloodRequest.objects.filter(status="Fulfilled").count()
+        # Each fulfilled request was decremented exactly once and stock never went negative
+        self.assertGreater(fulfilled, 0)
+        self.assertEqual(self.inventory.units_available + fulfilled, 25)
+
+# Triage Queue Tests
+class TriageQueueTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def _request(self, blood_type="A+", units=1, **fields):
+        return BloodRequest.objects.create(user=self.regular_user, blood_type=blood_type, units_requested=units, **fields)
+
+    def _queue(self, limit=10):
+        response = self.client.get(f"/api/admin/requests/queue/?limit={limit}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(r["id"], r["source_type"]) for r in response.data["results"]]
+
+    def test_emergencies_and_due_requests_come_first(self):
+        BloodInventory.objects.create(blood_type="A+", units_available=10)
+        routine = self._request()
+        emergency = self._request(urgency="Emergency")
+        urgent = self._request(urgency="Urgent")
+        due_soon = self._request(needed_by=timezone.now() + timedelta(days=2))
+        self.assertEqual(due_soon.priority, 2)
+
+        # Within the escalation window by the time the queue is read, but reading never writes
+        BloodRequest.objects.filter(pk=due_soon.pk).update(needed_by=timezone.now() + timedelta(minutes=30))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual([pk for pk, _ in self._queue()], [emergency.id, urgent.id, routine.id, due_soon.id])
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")])
+
+        out = StringIO()
+        call_command("escalate_due_requests", stdout=out)  # What the background escalator runs
+        self.assertIn("Escalated 1 requests.", out.getvalue())
+        self.assertEqual([pk for pk, _ in self._queue()], [emergency.id, due_soon.id, urgent.id, routine.id])
+        self.assertEqual([pk for pk, _ in self._queue(limit=2)], [emergency.id, due_soon.id])
+
+    def test_stock_is_promised_once_and_substitutes_are_used(self):
+        BloodInventory.objects.create(blood_type="A+", units_available=5)
+        BloodInventory.objects.create(blood_type="O+", units_available=2)
+        BloodInventory.objects.create(blood_type="O-", units_available=10)
+        first = self._request(units=4, urgency="Urgent")
+        too_big = self._request(units=6, urgency="Urgent")  # Only 1 A+ and 2 O+ left, so O-
+        small = self._request(units=2)
+        self.assertEqual(self._queue(), [(first.id, "A+"), (too_big.id, "O-"), (small.id, "O+")])
+
+        # O+ stock cannot serve an O- recipient
+        BloodInventory.objects.filter(blood_type="O-").update(units_available=0)
+        self._request(blood_type="O-")
+        self.assertEqual(self._queue(), [(first.id, "A+"), (small.id, "O+")])
+
+    def test_fulfill_from_substitute(self):
+        BloodInventory.objects.create(blood_type="AB+", units_available=0)
+        BloodInventory.objects.create(blood_type="B-", units_available=3)
+        blood_request = self._request(blood_type="AB+", units=2)
+        url = f"/api/admin/requests/{blood_request.id}/"
+        response = self.client.patch(url, {"status": "Fulfilled", "source_type": "O-"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # No O- inventory row
+        response = self.client.patch(f"/api/admin/requests/{self._request(blood_type='B-').id}/",
+                                     {"status": "Fulfilled", "source_type": "AB+"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(url, {"status": "Fulfilled", "source_type": "B-"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(BloodInventory.objects.get(blood_type="B-").units_available, 1)
+        self.assertEqual(InventoryLedgerEntry.objects.get(blood_request=blood_request).blood_type, "B-")
+
+    def test_hold_counts_for_its_request_only(self):
+        BloodInventory.objects.create(blood_type="A+", units_available=3)
+        BloodInventory.objects.create(blood_type="O+", units_available=5)
+        earlier = self._request(units=2)
+        held = self._request(units=3)
+        self.client.post(f"/api/admin/requests/{held.id}/reserve/", {}, format="json")
+        self.assertEqual(self._queue(), [(earlier.id, "O+"), (held.id, "A+")])
+
+        # Fulfilling from a substitute releases the hold on the request's own type
+        self.client.patch(f"/api/admin/requests/{held.id}/", {"status": "Fulfilled", "source_type": "O+"})
+        self.assertEqual(Reservation.objects.get().status, "Released")
+        self.assertEqual(BloodInventory.objects.filter(blood_type="A+").values_list(
+            "units_available", "units_reserved").get(), (3, 0))
+
+# Multi-Site Inventory Tests
+class MultiSiteTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        # The default site sits at (0, 0); one degree of longitude on the equator is ~111 km
+        self.main = Site.objects.get(pk=default_site_id())
+        self.near = Site.objects.create(name="Near", latitude=0, longitude=1)
+        self.far = Site.objects.create(name="Far", latitude=0, longitude=5)
+
+    def _stock(self, site, units, blood_type="A+"):
+        return BloodInventory.objects.create(site=site, blood_type=blood_type, units_available=units)
+
+    def _request(self, units, site=None, blood_type="A+"):
+        return BloodRequest.objects.create(user=self.regular_user, site=site or self.main, blood_type=blood_type,
+                                           units_requested=units)
+
+    def test_inventory_is_unique_per_site(self):
+        response = self.client.post("/api/inventory/", {"blood_type": "A+", "units_available": 4}, format="json")
+        self.assertEqual((response.status_code, response.data["site"]), (status.HTTP_201_CREATED, self.main.id))
+        response = self.client.post("/api/inventory/", {"site": self.near.id, "blood_type": "A+", "units_available": 6},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post("/api/inventory/", {"site": self.near.id, "blood_type": "A+", "units_available": 1},
+                                    format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(f"/api/inventory/?site={self.near.id}")
+        self.assertEqual([(r["site_name"], r["units_available"]) for r in response.data["results"]], [("Near", 6)])
+        self.assertEqual(self.client.get("/api/inventory/").data["count"], 2)
+        self.assertEqual(self.client.get("/api/inventory/?site=near").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_and_async_lists_are_scoped_by_site(self):
+        self._request(1)
+        self._request(2, site=self.near)
+        user = APIClient()
+        user.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.regular_user).access_token}')
+        for client, path in ((self.client, "/api/admin/requests/"), (self.client, "/api/async/admin/requests/"),
+                             (user, "/api/requests/"), (user, "/api/async/requests/")):
+            response = client.get(path, {"site": self.near.id})
+            self.assertEqual([r["site"] for r in response.json()["results"]], [self.near.id], path)
+            response = client.get(path, {"site": "x"})
+            self.assertEqual((response.status_code, response.json()),
+                             (status.HTTP_400_BAD_REQUEST, {"site": "A valid integer is required."}), path)
+
+    def test_fulfillment_routes_to_nearest_site_with_stock(self):
+        self._stock(self.main, 1)
+        self._stock(self.near, 5)
+        self._stock(self.far, 10)
+        first, second = self._request(3), self._request(3)
+        for blood_request, site in ((first, self.near), (second, self.far)):  # Near has 2 left for the second
+            response = self.client.patch(f"/api/admin/requests/{blood_request.id}/", {"status": "Fulfilled"})
+            self.assertEqual((response.status_code, response.data["fulfilled_from"]), (status.HTTP_200_OK, site.id))
+        self.assertEqual(dict(BloodInventory.objects.values_list("site__name", "units_available")),
+                         {"Main": 1, "Near": 2, "Far": 7})
+        self.assertEqual(InventoryLedgerEntry.objects.get(blood_request=first).site_id, self.near.id)
+
+        # An explicit source site wins over routing
+        third = self._request(1)
+        self.client.patch(f"/api/admin/requests/{third.id}/", {"status": "Fulfilled", "source_site": self.far.id})
+        self.assertEqual(BloodInventory.objects.get(site=self.far).units_available, 6)
+
+    def test_bulk_fulfillment_routes_per_request(self):
+        self._stock(self.near, 4)
+        self._stock(self.far, 4)
+        at_far = [self._request(2, site=self.far) for _ in range(2)]
+        at_main = [self._request(2) for _ in range(3)]  # Near covers two, Far has nothing left after its own
+        response = self.client.post("/api/admin/requests/fulfill/", {"blood_type": "A+"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(dict(BloodRequest.objects.filter(status="Fulfilled").values_list("id", "fulfilled_from")),
+                         {at_far[0].id: self.far.id, at_far[1].id: self.far.id,
+                          at_main[0].id: self.near.id, at_main[1].id: self.near.id})
+        self.assertEqual([r["id"] for r in response.data["skipped"]], [at_main[2].id])
+
+    def test_transport_reroutes_for_least_total_distance(self):
+        # Nearest-first sends the first deficit (at 4) to the supply at 0 and the other (at -5) 15 away;
+        # the optimum ships 10 -> 4 and 0 -> -5 for a total of 11
+        import numpy as np
+        positions = np.array([0, 10, 4, -5], dtype=float)
+        cost = np.abs(positions[:, None] - positions[None, :])
+        moves = solve_transport([[1, 1, 0, 0], [2, 0, 0, 0]], [[0, 0, 1, 1], [0, 0, 0, 5]], cost)
+        self.assertEqual(sorted(moves), [(0, 0, 3, 1), (0, 1, 2, 1), (1, 0, 3, 2)])
+
+    @override_settings(LOW_INVENTORY_THRESHOLDS={"A+": 5})
+    def test_transfer_plan_and_execution(self):
+        self._stock(self.main, 10)
+        self._stock(self.near, 0)
+        self._stock(self.far, 2)
+        response = self.client.get("/api/inventory/transfers/", {"blood_type": "A+"})
+        self.assertEqual([(m["from_site"], m["to_site"], m["units"]) for m in response.data["results"]],
+                         [(self.main.id, self.near.id, 5)])
+        self.assertEqual(response.data["shortfall"], {"A+": 3})
+
+        bags = BloodBag.objects.bulk_create([
+            BloodBag(site=self.main, blood_type="A+", collection_date=timezone.now().date(),
+                     expiry_date=timezone.now().date() + timedelta(days=d))
+            for d in (3, 1, 2)
+        ])
+        response = self.client.post("/api/inventory/transfers/", {
+            "from_site": self.main.id, "to_site": self.near.id, "blood_type": "A+", "units": 2}, format="json")
+        self.assertEqual((response.status_code, response.data["bags"]), (status.HTTP_201_CREATED, 2))
+        self.assertEqual(dict(BloodInventory.objects.values_list("site_id", "units_available")),
+                         {self.main.id: 8, self.near.id: 2, self.far.id: 2})
+        self.assertEqual(sorted(BloodBag.objects.filter(site=self.near).values_list("pk", flat=True)),
+                         sorted([bags[1].pk, bags[2].pk]))  # First to expire travel
+        self.assertEqual(sorted(InventoryLedgerEntry.objects.filter(reason="transfer").values_list("site_id", "change")),
+                         sorted([(self.main.id, -2), (self.near.id, 2)]))
+
+        # Held units stay put, and a site without the type gets its inventory row
+        BloodInventory.objects.filter(site=self.main).update(units_reserved=7)
+        response = self.client.post("/api/inventory/transfers/", {
+            "from_site": self.main.id, "to_site": self.far.id, "blood_type": "A+", "units": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/api/inventory/transfers/", {
+            "from_site": self.far.id, "to_site": self.main.id, "blood_type": "O-", "units": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+# Donor Recall Campaign Tests
+class CampaignTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        refresh = RefreshToken.for_user(self.admin_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        today = timezone.localdate()
+        # Recipients in campaign order: never donated first, then longest since last donation
+        self.recipients = [Donor.objects.create(name="Never", blood_type="O-", contact_info="never@example.com")]
+        for days in (900, 700, 500, 300):
+            self.recipients.append(Donor.objects.create(
+                name=f"Donor {days}", blood_type="O-", contact_info=f"donor{days}@example.com",
+                last_donation_date=today - timedelta(days=days)))
+        Donor.objects.create(name="Recent", blood_type="O-", contact_info="recent@example.com",
+                             last_donation_date=today - timedelta(days=10))
+        Donor.objects.create(name="Phone", blood_type="O-", contact_info="555-0100")
+        Donor.objects.create(name="Other", blood_type="A+", contact_info="other@example.com")
+
+    def _campaign(self, **fields):
+        fields = {"blood_type": "O-", "subject": "{blood_type} needed", "message": "Dear {name}, please donate.",
+                  "eligible_before": timezone.localdate() - timedelta(days=56), **fields}
+        return Campaign.objects.create(**fields)
+
+    def _addresses(self):
+        return [message.to[0] for message in mail.outbox]
+
+    def test_batches_reuse_one_connection_each(self):
+        campaign = self._campaign()
+        with mock.patch("blood_management.campaigns.get_connection", wraps=locmem.EmailBackend) as get_connection:
+            campaign = run_campaign(campaign.pk, batch_size=2)
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual((campaign.status, campaign.sent), ("Completed", 5))
+        self.assertIsNotNone(campaign.finished_at)
+        self.assertEqual(self._addresses(), [donor.contact_info for donor in self.recipients])
+        self.assertEqual((mail.outbox[0].subject, mail.outbox[0].body), ("O- needed", "Dear Never, please donate."))
+
+    def test_failed_batch_resumes_without_duplicates(self):
+        campaign = self._campaign()
+        send_messages, calls = locmem.EmailBackend.send_messages, []
+
+        def flaky(backend, messages):
+            calls.append(len(messages))
+            if len(calls) == 2:
+                raise SMTPException("Connection lost")
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", flaky), \
+                self.assertLogs("blood_management.campaigns", "ERROR"):
+            campaign = run_campaign(campaign.pk, batch_size=2)
+        self.assertEqual((campaign.status, campaign.sent, campaign.error), ("Failed", 2, "Connection lost"))
+
+        with mock.patch("blood_management.views.dispatcher") as dispatcher, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/campaigns/{campaign.pk}/", {"status": "Running"}, format="json")
+        self.assertEqual((response.status_code, response.data["error"]), (status.HTTP_200_OK, ""))
+        dispatcher.submit.assert_called_once_with(campaign.pk)
+
+        campaign = run_campaign(campaign.pk, batch_size=2)
+        self.assertEqual((campaign.status, campaign.sent), ("Completed", 5))
+        self.assertEqual(self._addresses(), [donor.contact_info for donor in self.recipients])
+
+    def test_pause_stops_after_the_current_batch(self):
+        campaign = self._campaign()
+        send_messages = locmem.EmailBackend.send_messages
+
+        def pause_during_send(backend, messages):
+            Campaign.objects.filter(pk=campaign.pk).update(status="Paused")
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", pause_during_send):
+            campaign = run_campaign(campaign.pk, batch_size=2)
+        self.assertEqual((campaign.status, campaign.sent, len(mail.outbox)), ("Paused", 2, 2))
+        self.assertTrue(campaign.cursor)
+
+        # Paused campaigns are not run, and cannot be paused twice
+        self.assertEqual(run_campaign(campaign.pk).sent, 2)
+        response = self.client.patch(f"/api/campaigns/{campaign.pk}/", {"status": "Paused"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rate_limit_spaces_batches(self):
+        campaign = self._campaign()
+        with mock.patch("blood_management.campaigns.time.sleep") as sleep:
+            run_campaign(campaign.pk, batch_size=2, rate=2)
+        # Two messages per second: with the clock standing still, the second batch is due
+        # one second after the start and the third two seconds after it
+        delays = [delay for (delay,), _ in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 1, delta=0.2)
+        self.assertAlmostEqual(delays[1], 2, delta=0.2)
+
+    def test_unsafe_stored_template_fails_the_campaign(self):
+        campaign = self._campaign(message="Dear {name:>100000000}")  # E.g. edited in the admin
+        campaign = run_campaign(campaign.pk)
+        self.assertEqual(campaign.status, "Failed")
+        self.assertIn("Format specs", campaign.error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_create_validates_templates_and_dispatches(self):
+        response = self.client.post("/api/campaigns/", {
+            "blood_type": "O-", "subject": "Hi {name.__class__}", "message": "Hello"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("subject", response.data)
+        for message in ("Dear {name:>100000000}", "Dear {name!r}", "Dear {name:{blood_type}}"):
+            response = self.client.post("/api/campaigns/", {
+                "blood_type": "O-", "subject": "Hi", "message": message}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("message", response.data)
+
+        with mock.patch("blood_management.views.dispatcher") as dispatcher, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/campaigns/", {
+                "blood_type": "O-", "subject": "{blood_type} needed", "message": "Dear {name}"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data["status"], response.data["total"], response.data["created_by"]),
+                         ("Running", 5, self.admin_user.id))
+        self.assertNotIn("cursor", response.data)
+        dispatcher.submit.assert_called_once_with(response.data["id"])
+
+        response = self.client.patch(f"/api/campaigns/{response.data['id']}/", {"status": "Paused"}, format="json")
+        self.assertEqual(response.data["status"], "Paused")
+
+
+class CampaignDispatcherTest(TransactionTestCase):
+    def test_dispatcher_runs_campaign_in_background(self):
+        Donor.objects.create(name="Jane", blood_type="B+", contact_info="jane@example.com")
+        campaign = Campaign.objects.create(blood_type="B+", subject="Hi", message="Dear {name}",
+                                           eligible_before=timezone.localdate())
+        campaign_dispatcher.submit(campaign.pk)
+        campaign_dispatcher.join()
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.sent), ("Completed", 1))
+        self.assertEqual(self._outbox(), ["jane@example.com"])
+
+    def _outbox(self):
+        return [message.to[0] for message in mail.outbox]
+
+# Throttling and Request Coalescing Tests
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.reset()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        self.admin = APIClient()
+        self.admin.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin_user).access_token}')
+        self.user = APIClient()
+        self.user.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.regular_user).access_token}')
+
+    def test_token_bucket_refills_over_time(self):
+        self.assertEqual(take_token("bucket", 2, 1, now=100), (True, 0))
+        self.assertEqual(take_token("bucket", 2, 1, now=100), (True, 0))
+        self.assertEqual(take_token("bucket", 2, 1, now=100), (False, 1))
+        self.assertEqual(take_token("bucket", 2, 1, now=100.5), (False, 0.5))
+        self.assertEqual(take_token("bucket", 2, 1, now=101), (True, 0))
+        # Idle time never fills the bucket beyond its capacity
+        self.assertEqual([take_token("bucket", 2, 1, now=1000)[0] for _ in range(3)], [True, True, False])
+
+    @override_settings(THROTTLE_BUCKETS={"token": {"anon": (2, 0.01)}})
+    def test_token_endpoint_is_throttled(self):
+        credentials = {"username": "user", "password": "userpass"}
+        # The bucket's clock stands still, so hashing the password refills nothing
+        with mock.patch("blood_management.throttling.time", wraps=time) as clock:
+            clock.time.return_value = 1000.0
+            codes = [self.client.post("/api/token/", credentials).status_code for _ in range(2)]
+            self.assertEqual(codes, [status.HTTP_200_OK] * 2)
+            response = self.client.post("/api/token/", credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "100")  # One token every 100 s
+
+        self.assertEqual(metrics_registry.counter("throttle_total", scope="token", role="anon", result="miss"), 2)
+        self.assertIn('blood_bank_throttle_total{result="hit",role="anon",scope="token"} 1',
+                      self.admin.get("/api/metrics/").content.decode())
+
+    @override_settings(THROTTLE_BUCKETS={"donor_search": {"admin": (1, 0.01)}, "default": {"user": (1, 0.01)}})
+    def test_buckets_are_per_scope_role_and_user(self):
+        self.assertEqual(self.admin.get("/api/donors/", {"search": "Jane"}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.admin.get("/api/donors/", {"search": "John"}).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        # Plain listing is another scope, without a bucket for admins
+        self.assertEqual(self.admin.get("/api/donors/").status_code, status.HTTP_200_OK)
+
+        other = User.objects.create_superuser(username="other", password="otherpass")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertEqual(client.get("/api/donors/", {"search": "Jane"}).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.user.get("/api/requests/").status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user.get("/api/requests/").status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_coalescer_runs_identical_calls_once(self):
+        coalescer, started, release, calls = RequestCoalescer(), threading.Event(), threading.Event(), []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(coalescer.run, "key", work)
+            started.wait(5)
+            followers = [pool.submit(coalescer.run, "key", work) for _ in range(3)]
+            time.sleep(0.2)  # Lets the followers start waiting
+            release.set()
+            self.assertEqual(leader.result(), ("result", False))
+            self.assertEqual([f.result() for f in followers], [("result", True)] * 3)
+        self.assertEqual(len(calls), 1)
+
+        # Once finished, the same key runs again, and errors reach every waiter
+        with self.assertRaises(ZeroDivisionError):
+            coalescer.run("key", lambda: 1 / 0)
+        self.assertEqual(coalescer.run("key", lambda: "again"), ("again", False))
+
+
+class CoalescedReadTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.reset()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.token = str(RefreshToken.for_user(self.admin_user).access_token)
+
+    def _get(self, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        try:
+            return client.get(path)
+        finally:
+            connection.close()
+
+    def test_identical_concurrent_reads_share_one_execution(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def slow_list(view, request, *args, **kwargs):
+            calls.append(request.get_full_path())
+            started.set()
+            release.wait(5)
+            return Response({"calls": len(calls)})
+
+        with mock.patch.object(DonorListCreateView, "list", slow_list), ThreadPoolExecutor(max_workers=4) as pool:
+            first = pool.submit(self._get, "/api/donors/?search=Jane")
+            started.wait(5)
+            copies = [pool.submit(self._get, "/api/donors/?search=Jane") for _ in range(2)]
+            different = pool.submit(self._get, "/api/donors/?search=John")
+            time.sleep(0.2)  # Lets the copies start waiting
+            release.set()
+            responses = [first.result()] + [copy.result() for copy in copies]
+            different = different.result()
+
+        self.assertEqual([r.status_code for r in responses + [different]], [status.HTTP_200_OK] * 4)
+        self.assertEqual(sorted(calls), ["/api/donors/?search=Jane", "/api/donors/?search=John"])
+        self.assertEqual({r.content for r in responses}, {responses[0].content})
+        self.assertEqual(metrics_registry.counter("coalesced_requests_total", view="donor_list_create"), 2)
+
+# Idempotency-Key Tests
+class IdempotencyTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username="admin", password="adminpass")
+        self.regular_user = User.objects.create_user(username="user", password="userpass")
+        self.other_user = User.objects.create_user(username="other", password="otherpass")
+        self.inventory = BloodInventory.objects.create(blood_type="B+", units_available=10)
+
+    def _login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def _create(self, key, units=2):
+        return self.client.post("/api/requests/", {"blood_type": "B+", "units_requested": units},
+                                format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_create_is_replayed(self):
+        self._login(self.regular_user)
+        first = self._create("create-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        retry = self._create("create-1")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(BloodRequest.objects.count(), 1)
+
+        # Without a key every POST creates a request
+        self.client.post("/api/requests/", {"blood_type": "B+", "units_requested": 2}, format="json")
+        self.assertEqual(BloodRequest.objects.count(), 2)
+
+    def test_reused_key_with_different_body_is_rejected(self):
+        self._login(self.regular_user)
+        self._create("create-1", units=2)
+        response = self._create("create-1", units=3)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(BloodRequest.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self._login(self.regular_user)
+        self._create("shared")
+        self._login(self.other_user)
+        response = self._create("shared")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(BloodRequest.objects.count(), 2)
+
+    def test_replayed_fulfillment_does_not_touch_inventory(self):
+        blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type="B+", units_requested=4)
+        self._login(self.admin_user)
+        url = f"/api/admin/requests/{blood_request.id}/"
+        first = self.client.patch(url, {"status": "Fulfilled"}, HTTP_IDEMPOTENCY_KEY="fulfill-1")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.client.patch(url, {"status": "Fulfilled"}, HTTP_IDEMPOTENCY_KEY="fulfill-1")
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertFalse(any("bloodinventory" in q["sql"] for q in queries.captured_queries))
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.units_available, 6)
+        self.assertEqual(InventoryLedgerEntry.objects.filter(reason="fulfill").count(), 1)
+
+    def test_failed_request_is_not_stored(self):
+        blood_request = BloodRequest.objects.create(user=self.regular_user, blood_type="B+", units_requested=40)
+        self._login(self.admin_user)
+        url = f"/api/admin/requests/{blood_request.id}/"
+        # Client errors are stored and replayed like any other response
+        self.assertEqual(self.client.patch(url, {"status": "Fulfilled"}, HTTP_IDEMPOTENCY_KEY="f").status_code, 400)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 400)
+
+        # A conflict is transient, so the key is released for the retry
+        with mock.patch("blood_management.views.fulfill_request", side_effect=InventoryConflict()):
+            response = self.client.patch(url, {"status": "Fulfilled"}, HTTP_IDEMPOTENCY_KEY="g")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.filter(key="g").exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_of_unfinished_request_gets_conflict(self):
+        IdempotencyKey.objects.create(user=self.regular_user, key="busy", fingerprint="x" * 64,
+                                      expires_at=timezone.now() + timedelta(hours=1))
+        self._login(self.regular_user)
+        with mock.patch("blood_management.idempotency.fingerprint", return_value="x" * 64):
+            response = self._create("busy")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(BloodRequest.objects.count(), 0)
+
+    def test_expired_keys_are_purged_in_batches(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        IdempotencyKey.objects.bulk_create(
+            IdempotencyKey(user=self.regular_user, key=f"old-{n}", fingerprint="", expires_at=expired) for n in range(5)
+        )
+        self._login(self.regular_user)
+        self._create("fresh")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_expired(batch_size=2), 5)
+        self.assertEqual(sum(q["sql"].startswith("DELETE") for q in queries.captured_queries), 3)
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"])
+
+        # An expired key runs the request again
+        IdempotencyKey.objects.update(expires_at=expired)
+        self.assertNotIn("Idempotent-Replayed", self._create("fresh"))
+        self.assertEqual(BloodRequest.objects.count(), 2)
+
+class ConcurrentIdempotencyTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="userpass")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def _create(self, _):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        try:
+            for _ in range(500):
+                try:
+                    response = client.post("/api/requests/", {"blood_type": "O+", "units_requested": 1},
+                                           format="json", HTTP_IDEMPOTENCY_KEY="burst")
+                except OperationalError:
+                    # The shared in-memory test database locks; back off and retry like a client would
+                    time.sleep(0.01)
+                    continue
+                if response.status_code != status.HTTP_409_CONFLICT:
+                    return response.status_code, response.data.get("id")
+                time.sleep(0.01)  # Still in progress
+            self.fail("The Idempotency-Key stayed locked or in progress for 500 attempts")
+        finally:
+            connection.close()
+
+    def test_concurrent_duplicates_are_coalesced(self):
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(self._create, range(12)))
+        self.assertEqual(BloodRequest.objects.count(), 1)
+        created = BloodRequest.objects.get().id
+        self.assertTrue(all(result == (201, created) for result in results), results)
+
+# Benchmark Suite Tests
+class BenchmarkSuiteTest(TestCase):
+    def test_every_route_has_a_scenario(self):
+        from benchmarks.suite import uncovered_routes
+        self.assertEqual(uncovered_routes(), set())
+
+    def test_regressions_beyond_threshold_fail(self):
+        from benchmarks.suite import compare
+        baseline = {"results": {"donor search": {"client": {"p50_ms": 10.0}, "server": {"p50_ms": 0.2}}}}
+        results = {"results": {"donor search": {"route": "donor_list_create", "method": "GET",
+                                                "client": {"p50_ms": 13.0}, "server": {"p50_ms": 0.4}}}}
+        # +30% fails at a 25% threshold; +100% of a sub-millisecond p50 is noise
+        self.assertEqual(len(compare(results, baseline, threshold=0.25)), 1)
+        self.assertEqual(compare(results, baseline, threshold=0.5), [])
+
+    def test_missing_baseline_fails(self):
+        from benchmarks.suite import check_baseline
+        with tempfile.TemporaryDirectory() as directory:
+            failures = check_baseline({"meta": {"dataset": {}}, "results": {}},
+                                      os.path.join(directory, "baseline.json"), threshold=0.25)
+        self.assertEqual(len(failures), 1)
+        self.assertIn("no baseline", failures[0])
+
+# Database Profile Tests
+class DatabaseProfileTest(TestCase):
+    settings_path = str(settings.BASE_DIR / "blood_bank" / "settings.py")
+
+    def _load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(self.settings_path)
+
+    def test_profiles_are_selected_from_environment(self):
+        sqlite = self._load_settings(BLOOD_BANK_DB="sqlite")["DATABASES"]["default"]
+        self.assertEqual(sqlite["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertGreater(sqlite["CONN_MAX_AGE"], 0)
+
+        postgres = self._load_settings(BLOOD_BANK_DB="postgres", BLOOD_BANK_DB_POOL_MAX="40")["DATABASES"]["default"]
+        self.assertEqual(postgres["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(postgres["OPTIONS"]["pool"]["max_size"], 40)
+        self.assertEqual(postgres["CONN_MAX_AGE"], 0)
+
+        with self.assertRaises(ImproperlyConfigured):
+            self._load_settings(BLOOD_BANK_DB="oracle")
+
+    def test_new_sqlite_connections_are_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = SQLiteDatabaseWrapper({**connection.settings_dict, "NAME": os.path.join(directory, "db.sqlite3")})
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                               for name in ("journal_mode", "busy_timeout", "synchronous")}
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, {"journal_mode": "wal", "busy_timeout": 20000, "synchronous": 1})
@@ -0,0 +1,83 @@
+"""
+Token-bucket throttling per endpoint scope and role. Every client (a user, or the
+client address when anonymous) has one bucket per scope holding up to ``capacity``
+tokens, refilled at ``rate`` tokens per second; a request takes one token or is
+answered 429 with the seconds until the next token as ``Retry-After``. Buckets live
+in the ``THROTTLE_CACHE_ALIAS`` cache and each update happens under a short
+per-bucket lock taken with the atomic ``cache.add``. With the default LocMem cache
+every worker process keeps its own buckets; only a shared backend (Redis, Memcached)
+gives a client one bucket across workers.
+"""
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+from .metrics import registry
+from .permissions import IsAdminUser, IsRegularUser
+
+
+def _cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+def take_token(key, capacity, rate, now=None):
+    """
+    Take one token from the bucket stored at ``key``, refilling it for the time since
+    its last update. Returns ``(allowed, wait)`` where ``wait`` is the number of seconds
+    until a token is available again (0 when one was taken). A bucket whose lock stays
+    taken for ``THROTTLE_LOCK_TIMEOUT`` seconds counts as empty: only its own client
+    contends for it.
+    """
+    cache = _cache()
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + getattr(settings, 'THROTTLE_LOCK_TIMEOUT', 0.05)
+    while not cache.add(lock, 1, timeout=1):
+        if time.monotonic() >= deadline:
+            return False, 1 / rate
+        time.sleep(0.001)
+    try:
+        now = time.time() if now is None else now
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # A bucket left alone until it is full again is the same as a missing one
+        cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / rate) + 1)
+    finally:
+        cache.delete(lock)
+    return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+def get_role(request, view):
+    if not request.user or not request.user.is_authenticated:
+        return 'anon'
+    if IsAdminUser().has_permission(request, view):
+        return 'admin'
+    return 'user' if IsRegularUser().has_permission(request, view) else 'anon'
+
+
+class RoleTokenBucketThrottle(BaseThrottle):
+    """
+    Throttles with the bucket ``THROTTLE_BUCKETS[scope][role]``, a ``(capacity, rate)``
+    pair, where ``scope`` is the view's ``throttle_scope`` (``'default'`` when unset)
+    and ``role`` is ``admin``, ``user`` or ``anon``. Scopes or roles without a
+    bucket are not throttled.
+    """
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None) or 'default'
+        role = get_role(request, view)
+        bucket = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope, {}).get(role)
+        if bucket is None:
+            return True
+        ident = request.user.pk if role != 'anon' else self.get_ident(request)
+        allowed, wait = take_token(f'throttle:{scope}:{role}:{ident}', *bucket)
+        registry.increment('throttle_total', scope=scope, role=role, result='miss' if allowed else 'hit')
+        if not allowed:
+            self.wait_seconds = wait
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
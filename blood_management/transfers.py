@@ -0,0 +1,247 @@
+"""
+Rebalancing stock between sites. Every site that stocks a blood type should hold at
+least its low-inventory threshold; stock above the threshold elsewhere is surplus.
+The planner ships surplus to deficits at the least total cost (units x distance) by
+solving one transportation problem per blood type, each Dijkstra step a NumPy
+operation over the whole distance matrix, and ``transfer_units`` carries out a move.
+"""
+import numpy as np
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+from .alerts import get_threshold
+from .allocation import InventoryConflict
+from .forecasting import get_forecasts
+from .history import record_changes
+from .inventory_cache import invalidate_inventory
+from .matching import BLOOD_TYPES, TYPE_INDEX
+from .models import BloodBag, BloodInventory
+from .sites import SiteMap, load_free_stock
+
+# Slack for float comparisons of path costs (km); far below any distance difference that matters
+EPSILON = 1e-6
+
+
+def solve_transport(supply, demand, cost):
+    """
+    Minimum-cost transport for a batch of independent problems sharing one cost
+    matrix. ``supply`` and ``demand`` are ``(batch, sites)`` integer arrays and
+    ``cost[i, j]`` is the cost of moving one unit from site ``i`` to site ``j``.
+    Ships ``min(total supply, total demand)`` units per problem and returns the moves
+    as ``(problem, from, to, units)`` tuples.
+
+    Successive shortest paths on each problem's transportation network: a super
+    source feeding every supply site, arcs ``i -> j`` at ``cost[i, j]``, backward arcs
+    ``j -> i`` at ``-cost[i, j]`` while units flow from ``i`` to ``j`` (so a path may
+    reroute earlier shipments), and every demand site draining to a super sink. Every
+    round searches shortest paths over reduced costs (node potentials keep them
+    non-negative) for all problems at once, relaxing every node whose distance just
+    improved as one NumPy step and pruning at the best demand reached so far, then
+    pushes as many units along each problem's path as it can take.
+    """
+    supply = np.asarray(supply, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64)
+    cost = np.asarray(cost, dtype=np.float64)
+    sources = [np.flatnonzero(row > 0) for row in supply]
+    sinks = [np.flatnonzero(row > 0) for row in demand]
+    n_s = max((len(rows) for rows in sources), default=0)
+    n_d = max((len(columns) for columns in sinks), default=0)
+    if not n_s or not n_d:
+        return []
+
+    # Each problem keeps only its own supply (rows) and demand (columns) sites, padded to
+    # the widest with rows and columns that have nothing to ship and cannot be reached
+    batch = len(supply)
+    src = np.zeros((batch, n_s), dtype=np.intp)
+    dst = np.zeros((batch, n_d), dtype=np.intp)
+    left = np.zeros((batch, n_s), dtype=np.int64)
+    need = np.zeros((batch, n_d), dtype=np.int64)
+    arc_cost = np.full((batch, n_s, n_d), np.inf)
+    for problem, (rows, columns) in enumerate(zip(sources, sinks)):
+        src[problem, :len(rows)], dst[problem, :len(columns)] = rows, columns
+        left[problem, :len(rows)] = supply[problem, rows]
+        need[problem, :len(columns)] = demand[problem, columns]
+        arc_cost[problem, :len(rows), :len(columns)] = cost[np.ix_(rows, columns)]
+    flow = np.zeros((batch, n_s, n_d), dtype=np.int64)
+    p_s, p_d, p_t = np.zeros((batch, n_s)), np.zeros((batch, n_d)), np.zeros(batch)
+    # A row entered from the super source reaches column j at reduced distance cost[i, j] - p_d[j]
+    # whatever its own potential, so the cheapest such row per column is kept across rounds and
+    # only recomputed for the columns whose cheapest row runs out of supply
+    direct_row = arc_cost.argmin(axis=1)
+    direct_cost = np.take_along_axis(arc_cost, direct_row[:, None, :], axis=1)[:, 0, :]
+    # Arcs carrying flow (the backward arcs), sorted by problem and row
+    edge_b = edge_s = edge_d = np.zeros(0, dtype=np.intp)
+
+    with np.errstate(invalid='ignore'):
+        while True:
+            active = (left.sum(axis=1) > 0) & (need.sum(axis=1) > 0)
+            if not active.any():
+                break
+            dist_s = np.where(active[:, None] & (left > 0), -p_s, np.inf)
+            dist_d = np.where(active[:, None], direct_cost - p_d, np.inf)
+            via_d = direct_row.copy()
+            via_s = np.full((batch, n_s), -1)  # The column a row is reached from backwards; -1 is the super source
+            dist_t, sink = np.full(batch, np.inf), np.full(batch, -1)
+            edge_cost = arc_cost[edge_b, edge_s, edge_d]
+            # Rows entered from the super source are relaxed already through the cached cheapest rows
+            changed_s, changed_d = np.zeros((batch, n_s), dtype=bool), np.isfinite(dist_d)
+            while True:
+                to_sink = np.where(changed_d & (need > 0), dist_d + p_d - p_t[:, None], np.inf)
+                closer = to_sink.min(axis=1) < dist_t
+                sink = np.where(closer, to_sink.argmin(axis=1), sink)
+                dist_t = np.where(closer, to_sink.min(axis=1), dist_t)
+                # Reduced costs are non-negative, so nothing at or beyond the best sink can lead to a shorter path
+                bound = (dist_t - EPSILON)[:, None]
+                changed_s &= dist_s < bound
+                changed_d &= dist_d < bound
+                if not changed_s.any() and not changed_d.any():
+                    break
+
+                b, i = np.nonzero(changed_s)
+                backward = changed_d[edge_b, edge_d]
+                changed_s, changed_d = np.zeros_like(changed_s), np.zeros_like(changed_d)
+                if len(b):
+                    through = (dist_s[b, i] + p_s[b, i])[:, None] + arc_cost[b, i] - p_d[b]
+                    reached = np.full((batch, n_d), np.inf)
+                    reached[_segment_keys(b)] = np.minimum.reduceat(through, _segment_starts(b), axis=0)
+                    changed_d = reached < dist_d - EPSILON
+                    if changed_d.any():
+                        k, j = np.nonzero(changed_d[b] & (through <= reached[b]))
+                        via_d[b[k], j] = i[k]
+                        dist_d = np.where(changed_d, reached, dist_d)
+                if backward.any():
+                    b, i, j = edge_b[backward], edge_s[backward], edge_d[backward]
+                    through = dist_d[b, j] - edge_cost[backward] + p_d[b, j] - p_s[b, i]
+                    reached = np.full((batch, n_s), np.inf)
+                    starts = _segment_starts(b * n_s + i)
+                    reached[b[starts], i[starts]] = np.minimum.reduceat(through, starts)
+                    changed_s = reached < dist_s - EPSILON
+                    if changed_s.any():
+                        wins = changed_s[b, i] & (through <= reached[b, i])
+                        via_s[b[wins], i[wins]] = j[wins]
+                        dist_s = np.where(changed_s, reached, dist_s)
+
+            found = sink >= 0
+            if not found.any():
+                break  # Demand left that no supply reaches
+            # Nodes closer than the sink move by their distance, the rest by the sink's
+            shift = np.where(found, dist_t, 0.0)[:, None]
+            p_s += np.where(found[:, None], np.minimum(dist_s, shift), 0.0)
+            p_d += np.where(found[:, None], np.minimum(dist_d, shift), 0.0)
+            p_t += shift[:, 0]
+
+            added = []
+            for problem in np.flatnonzero(found):
+                j = sink[problem]
+                path, amount = [], need[problem, j]
+                while True:
+                    i = via_d[problem, j]
+                    path.append((i, j, 1))
+                    if via_s[problem, i] < 0:
+                        break
+                    j = via_s[problem, i]
+                    path.append((i, j, -1))
+                    amount = min(amount, flow[problem, i, j])
+                amount = min(amount, left[problem, i])
+                for row, column, sign in path:
+                    if not flow[problem, row, column]:
+                        added.append((problem, row, column))
+                    flow[problem, row, column] += sign * amount
+                left[problem, i] -= amount
+                need[problem, sink[problem]] -= amount
+                if not left[problem, i] and left[problem].any():
+                    stale = np.flatnonzero(direct_row[problem] == i)
+                    rows = np.flatnonzero(left[problem] > 0)
+                    best = rows[arc_cost[problem][np.ix_(rows, stale)].argmin(axis=0)]
+                    direct_row[problem, stale] = best
+                    direct_cost[problem, stale] = arc_cost[problem, best, stale]
+            keep = flow[edge_b, edge_s, edge_d] > 0
+            edges = np.concatenate([np.stack([edge_b[keep], edge_s[keep], edge_d[keep]], axis=1),
+                                    np.array(added, dtype=np.intp).reshape(-1, 3)])
+            edge_b, edge_s, edge_d = edges[np.lexsort((edges[:, 2], edges[:, 1], edges[:, 0]))].T
+
+    b, i, j = np.nonzero(flow)
+    return [(int(problem), int(src[problem, row]), int(dst[problem, column]), int(flow[problem, row, column]))
+            for problem, row, column in zip(b, i, j)]
+
+
+def _segment_starts(keys):
+    # Positions where a run of equal values starts in the sorted ``keys``
+    return np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+
+
+def _segment_keys(keys):
+    return keys[_segment_starts(keys)]
+
+
+def plan_transfers(blood_types=None):
+    """
+    Moves that lift sites below their low-inventory threshold with the free stock
+    other sites hold above theirs, at the least total units x kilometres. Only sites
+    with an inventory row for a type take part in its rebalancing. When the surplus
+    falls short, the deficits cheapest to reach are covered first.
+    Returns ``(moves, shortfall)``: move dicts, and the units per blood type still missing.
+    """
+    blood_types = list(blood_types or BLOOD_TYPES)
+    sites = SiteMap()
+    free = load_free_stock(sites, blood_types)[:, [TYPE_INDEX[t] for t in blood_types]].T
+    forecasts = get_forecasts()
+    thresholds = np.array([
+        [get_threshold(blood_type, forecasts.get(site_id)) for site_id in sites.ids] for blood_type in blood_types
+    ], dtype=np.int64).reshape(len(blood_types), len(sites))
+    stocked = free >= 0
+    surplus = np.where(stocked, np.maximum(free - thresholds, 0), 0)
+    deficit = np.where(stocked, np.maximum(thresholds - free, 0), 0)
+    distances = sites.distances()
+
+    moves = [
+        {'blood_type': blood_types[problem], 'from_site': sites.ids[source], 'to_site': sites.ids[destination],
+         'units': units, 'distance_km': round(float(distances[source, destination]), 1)}
+        for problem, source, destination, units in solve_transport(surplus, deficit, distances)
+    ]
+    shipped = {}
+    for move in moves:
+        shipped[move['blood_type']] = shipped.get(move['blood_type'], 0) + move['units']
+    shortfall = {blood_type: int(deficit[row].sum()) - shipped.get(blood_type, 0)
+                 for row, blood_type in enumerate(blood_types)}
+    return moves, {blood_type: units for blood_type, units in shortfall.items() if units}
+
+
+def transfer_units(source_id, destination_id, blood_type, units):
+    """
+    Move ``units`` free units of ``blood_type`` between sites in one transaction: a
+    conditional decrement at the source that never takes held units, the increment
+    at the destination (creating its inventory row if needed), and the source's
+    first-expiring tracked bags, which travel with the units.
+    Returns the number of bags moved.
+    """
+    if source_id == destination_id:
+        raise ValidationError({'to_site': "Must differ from the source site."})
+    try:
+        with transaction.atomic():
+            taken = (BloodInventory.objects
+                     .filter(site_id=source_id, blood_type=blood_type,
+                             units_available__gte=F('units_reserved') + units)
+                     .update(units_available=F('units_available') - units))
+            if not taken:
+                if not BloodInventory.objects.filter(site_id=source_id, blood_type=blood_type).exists():
+                    raise Http404('No inventory found for this blood type at the source site.')
+                raise ValidationError("Not enough free units at the source site for this transfer.")
+            BloodInventory.objects.bulk_create(
+                [BloodInventory(site_id=destination_id, blood_type=blood_type, units_available=0)],
+                ignore_conflicts=True,  # Only when the destination does not stock the type yet
+            )
+            BloodInventory.objects.filter(site_id=destination_id, blood_type=blood_type).update(
+                units_available=F('units_available') + units)
+            bag_ids = list(BloodBag.objects
+                           .filter(site_id=source_id, blood_type=blood_type, status='Available')
+                           .order_by('expiry_date', 'id')
+                           .values_list('pk', flat=True)[:units])
+            bags = BloodBag.objects.filter(pk__in=bag_ids).update(site_id=destination_id)
+            record_changes([(source_id, blood_type, -units, 'transfer', None),
+                            (destination_id, blood_type, units, 'transfer', None)])
+            invalidate_inventory()
+    except OperationalError as exc:
+        raise InventoryConflict() from exc
+    return bags
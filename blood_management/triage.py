@@ -0,0 +1,172 @@
+"""
+Triage of pending blood requests. Pending requests are ranked by ``priority``
+(Emergency first, with requests close to their ``needed_by`` deadline escalated to
+Emergency by a background thread) and then by age, which is exactly the order of
+the ``(status, priority, request_date)`` index: the queue is read as keyset ranges
+of that index, so taking the next request costs one B-tree seek instead of a sort
+of every pending row.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from .matching import BLOOD_TYPE_BITS, BLOOD_TYPES, COMPATIBLE_DONOR_MASKS, TYPE_INDEX, compatible_donor_types
+from .models import BloodRequest, Reservation
+from .sites import SiteMap, load_free_stock, nearest_with_stock
+
+logger = logging.getLogger(__name__)
+
+QUEUE_ORDER = ('priority', 'request_date', 'id')
+
+# Recipient types each donor type can supply; the most versatile stock (O-) is the
+# last substitute used, so it stays available for the requests that have no other option
+_RECIPIENT_COUNT = {
+    donor: sum(bool(mask & BLOOD_TYPE_BITS[donor]) for mask in COMPATIBLE_DONOR_MASKS.values())
+    for donor in BLOOD_TYPES
+}
+SUBSTITUTES = {
+    recipient: sorted((t for t in compatible_donor_types(recipient) if t != recipient),
+                      key=lambda t: (_RECIPIENT_COUNT[t], BLOOD_TYPES.index(t)))
+    for recipient in BLOOD_TYPES
+}
+
+
+def can_substitute(recipient, source_type):
+    return bool(COMPATIBLE_DONOR_MASKS[recipient] & BLOOD_TYPE_BITS.get(source_type, 0))
+
+
+def escalate_due_requests(now=None):
+    """
+    Raise pending requests whose ``needed_by`` falls within ``TRIAGE_ESCALATION_WINDOW``
+    to Emergency priority. One UPDATE over the deadline index; returns the row count.
+    """
+    now = now or timezone.now()
+    window = timedelta(seconds=getattr(settings, 'TRIAGE_ESCALATION_WINDOW', 2 * 60 * 60))
+    emergency = BloodRequest.URGENCY_PRIORITY['Emergency']
+    return (BloodRequest.objects
+            .filter(status='Pending', needed_by__lte=now + window, priority__gt=emergency)
+            .update(priority=emergency))
+
+
+class TriageEscalator:
+    """
+    Daemon thread escalating due requests every ``TRIAGE_ESCALATION_INTERVAL`` seconds,
+    so reading the queue never writes. Started lazily by the first queue read; set
+    the interval to None to rely on the ``escalate_due_requests`` command instead.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        interval = getattr(settings, 'TRIAGE_ESCALATION_INTERVAL', 60)
+        if interval is None:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(interval,),
+                                                name='triage-escalator', daemon=True)
+                self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                escalate_due_requests()
+            except Exception:
+                logger.exception("Failed to escalate due requests")
+            finally:
+                close_old_connections()
+
+
+escalator = TriageEscalator()
+
+
+def iter_queue(chunk_size=None, blood_types=None, site_id=None):
+    """
+    Pending requests in queue order, read ``chunk_size`` at a time. Every chunk is one
+    range seek of the queue index: it continues after the last row read within that
+    row's priority, then starts the next priority level. ``blood_types``, when given,
+    is called before every chunk and returns the recipient types still worth reading
+    plus request ids that must always be read, or None for all. ``site_id`` keeps
+    the requests raised at that site.
+    """
+    chunk_size = chunk_size or getattr(settings, 'TRIAGE_CHUNK_SIZE', 100)
+    after, priority = None, None
+    while True:
+        queue = BloodRequest.objects.filter(status='Pending')
+        if site_id is not None:
+            queue = queue.filter(site_id=site_id)
+        if blood_types is not None:
+            wanted = blood_types()
+            if wanted is not None:
+                types, always = wanted
+                if not types and not always:
+                    return
+                queue = queue.filter(Q(blood_type__in=types) | Q(pk__in=always))
+        if after is not None:
+            queue = (queue
+                     .filter(priority=after.priority, request_date__gte=after.request_date)
+                     .exclude(request_date=after.request_date, pk__lte=after.pk))
+        elif priority is not None:
+            queue = queue.filter(priority__gt=priority)
+        chunk = list(queue.order_by(*QUEUE_ORDER)[:chunk_size])
+        yield from chunk
+        if len(chunk) == chunk_size:
+            after = chunk[-1]
+        elif after is not None:
+            # This priority level is exhausted; carry on with the next ones
+            after, priority = None, after.priority
+        else:
+            return
+
+
+def next_fulfillable(limit, site_id=None):
+    """
+    The first ``limit`` pending requests in queue order that current stock can cover,
+    each with the blood type and site to fulfill it from: its own type first, then
+    compatible substitutes, least versatile first, each from the nearest site with
+    enough free units. Stock promised to an earlier request in the result is not
+    offered again, and a request's own hold counts towards it at its site.
+    ``site_id`` keeps the requests raised at that site.
+    Returns ``(plan, scanned)`` where ``plan`` is a list of ``(blood_request, source_type, site_id)``.
+    """
+    sites = SiteMap()
+    free = load_free_stock(sites)
+    holds = {request_id: (hold_site, blood_type, units)
+             for request_id, hold_site, blood_type, units in (Reservation.objects
+                                                              .filter(status='Active')
+                                                              .values_list('blood_request_id', 'site_id',
+                                                                           'blood_type', 'units'))}
+
+    def reachable():
+        # Recipient types some compatible stock is left for; held requests are always read
+        stocked = (free > 0).any(axis=0)
+        types = [t for t in BLOOD_TYPES if any(stocked[TYPE_INDEX[s]] for s in [t] + SUBSTITUTES[t])]
+        return None if len(types) == len(BLOOD_TYPES) else (types, list(holds))
+
+    plan, scanned = [], 0
+    for blood_request in iter_queue(blood_types=reachable, site_id=site_id):
+        scanned += 1
+        units = blood_request.units_requested
+        hold_site, hold_type, held = holds.pop(blood_request.pk, (None, None, 0))
+        distances = sites.distances_from(blood_request.site_id)
+        for source_type in [blood_request.blood_type] + SUBSTITUTES[blood_request.blood_type]:
+            column = TYPE_INDEX[source_type]
+            available = free[:, column].copy()
+            if held and source_type == hold_type:
+                available[sites.index[hold_site]] += held
+            nearest = nearest_with_stock(distances, available, units)
+            if nearest is not None:
+                free[nearest, column] -= units
+                if held:
+                    free[sites.index[hold_site], TYPE_INDEX[hold_type]] += held  # Consumed here or released
+                plan.append((blood_request, source_type, sites.ids[nearest]))
+                break
+        if len(plan) >= limit:
+            break
+    return plan, scanned
@@ -1,81 +1,398 @@
-from django.contrib.auth.models import User
-from django.core.mail import send_mail
+import numpy as np
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.exceptions import ValidationError
 from rest_framework import generics, status, filters
 from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-from .models import Donor, BloodInventory, BloodRequest
-from .serializer import DonorSerializer, BloodInventorySerializer, BloodRequestSerializer, UserRegistrationSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView
+from .models import Donor, BloodBag, BloodInventory, BloodRequest, Campaign, Site, default_site_id
+from .serializer import (
+    DonorSerializer, BloodBagSerializer, BloodInventorySerializer, InventoryHistoryQuerySerializer, BloodRequestSerializer,
+    BulkFulfillmentSerializer, CampaignSerializer, CampaignStatusSerializer, CompatibleDonorQuerySerializer, ExpandedBloodRequestSerializer,
+    ReservationSerializer, SiteSerializer, TransferPlanQuerySerializer, TransferSerializer, TriageQuerySerializer,
+    UserRegistrationSerializer
+)
 from .permissions import IsAdminUser, IsRegularUser
+from .allocation import allocate_requests, fulfill_request
+from .reservations import deny_request, release_reservation, reserve_units
+from .bags import receive_bags
+from .history import adjustment_changes, history_range, record_changes
+from .alerts import check_low_inventory, get_thresholds
+from .inventory_cache import get_inventory_levels, get_inventory_snapshot, is_not_modified, set_validators
+from .forecasting import days_of_cover, get_forecast
+from .idempotency import IdempotencyMixin
+from .search import DonorSearchFilter
+from .matching import find_eligible_donors
+from .triage import can_substitute, escalator, next_fulfillable
+from .metrics import registry
+from .bulk import IMPORT_FORMATS, export_donors, export_requests, import_donors, iter_records
+from .pagination import BloodRequestCursorPagination, DonorCursorPagination, SelectablePaginationMixin
+from .transfers import plan_transfers, transfer_units
+from .campaigns import count_recipients, dispatcher
+from .coalescing import CoalescedReadMixin
 
-# Function to check low inventory and send email notifications
-def check_low_inventory():
-    critical_level = 5  # Set threshold for low inventory
-    low_inventory = BloodInventory.objects.filter(units_available__lt=critical_level)
-
-    if low_inventory.exists():
-        blood_types = ', '.join([inventory.blood_type for inventory in low_inventory])
-        send_mail(
-            'Critical Blood Inventory Alert',
-            f'The following blood types are below critical levels: {blood_types}. Please replenish soon.',
-            settings.DEFAULT_FROM_EMAIL,
-            ['placeholder@example.com'],  # Placeholder email since local testing
-        )
+
+def site_param(request, name='site'):
+    """
+    The site id given as ``?site=``, or None when the parameter is absent.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
 
 # Donor Management (Admin Only)
-class DonorListCreateView(generics.ListCreateAPIView):
+class DonorListCreateView(CoalescedReadMixin, SelectablePaginationMixin, generics.ListCreateAPIView):
     queryset = Donor.objects.all()
     serializer_class = DonorSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'blood_type', 'contact_info', 'last_donation_date']
+    cursor_pagination_class = DonorCursorPagination
+    filter_backends = [DonorSearchFilter]
+    search_fields = ['name', 'blood_type', 'contact_info', 'last_donation_date']  # Fallback without FTS5
+
+    @property
+    def throttle_scope(self):
+        # Full-text searches draw from their own, smaller bucket
+        return 'donor_search' if self.request.query_params.get('search') else None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Exact filters are served by the (blood_type, last_donation_date) index, unlike ?search=
+        blood_type = self.request.query_params.get('blood_type')
+        if blood_type:
+            queryset = queryset.filter(blood_type=blood_type)
+        last_donation_before = self.request.query_params.get('last_donation_before')
+        if last_donation_before:
+            try:
+                before = parse_date(last_donation_before)
+            except ValueError:
+                before = None
+            if before is None:
+                raise ValidationError({'last_donation_before': 'Use the YYYY-MM-DD format.'})
+            queryset = queryset.filter(last_donation_date__lt=before)
+        return queryset
 
 class DonorDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Donor.objects.all()
     serializer_class = DonorSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+# Bulk donor import from a CSV or NDJSON request body (Admin Only)
+class DonorImportView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        fmt = IMPORT_FORMATS.get(request.content_type.split(';')[0].strip())
+        if fmt is None:
+            return Response(
+                {"detail": f"Unsupported content type. Use one of: {', '.join(IMPORT_FORMATS)}."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        # Parsed incrementally from the request stream instead of request.data
+        report = import_donors(iter_records(request.stream, fmt))
+        if 'malformed' in report:
+            # Rows before the malformed one stay imported, as the report says
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    """
+    Streams a table as CSV (default) or NDJSON with ``?output=ndjson``.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    export = None
+    filename = None
+
+    def get(self, request):
+        fmt = request.query_params.get('output', 'csv')
+        if fmt not in ('csv', 'ndjson'):
+            raise ValidationError({'output': 'Use csv or ndjson.'})
+        response = StreamingHttpResponse(
+            self.export(fmt),
+            content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{fmt}"'
+        return response
+
+
+class DonorExportView(ExportView):
+    export = staticmethod(export_donors)
+    filename = 'donors'
+
+
+class BloodRequestExportView(ExportView):
+    export = staticmethod(export_requests)
+    filename = 'blood_requests'
+
+
+# Donors eligible to give to a recipient blood type (Admin Only)
+class CompatibleDonorListView(CoalescedReadMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        query = CompatibleDonorQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        page_size = min(
+            query.validated_data.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE']),
+            settings.CURSOR_PAGINATION_MAX_PAGE_SIZE,
+        )
+
+        donors, next_cursor = find_eligible_donors(
+            query.validated_data['recipient'],
+            page_size,
+            cursor=query.validated_data.get('cursor'),
+            eligibility_days=query.validated_data.get('eligibility_days'),
+        )
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+        return Response({"next": next_url, "results": DonorSerializer(donors, many=True).data})
+
+# Donor recall campaigns, mailed in batches by the background dispatcher (Admin Only)
+class CampaignListCreateView(generics.ListCreateAPIView):
+    queryset = Campaign.objects.all()
+    serializer_class = CampaignSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def perform_create(self, serializer):
+        campaign = serializer.save(created_by=self.request.user)
+        campaign.total = count_recipients(campaign)
+        campaign.save(update_fields=['total'])
+        # The worker reads the campaign from its own connection, so only once it is committed
+        transaction.on_commit(lambda: dispatcher.submit(campaign.pk))
+
+
+class CampaignDetailView(generics.RetrieveAPIView):
+    queryset = Campaign.objects.all()
+    serializer_class = CampaignSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def patch(self, request, pk):
+        campaign = self.get_object()
+        serializer = CampaignStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pause = serializer.validated_data['status'] == 'Paused'
+        if pause:
+            # The worker stops after the batch it is sending
+            changed = Campaign.objects.filter(pk=pk, status='Running').update(status='Paused')
+        else:
+            changed = (Campaign.objects
+                       .filter(pk=pk, status__in=['Paused', 'Failed'])
+                       .update(status='Running', error=''))
+            if changed:
+                transaction.on_commit(lambda: dispatcher.submit(campaign.pk))
+        if not changed:
+            campaign.refresh_from_db()
+            action = 'paused' if pause else 'resumed'
+            raise ValidationError({"status": f"A {campaign.status.lower()} campaign cannot be {action}."})
+        campaign.refresh_from_db()
+        return Response(self.get_serializer(campaign).data)
+
+# Sites holding inventory (Admin Only)
+class SiteListCreateView(generics.ListCreateAPIView):
+    queryset = Site.objects.all()
+    serializer_class = SiteSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
 # Blood Inventory Management (Admin Only)
 class BloodInventoryListCreateView(generics.ListCreateAPIView):
     queryset = BloodInventory.objects.all()
     serializer_class = BloodInventorySerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+    def list(self, request, *args, **kwargs):
+        # Served from the cached snapshot; pollers holding the current ETag get a 304
+        version, rows = get_inventory_snapshot(site_param(request))
+        if is_not_modified(request, version):
+            return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), version)
+        page = self.paginate_queryset(rows)
+        return set_validators(self.get_paginated_response(page), version)
+
     def perform_create(self, serializer):
-        serializer.save()
-        check_low_inventory()  # Check levels after creating a new inventory entry
+        with transaction.atomic():
+            inventory = serializer.save()
+            record_changes([(inventory.site_id, inventory.blood_type, inventory.units_available, 'create', None)])
+        check_low_inventory([inventory.site_id])  # Check levels after creating a new inventory entry
 
 class BloodInventoryDetailView(generics.RetrieveUpdateAPIView):
-    queryset = BloodInventory.objects.all()
+    queryset = BloodInventory.objects.select_related('site')
     serializer_class = BloodInventorySerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def perform_update(self, serializer):
-        serializer.save()
-        check_low_inventory()  # Check levels after updating inventory
+        with transaction.atomic():
+            previous = (serializer.instance.site_id, serializer.instance.blood_type, serializer.instance.units_available)
+            inventory = serializer.save()
+            record_changes(adjustment_changes(previous, inventory))
+        check_low_inventory({previous[0], inventory.site_id})  # Check levels after updating inventory
+
+# Inventory movements per hour or day, served from the rollup table (Admin Only)
+class InventoryHistoryView(CoalescedReadMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        query = InventoryHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        try:
+            rows = history_range(params['granularity'], params['start'], params.get('end') or timezone.now(),
+                                 params.get('blood_type'), params.get('site'))
+        except ValueError as exc:
+            raise ValidationError({'start': str(exc)})
+        return Response({
+            "granularity": params['granularity'],
+            "results": [{**row, "net": row["units_in"] - row["units_out"]} for row in rows],
+        })
+
+# Forecast demand, reorder points and days of cover per blood type (Admin Only)
+class InventoryForecastView(CoalescedReadMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        site_id = site_param(request)  # The whole network by default
+        forecast = get_forecast(site_id)
+        levels = get_inventory_levels(site_id)
+        blood_types = sorted(set(levels) | set(forecast))
+        cover = days_of_cover([levels.get(t, 0) for t in blood_types],
+                              [forecast.get(t, {}).get('smoothed_demand', 0) for t in blood_types])
+        thresholds = get_thresholds(blood_types, site_id)
+        return Response({"results": [
+            {
+                "blood_type": blood_type,
+                "units_free": levels.get(blood_type, 0),
+                "threshold": thresholds[blood_type],
+                "days_of_cover": round(float(days), 1) if np.isfinite(days) else None,
+                "forecast": forecast.get(blood_type),  # None without demand history
+            }
+            for blood_type, days in zip(blood_types, cover)
+        ]})
+
+# Rebalancing moves between sites, and carrying one out (Admin Only)
+class InventoryTransferView(CoalescedReadMixin, APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        query = TransferPlanQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        blood_type = query.validated_data.get('blood_type')
+        moves, shortfall = plan_transfers([blood_type] if blood_type else None)
+        return Response({"results": moves, "shortfall": shortfall})
+
+    def post(self, request):
+        serializer = TransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        bags = transfer_units(params['from_site'].pk, params['to_site'].pk, params['blood_type'], params['units'])
+        check_low_inventory([params['from_site'].pk, params['to_site'].pk])
+        return Response({**serializer.data, "bags": bags}, status=status.HTTP_201_CREATED)
+
+# Bag-level inventory; receiving bags updates the per-type counts (Admin Only)
+class BloodBagListCreateView(generics.ListCreateAPIView):
+    queryset = BloodBag.objects.order_by('expiry_date', 'id')
+    serializer_class = BloodBagSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for field in ('blood_type', 'status'):
+            value = self.request.query_params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+        site_id = site_param(self.request)
+        if site_id is not None:
+            queryset = queryset.filter(site_id=site_id)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        # A JSON list receives a whole delivery with one insert and one inventory update
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data if many else [serializer.validated_data]
+        default_site = None  # Resolved once for the bags received without a site
+        bags = []
+        for row in rows:
+            if 'site' not in row:
+                default_site = default_site or default_site_id()
+                row = {**row, 'site_id': default_site}
+            bags.append(BloodBag(**row))
+        bags = receive_bags(bags)
+        check_low_inventory({bag.site_id for bag in bags})  # Lets a replenished type be reported again
+        data = self.get_serializer(bags, many=True).data
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+class ExpandUserMixin:
+    """
+    ``?expand=user`` embeds the requester's username and email, loaded with one JOIN.
+    """
+    def expand_user(self):
+        return 'user' in self.request.query_params.get('expand', '').split(',')
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and self.expand_user():
+            return ExpandedBloodRequestSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET' and self.expand_user():
+            queryset = queryset.select_related('user').only(*ExpandedBloodRequestSerializer.projection)
+        return queryset
 
 # Blood Requests (Regular Users Only)
-class BloodRequestListCreateView(generics.ListCreateAPIView):
+class BloodRequestListCreateView(IdempotencyMixin, SelectablePaginationMixin, ExpandUserMixin,
+                                 generics.ListCreateAPIView):
+    queryset = BloodRequest.objects.all()
     serializer_class = BloodRequestSerializer
     permission_classes = [IsAuthenticated, IsRegularUser]
+    cursor_pagination_class = BloodRequestCursorPagination
 
     def get_queryset(self):
-        return BloodRequest.objects.filter(user=self.request.user)
+        queryset = super().get_queryset().filter(user=self.request.user)
+        site_id = site_param(self.request)
+        if site_id is not None:
+            queryset = queryset.filter(site_id=site_id)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class BloodRequestAdminListView(generics.ListAPIView):
+class BloodRequestAdminListView(SelectablePaginationMixin, ExpandUserMixin, generics.ListAPIView):
     queryset = BloodRequest.objects.all()
     serializer_class = BloodRequestSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+    cursor_pagination_class = BloodRequestCursorPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['blood_type', 'status']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Exact filters are served by the (status, blood_type, request_date) index, unlike ?search=
+        for field in ('status', 'blood_type'):
+            value = self.request.query_params.get(field)
+            if value:
+                queryset = queryset.filter(**{field: value})
+        site_id = site_param(self.request)
+        if site_id is not None:
+            queryset = queryset.filter(site_id=site_id)
+        return queryset
+
+# JWT issue; checking the password hash makes it the costliest anonymous call
+class TokenObtainView(TokenObtainPairView):
+    throttle_scope = 'token'
+
 # User Registration View
 class UserRegistrationView(APIView):
     def post(self, request):
@@ -86,40 +403,127 @@ class UserRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class BloodRequestAdminDetailView(RetrieveUpdateAPIView):
+class BloodRequestAdminDetailView(IdempotencyMixin, RetrieveUpdateAPIView):
     queryset = BloodRequest.objects.all()
     serializer_class = BloodRequestSerializer
     permission_classes = [IsAdminUser]
+    idempotent_methods = ('PUT', 'PATCH')  # A replayed fulfillment must not run again
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        # Get the new status from the request data
-        new_status = request.data.get("status")
-        print(f"New status from request data: {new_status}")  # Debugging output
-
-        # Only proceed if changing status to "Fulfilled" and inventory allows it
-        if new_status == "Fulfilled" and instance.status != "Fulfilled":
-            print("Attempting to fulfill the request...")  # Debugging output
-            inventory_item = get_object_or_404(BloodInventory, blood_type=instance.blood_type)
-        
-            if inventory_item.units_available < instance.units_requested:
-                print("Not enough units available in inventory.")  # Debugging output
-                raise ValidationError("Not enough units available in inventory to fulfill this request.")
-
-            inventory_item.units_available -= instance.units_requested
-            inventory_item.save()
-
-            # Update the status of the BloodRequest instance
-            instance.status = "Fulfilled"
-            instance.save()
-        
-            check_low_inventory()
-
-        # Allow partial updates
+        # Validate the remaining fields before touching inventory
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+
+        # Only proceed if changing status to "Fulfilled"; the inventory check happens atomically
+        new_status = request.data.get("status")
+        if new_status == "Fulfilled" and instance.status != "Fulfilled":
+            source_type = request.data.get("source_type")  # A compatible substitute, as suggested by the queue
+            if source_type and not can_substitute(instance.blood_type, source_type):
+                raise ValidationError({"source_type": f"{source_type} cannot be given to a {instance.blood_type} recipient."})
+            source_site = request.data.get("source_site")  # Default: the nearest site with enough stock
+            if source_site is not None:
+                try:
+                    source_site = int(source_site)
+                except (TypeError, ValueError):
+                    raise ValidationError({"source_site": "A valid integer is required."})
+                if not Site.objects.filter(pk=source_site).exists():
+                    raise ValidationError({"source_site": f"Site {source_site} does not exist."})
+            fulfill_request(instance, source_type, source_site)
+            check_low_inventory([instance.fulfilled_from_id])
+        elif new_status == "Denied" and instance.status == "Pending":
+            deny_request(instance)  # Also releases its hold; status is read-only in the serializer
+
+        # Allow partial updates, skipping the extra save when only the status was sent
+        if serializer.validated_data:
+            self.perform_update(serializer)
 
         return Response(serializer.data)
 
+
+# Next pending requests current stock can cover, in triage order (Admin Only)
+class BloodRequestQueueView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        query = TriageQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        escalator.ensure_started()  # Due requests are escalated off the read path
+        plan, scanned = next_fulfillable(query.validated_data['limit'], query.validated_data.get('site'))
+        return Response({
+            "results": [
+                {**BloodRequestSerializer(blood_request).data, "source_type": source_type,
+                 "substitute": source_type != blood_request.blood_type, "source_site": site_id}
+                for blood_request, source_type, site_id in plan
+            ],
+            "scanned": scanned,
+        })
+
+
+# Bulk fulfillment of pending requests (Admin Only)
+class BloodRequestBulkFulfillView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkFulfillmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        pending = BloodRequest.objects.all()
+        if serializer.validated_data.get('request_ids'):
+            pending = pending.filter(pk__in=serializer.validated_data['request_ids'])
+        if serializer.validated_data.get('blood_type'):
+            pending = pending.filter(blood_type=serializer.validated_data['blood_type'])
+        if serializer.validated_data.get('site'):
+            pending = pending.filter(site=serializer.validated_data['site'])
+
+        fulfilled, skipped = allocate_requests(pending)
+        if fulfilled:
+            check_low_inventory({r.fulfilled_from_id for r in fulfilled})  # Once for the whole batch
+
+        # Named requests that were never candidates are reported too, so partial application shows
+        accounted = {r.pk for r in fulfilled} | set(skipped)
+        requested = dict.fromkeys(serializer.validated_data.get('request_ids', []))
+        unaccounted = [pk for pk in requested if pk not in accounted]
+        if unaccounted:
+            statuses = dict(BloodRequest.objects.filter(pk__in=unaccounted).values_list('pk', 'status'))
+            for pk in unaccounted:
+                if pk not in statuses:
+                    skipped[pk] = 'Request not found.'
+                elif statuses[pk] != 'Pending':
+                    skipped[pk] = f'Request is {statuses[pk]}, not Pending.'
+                else:
+                    skipped[pk] = 'Request does not match the blood_type or site filter.'
+
+        return Response({
+            "fulfilled": [r.pk for r in fulfilled],
+            "skipped": [{"id": pk, "reason": reason} for pk, reason in skipped.items()],
+        })
+
+
+# Hold inventory units for a pending request until it is dispatched (Admin Only)
+class BloodRequestReservationView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request, pk):
+        blood_request = generics.get_object_or_404(BloodRequest, pk=pk)
+        serializer = ReservationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservation = reserve_units(blood_request, ttl=serializer.validated_data.get('ttl'),
+                                    site=serializer.validated_data.get('site'))
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk):
+        blood_request = generics.get_object_or_404(BloodRequest, pk=pk)
+        if not release_reservation(blood_request):
+            return Response({"detail": "This request has no active reservation."}, status=status.HTTP_404_NOT_FOUND)
+        check_low_inventory()  # Released units may lift a type back above its threshold
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Prometheus metrics recorded by PerformanceMetricsMiddleware (Admin Only)
+class MetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')